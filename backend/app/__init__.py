@@ -0,0 +1,62 @@
+"""
+AIVORA backend package
+create_app() builds the Flask app; wsgi.py exposes one for gunicorn.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+
+def create_app(config_name=None):
+    """Build the app for a config name ('development', 'production', 'testing')"""
+    from app import database
+    from app.cache import ResponseCache
+    from app.chunking import MapReduceSummarizer
+    from app.config import config
+    from app.counters import ProgressCounters
+    from app.fingerprints import FingerprintStore
+    from app.jobs import JobQueue
+    from app.llm import LLMClient
+    from app.metrics import Metrics
+    from app.passwords import PasswordHasher
+    from app.retention import ChatArchive
+    from app.routes import bp, generate_text
+    from app.static_index import StaticIndex
+    from app.uploads import UploadRequest
+
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+    app.config.from_object(config[config_name or os.getenv('FLASK_ENV', 'default')])
+
+    # Each extension keeps its state on this app (app.extensions); the
+    # module-level names (llm, jobs, ...) resolve to the current app's
+    Metrics(app)
+    database.init_app(app)
+    JobQueue(app)
+    ResponseCache(app)
+    ProgressCounters(app)
+    LLMClient(app)
+    PasswordHasher(app)
+    FingerprintStore(app)
+    ChatArchive(app)
+
+    app.extensions['static_index'] = StaticIndex(app.config['STATIC_DIST_PATH'])
+    app.extensions['ocr_pool'] = ThreadPoolExecutor(max_workers=app.config['OCR_BULK_WORKERS'],
+                                                    thread_name_prefix='ocr')
+    app.extensions['quiz_pool'] = ThreadPoolExecutor(max_workers=app.config['QUIZ_BATCH_WORKERS'],
+                                                     thread_name_prefix='quiz')
+    summary_pool = ThreadPoolExecutor(max_workers=app.config['SUMMARY_WORKERS'],
+                                      thread_name_prefix='summary')
+    app.extensions['summary_pool'] = summary_pool
+    # Summaries of new notes; kept apart from summary_pool, which the
+    # summarizer itself fans out on
+    app.extensions['ingest_pool'] = ThreadPoolExecutor(max_workers=app.config['NOTE_SUMMARY_WORKERS'],
+                                                       thread_name_prefix='ingest')
+    app.extensions['summarizer'] = MapReduceSummarizer(
+        lambda prompt: generate_text('gemini-pro', prompt, 'summarize'), summary_pool,
+        max_tokens=app.config['SUMMARY_CHUNK_TOKENS'])
+
+    app.register_blueprint(bp)
+    return app
@@ -0,0 +1,269 @@
+"""
+Response cache for Gemini-backed endpoints
+Content-addressed: the key is a hash of model name + prompt, so identical
+prompts share one answer no matter which user or endpoint sent them.
+
+Two tiers: an in-process LRU with TTL and a byte budget, and an optional
+shared tier (Redis, or an in-memory stand-in for local runs). Concurrent
+misses on the same key are coalesced so only one upstream call is made.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+
+def cache_key(model_name, prompt):
+    """Stable hash of model name + prompt"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(prompt.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry TTL and a total size budget in bytes"""
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires, size = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.size -= size
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            self._data[key] = (value, time.monotonic() + self.ttl, size)
+            self.size += size
+            while len(self._data) > self.max_entries or self.size > self.max_bytes:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self.size -= evicted
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedStore:
+    """In-memory stand-in for the shared tier, same interface as RedisSharedStore"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+
+
+class RedisSharedStore:
+    """Shared tier backed by Redis"""
+
+    def __init__(self, url, prefix='aivora:llm:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value.encode('utf-8'), ex=ttl)
+
+
+class _Flight:
+    """A pending upstream call that other requests can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """Two-tier cache with single-flight deduplication and hit/miss counters"""
+
+    def __init__(self, app=None):
+        self.local = None
+        self.shared = None
+        self.ttl = 3600
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._cost = {}
+        self.stats = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'seconds_saved': 0.0,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_TTL', 3600)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+        app.config.setdefault('RESPONSE_CACHE_SHARED', None)
+
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        self.local = LRUCache(max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+                              max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+                              ttl=self.ttl)
+        shared = app.config['RESPONSE_CACHE_SHARED']
+        if shared == 'local':
+            self.shared = LocalSharedStore()
+        elif shared:
+            self.shared = RedisSharedStore(shared)
+        app.extensions['response_cache'] = self
+
+    def get_or_compute(self, model_name, prompt, compute):
+        """Return the cached answer for (model, prompt), calling compute() on a miss"""
+        key = cache_key(model_name, prompt)
+
+        value = self.local.get(key)
+        if value is not None:
+            self._hit('local_hits', key)
+            return value
+
+        if self.shared is not None:
+            value = self._shared_get(key)
+            if value is not None:
+                self.local.set(key, value)
+                self._hit('shared_hits', key)
+                return value
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            self._count('coalesced')
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        started = time.monotonic()
+        try:
+            value = compute()
+        except Exception as e:
+            flight.error = e
+            self._count('errors')
+            raise
+        else:
+            flight.value = value
+            self._count('misses')
+            with self._stats_lock:
+                self._cost[key] = time.monotonic() - started
+                if len(self._cost) > self.local.max_entries * 2:
+                    self._cost.clear()
+            self.local.set(key, value)
+            if self.shared is not None:
+                self._shared_set(key, value)
+            return value
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.event.set()
+
+    def peek(self, model_name, prompt):
+        """Cached answer or None, without computing (used by streaming responses)"""
+        key = cache_key(model_name, prompt)
+        value = self.local.get(key)
+        if value is not None:
+            self._hit('local_hits', key)
+            return value
+        if self.shared is not None:
+            value = self._shared_get(key)
+            if value is not None:
+                self.local.set(key, value)
+                self._hit('shared_hits', key)
+                return value
+        self._count('misses')
+        return None
+
+    def put(self, model_name, prompt, value):
+        """Store an answer produced outside get_or_compute"""
+        key = cache_key(model_name, prompt)
+        self.local.set(key, value)
+        if self.shared is not None:
+            self._shared_set(key, value)
+
+    def snapshot(self):
+        """Counters plus current tier sizes"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats['local_hits'] + stats['shared_hits'] + stats['misses'] + stats['coalesced']
+        hits = lookups - stats['misses']
+        stats['hit_ratio'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['seconds_saved'] = round(stats['seconds_saved'], 3)
+        stats['local_entries'] = len(self.local)
+        stats['local_bytes'] = self.local.size
+        return stats
+
+    def _hit(self, counter, key):
+        with self._stats_lock:
+            self.stats[counter] += 1
+            self.stats['seconds_saved'] += self._cost.get(key, 0.0)
+
+    def _count(self, counter):
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    def _shared_get(self, key):
+        # The shared tier is an optimisation, never fail a request over it
+        try:
+            return self.shared.get(key)
+        except Exception:
+            return None
+
+    def _shared_set(self, key, value):
+        try:
+            self.shared.set(key, value, self.ttl)
+        except Exception:
+            pass
+
+
+# The current app's instance; create_app() builds one per app
+response_cache = LocalProxy(lambda: current_app.extensions['response_cache'])
@@ -0,0 +1,26 @@
+"""
+Celery worker entry point
+Started by docker-compose as `celery -A app.celery_app worker`.
+
+Only used when CELERY_BROKER_URL is set; without a broker the job queue
+runs handlers on its in-process thread pool instead.
+"""
+
+import os
+
+from celery import Celery
+
+celery = Celery(
+    'aivora',
+    broker=os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0'),
+    backend=os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0'),
+)
+celery.conf.task_acks_late = True
+celery.conf.worker_prefetch_multiplier = 1
+
+
+@celery.task(name='aivora.run_job')
+def run_job(job_id, kind, kwargs):
+    """Run a queued job on the app from wsgi.py"""
+    from wsgi import app
+    app.extensions['jobs'].run(job_id, kind, kwargs)
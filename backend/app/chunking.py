@@ -0,0 +1,127 @@
+"""
+Chunking and map-reduce summarization for long notes
+Text is split on heading and paragraph boundaries into chunks that fit a
+token budget. Chunks are summarized concurrently (map), then the partial
+summaries are combined (reduce), recursively if they are still too long.
+
+Chunk prompts are deterministic, so with the response cache in front of
+generate() an edited note only re-summarizes the chunks that changed. For
+that, boundaries come from the content rather than running sizes: every
+heading starts a chunk, and within a section a chunk also ends after an
+"anchor" paragraph, picked by hashing the paragraph. An edit then only
+moves the boundaries between the anchors around it.
+"""
+
+import hashlib
+import re
+
+HEADING = re.compile(r'^(#{1,6}\s+\S.*|[A-Z0-9][^\n]{0,80}:|[^\n]+\n[=-]{3,})$')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+MAP_PROMPT = ("Summarize this section of a longer document. Keep key facts, "
+              "definitions and formulas:\n\n{chunk}")
+REDUCE_PROMPT = ("Combine these section summaries into one concise summary "
+                 "of the whole document:\n\n{summaries}")
+
+
+def estimate_tokens(text):
+    """Rough token count, ~4 characters per token"""
+    return (len(text) + 3) // 4
+
+
+def _blocks(text):
+    """Paragraphs, with each heading starting a new section"""
+    for para in re.split(r'\n\s*\n', text.strip()):
+        para = para.strip()
+        if para:
+            yield para, bool(HEADING.match(para.split('\n', 1)[0]) or HEADING.match(para))
+
+
+def _split_oversized(para, max_tokens):
+    """Break a paragraph that alone exceeds the budget, by sentence then by size"""
+    max_chars = max_tokens * 4
+    piece = ''
+    for sentence in SENTENCE_END.split(para):
+        while len(sentence) > max_chars:
+            if piece:
+                yield piece
+                piece = ''
+            yield sentence[:max_chars]
+            sentence = sentence[max_chars:]
+        if piece and len(piece) + 1 + len(sentence) > max_chars:
+            yield piece
+            piece = sentence
+        else:
+            piece = f'{piece} {sentence}' if piece else sentence
+    if piece:
+        yield piece
+
+
+def _is_anchor(para, tokens, max_tokens):
+    """Whether a chunk ends after para; about every max_tokens // 2 tokens on average"""
+    digest = hashlib.blake2b(para.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64 < tokens / max(1, max_tokens // 2)
+
+
+def split_into_chunks(text, max_tokens):
+    """Pack paragraphs into chunks of at most max_tokens, cutting at headings and anchors"""
+    chunks = []
+    current = []
+    size = 0
+
+    def close():
+        nonlocal current, size
+        if current:
+            chunks.append('\n\n'.join(current))
+        current, size = [], 0
+
+    for para, is_heading in _blocks(text):
+        tokens = estimate_tokens(para)
+        if is_heading:
+            close()
+        if tokens > max_tokens:
+            close()
+            chunks.extend(_split_oversized(para, max_tokens))
+            continue
+        if size + tokens > max_tokens:
+            close()
+        current.append(para)
+        size += tokens + 1
+        if not is_heading and _is_anchor(para, tokens, max_tokens):
+            close()
+    close()
+    return chunks
+
+
+class MapReduceSummarizer:
+    """Summarize text of any length with a bounded worker pool
+
+    generate(prompt) -> str performs the (cached) LLM call.
+    """
+
+    def __init__(self, generate, executor, max_tokens=6000):
+        self.generate = generate
+        self.executor = executor
+        self.max_tokens = max_tokens
+
+    def summarize(self, text, direct_prompt):
+        """Summarize text; direct_prompt(text) is used when it fits in one call"""
+        if estimate_tokens(text) <= self.max_tokens:
+            return self.generate(direct_prompt(text))
+
+        chunks = split_into_chunks(text, self.max_tokens)
+        summaries = list(self.executor.map(
+            lambda chunk: self.generate(MAP_PROMPT.format(chunk=chunk)), chunks))
+        return self.reduce(summaries)
+
+    def reduce(self, summaries, max_rounds=4):
+        """Combine partial summaries, in groups that fit the budget"""
+        for _ in range(max_rounds):
+            groups = split_into_chunks('\n\n'.join(summaries), self.max_tokens)
+            if len(groups) <= 1:
+                break
+            summaries = list(self.executor.map(
+                lambda group: self.generate(REDUCE_PROMPT.format(summaries=group)), groups))
+        # Summaries that refuse to shrink are cut to the budget for the last pass
+        combined = '\n\n'.join(summaries)[:self.max_tokens * 4]
+        return self.generate(REDUCE_PROMPT.format(summaries=combined))
@@ -0,0 +1,142 @@
+"""
+Conversation context for /api/chat
+A prompt is built from a rolling summary of older turns plus the last few
+turns, trimmed to a token budget, so prompt size stays flat however long
+the conversation gets.
+
+The summary lives on the conversations row and is advanced incrementally:
+turns that slide out of the recent window are folded into it in batches,
+off the request path. Until a batch is folded its turns stay in the prompt
+with the recent ones, so no turn is ever in neither.
+"""
+
+from app import database
+from app.chunking import estimate_tokens
+from app.retention import chat_archive
+
+SYSTEM_PREAMBLE = "You are a helpful study assistant. Continue the conversation below."
+FOLD_PROMPT = ("Update this running summary of a tutoring conversation with the new "
+               "messages. Keep facts, open questions and the student's goals. "
+               "Reply with the updated summary only.\n\n"
+               "Current summary:\n{summary}\n\nNew messages:\n{turns}")
+# Most turns folded at once, and so most unfolded turns a prompt loads
+MAX_FOLD_BATCH = 50
+
+
+def _clip(text, max_tokens):
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars] + '…'
+
+
+def format_turns(turns):
+    return '\n'.join(f"Student: {turn['question']}\nAssistant: {turn['answer']}" for turn in turns)
+
+
+def assemble_prompt(message, summary, turns, token_budget):
+    """Prompt for message given the rolling summary and recent turns (oldest first)
+
+    The new message is always kept. The summary may use up to a third of
+    what is left, recent turns fill the rest newest-first, and a single
+    long turn is clipped rather than crowding out the others.
+    """
+    if not summary and not turns:
+        return message
+
+    remaining = token_budget - estimate_tokens(message) - estimate_tokens(SYSTEM_PREAMBLE) - 16
+    sections = [SYSTEM_PREAMBLE]
+
+    if summary and remaining > 0:
+        summary = _clip(summary, max(remaining // 3, 1))
+        sections.append(f"Summary of the earlier conversation:\n{summary}")
+        remaining -= estimate_tokens(summary)
+
+    kept = []
+    per_turn = max(remaining // max(len(turns), 1), 64)
+    for turn in reversed(turns):
+        turn = {'question': _clip(turn['question'], per_turn // 2),
+                'answer': _clip(turn['answer'] or '', per_turn)}
+        cost = estimate_tokens(turn['question']) + estimate_tokens(turn['answer']) + 4
+        if cost > remaining:
+            break
+        kept.append(turn)
+        remaining -= cost
+    if kept:
+        sections.append("Recent messages:\n" + format_turns(reversed(kept)))
+
+    sections.append(f"Student: {message}\nAssistant:")
+    return '\n\n'.join(sections)
+
+
+def create_conversation(cursor, user_id, title):
+    """Insert a conversation inside the caller's transaction, returns its id"""
+    cursor.execute('''INSERT INTO conversations (user_id, title, summary, summarized_through_id)
+                     VALUES (%s, %s, NULL, 0)''', (user_id, title[:255]))
+    return cursor.lastrowid
+
+
+def load_context(conversation_id, user_id, recent_turns):
+    """(conversation row, turns not yet in its summary oldest first), or (None, [])
+
+    That is at least the last recent_turns turns plus any older ones still
+    waiting to be folded (up to MAX_FOLD_BATCH); assemble_prompt() trims
+    them to the token budget. A conversation resumed after its last turns
+    were archived gets them back from the archive.
+    """
+    cursor = database.get_cursor(dict_rows=True)
+    cursor.execute('''SELECT id, summary, summarized_through_id, created_at FROM conversations
+                     WHERE id = %s AND user_id = %s''', (conversation_id, user_id))
+    conversation = cursor.fetchone()
+    if not conversation:
+        return None, []
+
+    # Served by idx_chat_conversation (conversation_id, id)
+    cursor.execute('''SELECT id, question, answer FROM chat_history
+                     WHERE conversation_id = %s AND id > %s ORDER BY id DESC LIMIT %s''',
+                  (conversation_id, conversation['summarized_through_id'] or 0,
+                   recent_turns + MAX_FOLD_BATCH))
+    turns = list(reversed(cursor.fetchall()))
+    if len(turns) < recent_turns and chat_archive.may_hold(conversation['created_at']):
+        archived = chat_archive.turns(user_id, conversation_id, turns[0]['id'] if turns else None,
+                                      recent_turns - len(turns))
+        turns = list(reversed(archived)) + turns
+    return conversation, turns
+
+
+def fold_older_turns(conversation_id, recent_turns, generate, batch_size, max_batch=MAX_FOLD_BATCH):
+    """Fold turns that left the recent window into the rolling summary
+
+    Does nothing until at least batch_size such turns exist. The update is
+    conditional on summarized_through_id, so concurrent folds of the same
+    conversation can't apply the same turns twice. Returns True if folded.
+    """
+    cursor = database.get_cursor(dict_rows=True)
+    cursor.execute('SELECT summary, summarized_through_id FROM conversations WHERE id = %s',
+                  (conversation_id,))
+    conversation = cursor.fetchone()
+    if not conversation:
+        return False
+
+    cursor.execute('''SELECT MIN(id) AS window_start FROM (
+                         SELECT id FROM chat_history WHERE conversation_id = %s
+                         ORDER BY id DESC LIMIT %s) recent''',
+                  (conversation_id, recent_turns))
+    window_start = cursor.fetchone()['window_start']
+    if window_start is None:
+        return False
+
+    cursor.execute('''SELECT id, question, answer FROM chat_history
+                     WHERE conversation_id = %s AND id > %s AND id < %s
+                     ORDER BY id LIMIT %s''',
+                  (conversation_id, conversation['summarized_through_id'], window_start, max_batch))
+    turns = cursor.fetchall()
+    if len(turns) < batch_size:
+        return False
+
+    summary = generate(FOLD_PROMPT.format(summary=conversation['summary'] or '(none yet)',
+                                          turns=format_turns(turns)))
+    with database.transaction() as cursor:
+        cursor.execute('''UPDATE conversations SET summary = %s, summarized_through_id = %s
+                         WHERE id = %s AND summarized_through_id = %s''',
+                      (summary, turns[-1]['id'], conversation_id,
+                       conversation['summarized_through_id']))
+        return cursor.rowcount == 1
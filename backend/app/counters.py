@@ -0,0 +1,154 @@
+"""
+Write-behind progress counters
+Increments to progress.notes_created / quizzes_taken / questions_asked are
+buffered in memory per user and written in one batched upsert, either every
+PROGRESS_FLUSH_INTERVAL seconds or once PROGRESS_FLUSH_THRESHOLD increments
+are pending. This replaces one UPDATE on the same hot row per request.
+
+Pending deltas are flushed on interpreter exit, and put back into the
+buffer if a flush fails. A flush takes the buffer under the lock and
+writes it after letting go, so increments and reads never wait on MySQL.
+
+Reads go through read(), which adds this process's pending deltas to the
+persisted row. That makes a worker's own increments visible at once, but
+reads are not exact across workers: deltas buffered in another gunicorn
+worker show up once it flushes, within PROGRESS_FLUSH_INTERVAL, and a
+batch this worker is writing is briefly in neither place. Counts can lag
+by that window but are never counted twice.
+"""
+
+import atexit
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from app import database
+
+FIELDS = ('notes_created', 'quizzes_taken', 'questions_asked')
+
+
+class ProgressCounters:
+    """Per-user increment buffer flushed to the progress table"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 5.0
+        self.threshold = 100
+        self._buffer = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        # One flush at a time (timer thread vs. shutdown); never held by add/read
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROGRESS_FLUSH_INTERVAL', 5.0)
+        app.config.setdefault('PROGRESS_FLUSH_THRESHOLD', 100)
+        self.app = app
+        self.interval = app.config['PROGRESS_FLUSH_INTERVAL']
+        self.threshold = app.config['PROGRESS_FLUSH_THRESHOLD']
+        app.extensions['progress_counters'] = self
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='progress-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def add(self, user_id, field, amount=1):
+        """Buffer an increment of progress.<field> for user_id"""
+        if field not in FIELDS:
+            raise KeyError(f'Unknown progress counter: {field}')
+        with self._lock:
+            self._buffer[user_id][field] += amount
+            self._pending_total += amount
+            if self._pending_total >= self.threshold:
+                self._wakeup.set()
+
+    def pending(self, user_id):
+        """Increments buffered for user_id but not yet written"""
+        with self._lock:
+            deltas = self._buffer.get(user_id)
+            return dict(deltas) if deltas else dict.fromkeys(FIELDS, 0)
+
+    def read(self, user_id, load):
+        """Call load() for the persisted row and add this process's pending deltas
+
+        Deltas are taken after load(), so a batch flushed in between is
+        missed for this read rather than counted twice. Returns None if
+        load() does.
+        """
+        row = load()
+        deltas = self.pending(user_id)
+        if row is None:
+            return None
+        row = dict(row)
+        for field in FIELDS:
+            row[field] = (row.get(field) or 0) + deltas[field]
+        return row
+
+    def flush(self):
+        """Write all buffered increments in one batched upsert"""
+        with self._flush_lock:
+            # Swap the buffer out; increments from here on start a new one
+            with self._lock:
+                batch = {user_id: deltas for user_id, deltas in self._buffer.items()
+                         if any(deltas.values())}
+                self._buffer = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+                self._pending_total = 0
+            if not batch:
+                return 0
+
+            rows = [(user_id, *(deltas[field] for field in FIELDS))
+                    for user_id, deltas in batch.items()]
+            try:
+                with self.app.app_context():
+                    with database.transaction() as cursor:
+                        cursor.executemany('''INSERT INTO progress (user_id, notes_created,
+                                             quizzes_taken, questions_asked)
+                                             VALUES (%s, %s, %s, %s)
+                                             ON DUPLICATE KEY UPDATE
+                                             notes_created = notes_created + VALUES(notes_created),
+                                             quizzes_taken = quizzes_taken + VALUES(quizzes_taken),
+                                             questions_asked = questions_asked + VALUES(questions_asked)''',
+                                           rows)
+            except Exception:
+                self._restore(batch)
+                raise
+            return len(rows)
+
+    def shutdown(self):
+        """Stop the flush thread and write whatever is still buffered"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def _restore(self, batch):
+        with self._lock:
+            for user_id, deltas in batch.items():
+                for field, amount in deltas.items():
+                    self._buffer[user_id][field] += amount
+                    self._pending_total += amount
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                # Deltas were restored, the next tick retries
+                self.app.logger.warning('Progress flush failed: %s', e)
+
+
+# The current app's instance; create_app() builds one per app
+progress_counters = LocalProxy(lambda: current_app.extensions['progress_counters'])
@@ -0,0 +1,117 @@
+"""
+Pooled data-access layer
+Handlers keep writing raw SQL, but connections come from the SQLAlchemy
+engine pool (sized, pre-pinged and recycled) instead of one fresh MySQL
+connection per request.
+
+Each app context checks out at most one connection. Reads use cursor();
+writes go through transaction() so a request commits exactly once.
+"""
+
+from contextlib import contextmanager
+
+import pymysql.cursors
+from flask import g, has_app_context
+
+from app.extensions import db
+from app.metrics import TimedCursor
+
+
+def init_app(app):
+    """Configure the engine pool and return connections on teardown"""
+    app.config.setdefault('DB_POOL_SIZE', 10)
+    app.config.setdefault('DB_MAX_OVERFLOW', 5)
+    app.config.setdefault('DB_POOL_RECYCLE', 1800)
+    app.config.setdefault('DB_POOL_TIMEOUT', 10)
+
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    options.setdefault('pool_pre_ping', True)
+    options.setdefault('pool_recycle', app.config['DB_POOL_RECYCLE'])
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        options.setdefault('pool_size', app.config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', app.config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', app.config['DB_POOL_TIMEOUT'])
+
+    db.init_app(app)
+    app.teardown_appcontext(release_connection)
+
+
+def get_connection():
+    """Pooled DBAPI connection for the current app context"""
+    if 'db_conn' not in g:
+        g.db_conn = db.engine.raw_connection()
+    return g.db_conn
+
+
+def release_connection(exc=None):
+    """Roll back anything uncommitted and return the connection to the pool"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        try:
+            conn.rollback()
+        finally:
+            conn.close()
+
+
+def release_idle_connection():
+    """Hand the context's connection back to the pool unless a transaction is open
+
+    Called before slow upstream calls so a request waiting on Gemini does
+    not pin a pooled connection; the next query checks one out again.
+    """
+    if has_app_context() and not g.get('db_transactions'):
+        release_connection()
+
+
+def get_cursor(dict_rows=False):
+    """Cursor on the request's connection, rows as dicts if dict_rows
+
+    Query time is counted towards the request's 'db' phase.
+    """
+    conn = get_connection()
+    return TimedCursor(conn.cursor(pymysql.cursors.DictCursor) if dict_rows else conn.cursor())
+
+
+@contextmanager
+def transaction(dict_rows=False):
+    """Run a block of writes as one transaction with a single commit"""
+    conn = get_connection()
+    cursor = get_cursor(dict_rows)
+    g.db_transactions = g.get('db_transactions', 0) + 1
+    try:
+        yield cursor
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        g.db_transactions -= 1
+        cursor.close()
+
+
+@contextmanager
+def streaming_cursor(net_write_timeout=600):
+    """Unbuffered dict cursor on a connection of its own, for result sets too big to hold
+
+    Rows are read from the socket as the caller iterates, so the request's
+    pooled connection stays usable and memory stays flat. The server holds
+    the result open until it is read, hence the longer net_write_timeout
+    for slow readers. A stream abandoned half-read leaves unread rows on
+    the connection, so it is discarded instead of going back to the pool.
+    """
+    conn = db.engine.raw_connection()
+    finished = False
+    try:
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        cursor.execute('SET SESSION net_write_timeout = %s', (net_write_timeout,))
+        yield TimedCursor(cursor)
+        cursor.close()
+        cursor = conn.cursor()
+        cursor.execute('SET SESSION net_write_timeout = DEFAULT')
+        cursor.close()
+        conn.rollback()
+        finished = True
+    finally:
+        if not finished:
+            conn.invalidate()
+        conn.close()
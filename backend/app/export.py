@@ -0,0 +1,125 @@
+"""
+Streaming data export
+A user's data (or every user's, for the admin export) is read through an
+unbuffered server-side cursor and written out as NDJSON, one row per line,
+compressed as it goes. Either one gzipped stream with a `table` tag on
+each line, or a zip with one NDJSON file per table. Output is handed to
+the response in EXPORT_CHUNK_SIZE pieces, so memory use depends on the
+largest single row, not on how much a user has stored.
+"""
+
+import json
+import zlib
+import zipfile
+from datetime import date, datetime
+
+from app import database
+
+# (table, columns); the password hash is never exported
+SECTIONS = [
+    ('users', 'id, name, email, created_at'),
+    ('notes', 'id, user_id, title, content, summary, created_at'),
+    ('quizzes', 'id, user_id, note_id, questions, created_at'),
+    ('quiz_attempts', 'id, user_id, quiz_id, score, correct, total, answers, created_at'),
+    ('conversations', 'id, user_id, title, summary, created_at'),
+    ('chat_history', 'id, user_id, conversation_id, question, answer, created_at'),
+    ('progress', 'user_id, notes_created, quizzes_taken, questions_asked, study_streak, '
+                 'avg_score, quiz_attempts, last_activity_date'),
+]
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def to_line(row):
+    return json.dumps(row, default=_default, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def export_rows(user_id=None, net_write_timeout=600, archived_turns=None):
+    """(table, row) for every exported row, one user's or everyone's
+
+    All tables are read in one consistent snapshot, table by table; the
+    admin export orders each table by owner. archived_turns(user_id,
+    cursor), if given, supplies chat turns moved out of chat_history,
+    reading the archive index on the snapshot's cursor so an archival run
+    meanwhile can't list a turn twice or not at all. They are listed ahead
+    of the ones still in the table.
+    """
+    with database.streaming_cursor(net_write_timeout) as cursor:
+        cursor.execute('START TRANSACTION WITH CONSISTENT SNAPSHOT')
+        for table, columns in SECTIONS:
+            if table == 'chat_history' and archived_turns is not None:
+                for row in archived_turns(user_id, cursor):
+                    yield table, row
+            owner = 'id' if table == 'users' else 'user_id'
+            if user_id is None:
+                cursor.execute(f'SELECT {columns} FROM {table} ORDER BY {owner}')
+            else:
+                cursor.execute(f'SELECT {columns} FROM {table} WHERE {owner} = %s', (user_id,))
+            for row in cursor:
+                yield table, row
+
+
+class _Chunks:
+    """Write target that hands out what was written in chunk_size pieces"""
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def ready(self):
+        return self.size >= self.chunk_size
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        self.size = 0
+        return data
+
+
+def gzip_ndjson(records, level=6, chunk_size=64 * 1024):
+    """Gzipped NDJSON of {"table": ..., "row": ...} lines, yielded in chunks"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    out = _Chunks(chunk_size)
+    for table, row in records:
+        out.write(compressor.compress(to_line({'table': table, 'row': row})))
+        if out.ready():
+            yield out.take()
+    out.write(compressor.flush())
+    yield out.take()
+
+
+def zip_ndjson(records, level=6, chunk_size=64 * 1024):
+    """Zip with one <table>.ndjson per table, yielded in chunks
+
+    records must arrive grouped by table. The target is not seekable, so
+    zipfile writes sizes in data descriptors after each member.
+    """
+    out = _Chunks(chunk_size)
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=level) as archive:
+        member = None
+        current = None
+        for table, row in records:
+            if table != current:
+                if member is not None:
+                    member.close()
+                member = archive.open(f'{table}.ndjson', 'w', force_zip64=True)
+                current = table
+            member.write(to_line(row))
+            if out.ready():
+                yield out.take()
+        if member is not None:
+            member.close()
+    yield out.take()
@@ -0,0 +1,8 @@
+"""
+Flask extensions
+Shared SQLAlchemy instance, its engine provides the pooled MySQL connections
+"""
+
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
@@ -0,0 +1,219 @@
+"""
+Image fingerprints for OCR reuse
+Every OCR result is stored with the SHA-256 of the preprocessed JPEG and
+its 64-bit dHash. A new upload with the same SHA-256 reuses the stored text
+without calling Gemini. With OCR_NEAR_DUPLICATE_DISTANCE > 0, an upload
+whose dHash is within that many bits of a stored one (another photo of the
+same slide) reuses it too.
+
+Exact matches are a unique-index lookup in MySQL. Near matches go through
+an in-memory multi-index hash of the dHashes, loaded lazily and topped up
+from the table every FINGERPRINT_SYNC_INTERVAL seconds so rows written by
+other workers become visible. Auto-increment ids can commit out of order,
+so each sync re-reads the last FINGERPRINT_SYNC_OVERLAP ids before its
+high-water mark and only adds the rows it hasn't seen.
+"""
+
+import hashlib
+import threading
+import time
+from array import array
+from itertools import combinations
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from app import database
+
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit hashes
+
+    Each hash is split into `chunks` substrings with one table apiece. Two
+    hashes within distance r agree to within r // chunks bits on at least
+    one substring, so a search only probes those neighbours and checks the
+    candidates' full distance. Storage is flat arrays, ~8 bytes per hash
+    plus 4 per table.
+    """
+
+    def __init__(self, chunks=4, bits=64):
+        self.chunks = chunks
+        self.chunk_bits = bits // chunks
+        self.mask = (1 << self.chunk_bits) - 1
+        self.hashes = array('Q')
+        self.ids = array('Q')
+        self.tables = [{} for _ in range(chunks)]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, value, item_id):
+        position = len(self.hashes)
+        self.hashes.append(value)
+        self.ids.append(item_id)
+        for i, table in enumerate(self.tables):
+            key = (value >> (i * self.chunk_bits)) & self.mask
+            bucket = table.get(key)
+            if bucket is None:
+                bucket = table[key] = array('I')
+            bucket.append(position)
+
+    def search(self, value, max_distance, limit=1):
+        """Up to `limit` (distance, id) pairs within max_distance, closest first"""
+        radius = max_distance // self.chunks
+        seen = set()
+        found = []
+        for i, table in enumerate(self.tables):
+            key = (value >> (i * self.chunk_bits)) & self.mask
+            for probe in self._neighbours(key, radius):
+                for position in table.get(probe, ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    distance = (self.hashes[position] ^ value).bit_count()
+                    if distance <= max_distance:
+                        found.append((distance, self.ids[position]))
+        found.sort()
+        return found[:limit]
+
+    def _neighbours(self, key, radius):
+        yield key
+        for flips in range(1, radius + 1):
+            for bits in combinations(range(self.chunk_bits), flips):
+                probe = key
+                for bit in bits:
+                    probe ^= 1 << bit
+                yield probe
+
+
+class FingerprintStore:
+    """Lookup/insert of OCR results by image fingerprint"""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.max_distance = 0
+        self.sync_interval = 5.0
+        self.sync_overlap = 1000
+        self.index = HammingIndex()
+        self._synced_through = 0
+        # Indexed ids a sync may read again, i.e. within the overlap window
+        self._recent = set()
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {'exact_hits': 0, 'near_hits': 0, 'misses': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('OCR_DEDUP', True)
+        app.config.setdefault('OCR_NEAR_DUPLICATE_DISTANCE', 0)
+        app.config.setdefault('FINGERPRINT_SYNC_INTERVAL', 5.0)
+        app.config.setdefault('FINGERPRINT_SYNC_OVERLAP', 1000)
+        self.enabled = app.config['OCR_DEDUP']
+        self.max_distance = app.config['OCR_NEAR_DUPLICATE_DISTANCE']
+        self.sync_interval = app.config['FINGERPRINT_SYNC_INTERVAL']
+        self.sync_overlap = app.config['FINGERPRINT_SYNC_OVERLAP']
+        app.extensions['fingerprints'] = self
+
+    def lookup(self, sha256, phash):
+        """Stored OCR text for a matching image, or None"""
+        if not self.enabled:
+            return None
+
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute('SELECT ocr_text FROM image_fingerprints WHERE sha256 = %s', (sha256,))
+        row = cursor.fetchone()
+        if row:
+            self._bump('exact_hits')
+            return row['ocr_text']
+
+        if self.max_distance > 0:
+            self._sync()
+            with self._lock:
+                match = self.index.search(phash, self.max_distance)
+            if match:
+                cursor.execute('SELECT ocr_text FROM image_fingerprints WHERE id = %s', (match[0][1],))
+                row = cursor.fetchone()
+                if row:
+                    self._bump('near_hits')
+                    return row['ocr_text']
+
+        self._bump('misses')
+        return None
+
+    def add(self, sha256, phash, text):
+        """Remember the OCR text for an image"""
+        if not self.enabled:
+            return
+        with database.transaction() as cursor:
+            cursor.execute('''INSERT IGNORE INTO image_fingerprints (sha256, phash, ocr_text)
+                             VALUES (%s, %s, %s)''', (sha256, phash, text))
+            row_id = cursor.lastrowid if cursor.rowcount == 1 else None
+        if row_id and self.max_distance > 0:
+            with self._lock:
+                # Searchable right away here; syncs that read it again skip it
+                if row_id not in self._recent:
+                    self.index.add(phash, row_id)
+                    if row_id > self._synced_through - self.sync_overlap:
+                        self._recent.add(row_id)
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['indexed'] = len(self.index)
+        return stats
+
+    def _sync(self, batch_size=50000):
+        """Load fingerprints added since the last sync into the index
+
+        Starts sync_overlap ids below the highest id seen, so a row whose
+        lower id committed after higher ones were synced is still picked
+        up. Pages are read without holding the index lock, so lookups keep
+        searching the current index meanwhile; only merging a page takes
+        it. One thread syncs at a time, the others skip.
+        """
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            if now - self._last_sync < self.sync_interval:
+                return
+            cursor = database.get_cursor()
+            after = max(0, self._synced_through - self.sync_overlap)
+            while True:
+                cursor.execute('''SELECT id, phash FROM image_fingerprints WHERE id > %s
+                                 ORDER BY id LIMIT %s''', (after, batch_size))
+                rows = cursor.fetchall()
+                with self._lock:
+                    for row_id, phash in rows:
+                        if row_id not in self._recent:
+                            self.index.add(phash, row_id)
+                            self._recent.add(row_id)
+                    if rows:
+                        after = rows[-1][0]
+                        self._synced_through = max(self._synced_through, after)
+                if len(rows) < batch_size:
+                    break
+            with self._lock:
+                # Ids below the next sync's start are never read again
+                floor = self._synced_through - self.sync_overlap
+                self._recent = {row_id for row_id in self._recent if row_id > floor}
+            self._last_sync = now
+        finally:
+            self._sync_lock.release()
+
+    def _bump(self, counter):
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+
+def sha256_hex(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# The current app's instance; create_app() builds one per app
+fingerprints = LocalProxy(lambda: current_app.extensions['fingerprints'])
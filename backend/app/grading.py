@@ -0,0 +1,87 @@
+"""
+Quiz grading and score/streak bookkeeping
+An attempt is graded against the questions stored with the quiz, saved to
+quiz_attempts, and folded into the user's progress row with one upsert:
+avg_score is a running mean over quiz_attempts and study_streak advances
+from last_activity_date, so neither needs the attempt history to compute.
+"""
+
+import json
+from datetime import timedelta
+
+
+def _normalize(value):
+    return ' '.join(str(value).split()).casefold()
+
+
+def _chosen(question, answer):
+    """Option text for an answer given as text or as an option index"""
+    options = question.get('options') or []
+    if isinstance(answer, int) and not isinstance(answer, bool) and 0 <= answer < len(options):
+        return options[answer]
+    return answer
+
+
+def grade_quiz(questions, answers):
+    """Grade answers against a quiz's questions
+
+    answers is either a list in question order or a dict keyed by
+    question id; each answer is the option text or its index. Returns
+    (correct, total, results) with one result per question.
+    """
+    if isinstance(answers, dict):
+        answers = {str(key): value for key, value in answers.items()}
+
+    results = []
+    correct = 0
+    for position, question in enumerate(questions):
+        question_id = question.get('id', position + 1)
+        if isinstance(answers, dict):
+            answer = answers.get(str(question_id))
+        else:
+            answer = answers[position] if position < len(answers) else None
+        chosen = _chosen(question, answer) if answer is not None else None
+        is_correct = chosen is not None and _normalize(chosen) == _normalize(question.get('correct', ''))
+        correct += is_correct
+        results.append({
+            'id': question_id,
+            'answer': chosen,
+            'correct': is_correct,
+            'correct_answer': question.get('correct'),
+        })
+    return correct, len(questions), results
+
+
+def current_streak(streak, last_activity_date, today):
+    """Streak as of today; a streak with no activity yesterday or today has lapsed"""
+    if not last_activity_date or last_activity_date < today - timedelta(days=1):
+        return 0
+    return streak or 0
+
+
+def record_attempt(cursor, user_id, quiz_id, correct, total, answers, today):
+    """Store an attempt and fold its score into progress, inside the caller's transaction
+
+    Returns (attempt id, score in percent). MySQL applies the ON DUPLICATE
+    KEY assignments left to right, so avg_score and study_streak read the
+    old quiz_attempts and last_activity_date before those are advanced.
+    """
+    score = round(100.0 * correct / total, 2) if total else 0.0
+    cursor.execute('''INSERT INTO quiz_attempts (user_id, quiz_id, score, correct, total, answers)
+                     VALUES (%s, %s, %s, %s, %s, %s)''',
+                  (user_id, quiz_id, score, correct, total, json.dumps(answers)))
+    attempt_id = cursor.lastrowid
+
+    cursor.execute('''INSERT INTO progress (user_id, avg_score, quiz_attempts, study_streak,
+                     last_activity_date)
+                     VALUES (%s, %s, 1, 1, %s)
+                     ON DUPLICATE KEY UPDATE
+                     avg_score = (avg_score * quiz_attempts + %s) / (quiz_attempts + 1),
+                     quiz_attempts = quiz_attempts + 1,
+                     study_streak = CASE
+                         WHEN last_activity_date = %s THEN study_streak
+                         WHEN last_activity_date = %s THEN study_streak + 1
+                         ELSE 1 END,
+                     last_activity_date = %s''',
+                  (user_id, score, today, score, today, today - timedelta(days=1), today))
+    return attempt_id, score
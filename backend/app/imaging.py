@@ -0,0 +1,72 @@
+"""
+Image preprocessing for OCR
+Normalises uploads before the Gemini vision call: applies EXIF rotation,
+downscales to a maximum dimension, optionally converts to grayscale and
+re-encodes as a compact JPEG.
+"""
+
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+class InvalidImage(ValueError):
+    """Upload could not be decoded as an image"""
+
+
+def preprocess_image(source, max_dimension=1600, grayscale=True, quality=80):
+    """Return (jpeg_bytes, (width, height)) for a file-like object or bytes
+
+    Raises InvalidImage for anything that cannot be decoded: unknown
+    formats, truncated or corrupt files, and decompression bombs.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+
+    try:
+        image = Image.open(source)
+        # For JPEGs, let the decoder skip straight to a reduced scale
+        image.draft('L' if grayscale else 'RGB', (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+    except UnidentifiedImageError as e:
+        raise InvalidImage('Unsupported image format') from e
+    except Image.DecompressionBombError as e:
+        raise InvalidImage('Image dimensions too large') from e
+    except OSError as e:
+        raise InvalidImage('Image is truncated or corrupt') from e
+
+    # Pixel data is only decoded here, so damage past the header shows up now
+    try:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        image = image.convert('L' if grayscale else 'RGB')
+    except Image.DecompressionBombError as e:
+        raise InvalidImage('Image dimensions too large') from e
+    except (OSError, SyntaxError) as e:
+        raise InvalidImage('Image is truncated or corrupt') from e
+
+    out = BytesIO()
+    image.save(out, format='JPEG', quality=quality, optimize=True)
+    return out.getvalue(), image.size
+
+
+def dhash(jpeg_bytes, hash_size=8):
+    """64-bit difference hash of an image, robust to rescaling and recompression
+
+    Each bit says whether a pixel is brighter than its right neighbour in a
+    (hash_size + 1) x hash_size grayscale thumbnail.
+    """
+    try:
+        image = Image.open(BytesIO(jpeg_bytes))
+        # JPEG decodes at 1/8 scale here, the full image is never rebuilt
+        image.draft('L', (hash_size * 8, hash_size * 8))
+        image = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidImage('Unsupported image format') from e
+
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
@@ -0,0 +1,124 @@
+"""
+Background job queue
+Runs slow work (Gemini vision calls, DB inserts) off the request thread.
+
+Jobs are persisted in the `jobs` table so any worker can report their
+status. They execute on an in-process thread pool by default, or on the
+Celery worker from app.celery_app when CELERY_BROKER_URL is set.
+
+Handlers are registered once per process with @task(kind); each app's
+JobQueue dispatches to them.
+"""
+
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from app import database
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# kind -> handler, shared by every app's queue
+HANDLERS = {}
+
+
+def task(kind):
+    """Register a handler for a job kind"""
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+class JobQueue:
+    """Submit/poll job queue backed by the jobs table"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.handlers = HANDLERS
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('JOB_WORKERS', 4)
+        app.config.setdefault('CELERY_BROKER_URL', None)
+        self.executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'],
+                                           thread_name_prefix='job')
+        app.extensions['jobs'] = self
+
+    def submit(self, kind, user_id, /, **kwargs):
+        """Persist a queued job and dispatch it, returns the job id
+
+        user_id owns the job; kwargs go to the handler, which may take its
+        own user_id.
+        """
+        if kind not in self.handlers:
+            raise KeyError(f'Unknown job kind: {kind}')
+
+        job_id = uuid.uuid4().hex
+        with database.transaction() as cursor:
+            cursor.execute('''INSERT INTO jobs (id, user_id, kind, status, created_at)
+                             VALUES (%s, %s, %s, %s, %s)''',
+                          (job_id, user_id, kind, STATUS_QUEUED, datetime.now()))
+
+        if self.app.config['CELERY_BROKER_URL']:
+            from app.celery_app import run_job
+            run_job.delay(job_id, kind, kwargs)
+        else:
+            self.executor.submit(self.run, job_id, kind, kwargs)
+        return job_id
+
+    def run(self, job_id, kind, kwargs):
+        """Execute a job inside an app context and record the outcome"""
+        with self.app.app_context():
+            self._set_status(job_id, STATUS_RUNNING)
+            try:
+                result = self.handlers[kind](**kwargs)
+            except Exception as e:
+                self._set_status(job_id, STATUS_FAILED, error=str(e))
+                return
+            self._set_status(job_id, STATUS_DONE, result=result)
+
+    def get(self, job_id, user_id):
+        """Fetch a job owned by user_id, or None"""
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute('''SELECT id, kind, status, result, error, created_at, updated_at
+                         FROM jobs WHERE id = %s AND user_id = %s''',
+                      (job_id, user_id))
+        job = cursor.fetchone()
+        if job and job['result']:
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+
+    def _set_status(self, job_id, status, result=None, error=None):
+        with database.transaction() as cursor:
+            cursor.execute('UPDATE jobs SET status = %s, result = %s, error = %s WHERE id = %s',
+                          (status, json.dumps(result) if result is not None else None,
+                           error, job_id))
+
+
+def save_upload(folder, data):
+    """Write an uploaded payload to disk for a worker to pick up"""
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, uuid.uuid4().hex)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+# The current app's instance; create_app() builds one per app
+jobs = LocalProxy(lambda: current_app.extensions['jobs'])
@@ -0,0 +1,464 @@
+"""
+LLM client shared by every Gemini-backed endpoint
+Keeps GenerativeModel objects alive between requests and bounds the number
+of upstream calls in flight. Callers beyond the limit queue for a slot and
+get LLMBusy if none frees up within LLM_QUEUE_TIMEOUT.
+
+Each call runs under a named policy from LLM_POLICIES (chat, summarize,
+ocr, ...) giving its deadline, how often 429/5xx/timeouts are retried
+(with full-jitter backoff) and whether it is hedged: a second attempt
+starts if the first has not answered by the model's recent p95 latency,
+and whichever finishes first wins. Attempts run on a worker pool so the
+caller can give up at the deadline; an abandoned attempt keeps its slot
+until the upstream call returns, which the backend's transport timeout
+(the time left before the deadline) bounds. A circuit breaker over recent
+outcomes makes calls fail fast with LLMUnavailable during an outage; each
+call records one outcome there, so an abandoned attempt's late answer is
+never counted.
+
+Set LLM_BACKEND=fake to swap Gemini for a deterministic local backend with
+configurable latency and injected faults, for load tests and offline
+development.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+from app import database, metrics
+from app.chunking import estimate_tokens
+from app.resilience import CircuitBreaker, LatencyWindow, backoff_delay, is_retryable
+
+DEFAULT_POLICY = {'deadline': 30.0, 'retries': 2, 'hedge': False}
+# Latency samples a model needs before its p95 replaces LLM_HEDGE_DELAY
+HEDGE_MIN_SAMPLES = 20
+
+
+def prompt_tokens(contents):
+    """Estimated prompt tokens; inline image parts are not counted"""
+    if isinstance(contents, str):
+        return estimate_tokens(contents)
+    return sum(estimate_tokens(part) for part in contents if isinstance(part, str))
+
+
+class LLMBusy(Exception):
+    """No upstream slot became free before the queue timeout"""
+
+
+class LLMUnavailable(LLMBusy):
+    """Upstream is failing: the circuit breaker is open or retries ran out"""
+
+
+class LLMTimeout(LLMBusy):
+    """No answer before the call's deadline"""
+
+
+class UpstreamError(Exception):
+    """Failure injected by FakeBackend, with an HTTP-style code like google.api_core errors"""
+
+    def __init__(self, message, code=503):
+        super().__init__(message)
+        self.code = code
+
+
+class GeminiBackend:
+    """google.generativeai with one cached model object per model name"""
+
+    def __init__(self, api_key, transport=None):
+        import google.generativeai as genai
+        if transport:
+            genai.configure(api_key=api_key, transport=transport)
+        else:
+            genai.configure(api_key=api_key)
+        self._genai = genai
+        self._client = None
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, model_name):
+        model = self._models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._models.setdefault(model_name, self._genai.GenerativeModel(model_name))
+        return model
+
+    def generate(self, model_name, contents, timeout=None):
+        model = self.model(model_name)
+        if timeout is None:
+            return model.generate_content(contents).text
+        # generate_content() takes no per-request timeout in this SDK version,
+        # the underlying API client does
+        if self._client is None:
+            from google.generativeai.client import get_default_generative_client
+            self._client = get_default_generative_client()
+        response = self._client.generate_content(model._prepare_request(contents=contents),
+                                                 timeout=timeout)
+        return self._genai.types.GenerateContentResponse.from_response(response).text
+
+    def stream(self, model_name, contents):
+        for chunk in self.model(model_name).generate_content(contents, stream=True):
+            yield chunk.text
+
+
+class FakeBackend:
+    """Deterministic offline backend, same answer for the same prompt
+
+    Sleeps `latency` seconds per call (split across chunks when streaming).
+    Prompts asking for a JSON array get a well-formed quiz so the quiz
+    endpoints can be exercised end to end.
+
+    Faults: a share `error_rate` of calls fail with UpstreamError(503) and
+    a share `slow_rate` take `slow_latency` seconds longer. inject() queues
+    exact faults for the next calls instead. A call given a timeout raises
+    TimeoutError once it has waited that long, like a transport timeout.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, slow_rate=0.0, slow_latency=5.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.calls = 0
+        self._faults = deque()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def inject(self, *faults):
+        """Queue one fault per upcoming call: an exception to raise, a delay in seconds, or None"""
+        with self._lock:
+            self._faults.extend(faults)
+
+    def generate(self, model_name, contents, timeout=None):
+        expires = time.monotonic() + timeout if timeout is not None else None
+        self._start_call(expires)
+        if self.latency:
+            self._sleep(self.latency, expires)
+        return self._answer(model_name, contents)
+
+    def stream(self, model_name, contents):
+        self._start_call()
+        words = self._answer(model_name, contents).split(' ')
+        for i, word in enumerate(words):
+            if self.latency:
+                time.sleep(self.latency / len(words))
+            yield word if i == 0 else ' ' + word
+
+    def _start_call(self, expires=None):
+        with self._lock:
+            self.calls += 1
+            fault = self._faults.popleft() if self._faults else None
+            failed = self._rng.random() < self.error_rate
+            slow = self._rng.random() < self.slow_rate
+        if isinstance(fault, (int, float)):
+            self._sleep(fault, expires)
+        elif slow:
+            self._sleep(self.slow_latency, expires)
+        if isinstance(fault, BaseException):
+            raise fault
+        if failed:
+            raise UpstreamError('Injected upstream failure', 503)
+
+    @staticmethod
+    def _sleep(seconds, expires):
+        if expires is not None and time.monotonic() + seconds > expires:
+            time.sleep(max(0.0, expires - time.monotonic()))
+            raise TimeoutError('Fake upstream call timed out')
+        time.sleep(seconds)
+
+    def _answer(self, model_name, contents):
+        prompt = contents if isinstance(contents, str) else ' '.join(
+            part if isinstance(part, str) else f'<{len(part.get("data", b""))} bytes>'
+            for part in contents)
+        digest = hashlib.sha256(f'{model_name}\0{prompt}'.encode('utf-8')).hexdigest()[:12]
+
+        if 'JSON array' in prompt:
+            return json.dumps([{
+                'id': i + 1,
+                'question': f'Fake question {i + 1} ({digest})?',
+                'options': ['Option A', 'Option B', 'Option C', 'Option D'],
+                'correct': 'Option A'
+            } for i in range(5)])
+
+        words = re.findall(r'\w+', prompt)[:40]
+        return f'[{model_name} {digest}] ' + ' '.join(words)
+
+
+class LLMClient:
+    """Bounded-concurrency front door for all LLM calls"""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.queue_timeout = 30
+        self.policies = {'default': DEFAULT_POLICY}
+        self.hedging = True
+        self.hedge_delay = 2.0
+        self.hedge_min_delay = 0.2
+        self.hedge_percentile = 95
+        self.retry_base = 0.25
+        self.retry_cap = 4.0
+        self.breaker = CircuitBreaker()
+        self._latencies = {}
+        self._slots = None
+        self._executor = None
+        self._rng = random.Random()
+        self._stats_lock = threading.Lock()
+        self.stats = {'in_flight': 0, 'waiting': 0, 'calls': 0, 'rejected': 0, 'retries': 0,
+                      'hedges': 0, 'hedge_wins': 0, 'timeouts': 0, 'short_circuited': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LLM_BACKEND', 'gemini')
+        app.config.setdefault('LLM_MAX_CONCURRENCY', 16)
+        app.config.setdefault('LLM_QUEUE_TIMEOUT', 30)
+        app.config.setdefault('LLM_POLICIES', {})
+        app.config.setdefault('LLM_HEDGING', True)
+        app.config.setdefault('LLM_HEDGE_DELAY', 2.0)
+        app.config.setdefault('LLM_HEDGE_MIN_DELAY', 0.2)
+        app.config.setdefault('LLM_HEDGE_PERCENTILE', 95)
+        app.config.setdefault('LLM_RETRY_BASE', 0.25)
+        app.config.setdefault('LLM_RETRY_CAP', 4.0)
+        app.config.setdefault('LLM_BREAKER_WINDOW', 30.0)
+        app.config.setdefault('LLM_BREAKER_MIN_CALLS', 20)
+        app.config.setdefault('LLM_BREAKER_ERROR_RATE', 0.5)
+        app.config.setdefault('LLM_BREAKER_COOLDOWN', 30.0)
+        app.config.setdefault('FAKE_LLM_LATENCY', 0.0)
+        app.config.setdefault('FAKE_LLM_ERROR_RATE', 0.0)
+        app.config.setdefault('FAKE_LLM_SLOW_RATE', 0.0)
+        app.config.setdefault('FAKE_LLM_SLOW_LATENCY', 5.0)
+
+        if app.config['LLM_BACKEND'] == 'fake':
+            self.backend = FakeBackend(latency=app.config['FAKE_LLM_LATENCY'],
+                                       error_rate=app.config['FAKE_LLM_ERROR_RATE'],
+                                       slow_rate=app.config['FAKE_LLM_SLOW_RATE'],
+                                       slow_latency=app.config['FAKE_LLM_SLOW_LATENCY'])
+        else:
+            self.backend = GeminiBackend(app.config['GEMINI_API_KEY'],
+                                         app.config.get('GEMINI_TRANSPORT'))
+        self.queue_timeout = app.config['LLM_QUEUE_TIMEOUT']
+        self.policies = {'default': DEFAULT_POLICY}
+        for name, policy in app.config['LLM_POLICIES'].items():
+            self.policies[name] = {**DEFAULT_POLICY, **policy}
+        self.hedging = app.config['LLM_HEDGING']
+        self.hedge_delay = app.config['LLM_HEDGE_DELAY']
+        self.hedge_min_delay = app.config['LLM_HEDGE_MIN_DELAY']
+        self.hedge_percentile = app.config['LLM_HEDGE_PERCENTILE']
+        self.retry_base = app.config['LLM_RETRY_BASE']
+        self.retry_cap = app.config['LLM_RETRY_CAP']
+        self.breaker = CircuitBreaker(window=app.config['LLM_BREAKER_WINDOW'],
+                                      min_calls=app.config['LLM_BREAKER_MIN_CALLS'],
+                                      error_rate=app.config['LLM_BREAKER_ERROR_RATE'],
+                                      cooldown=app.config['LLM_BREAKER_COOLDOWN'])
+        self._slots = threading.BoundedSemaphore(app.config['LLM_MAX_CONCURRENCY'])
+        # Attempts hold a slot while they run, so this many threads always suffice
+        self._executor = ThreadPoolExecutor(max_workers=app.config['LLM_MAX_CONCURRENCY'],
+                                            thread_name_prefix='llm')
+        app.extensions['llm'] = self
+
+    def policy(self, name):
+        return self.policies.get(name) or self.policies['default']
+
+    def generate(self, model_name, contents, policy='default'):
+        """Full response text for a prompt (str) or a list of parts
+
+        Raises LLMBusy (no slot), LLMTimeout (deadline passed) or
+        LLMUnavailable (breaker open, or retryable failures outlasted the
+        retries); other upstream errors propagate unchanged.
+        """
+        settings = self.policy(policy)
+        deadline = time.monotonic() + settings['deadline']
+        database.release_idle_connection()
+        text = self._with_retries(settings, deadline,
+                                  lambda: self._call(model_name, contents, deadline, settings['hedge']))
+        metrics.record_llm_call(model_name, prompt_tokens(contents), estimate_tokens(text))
+        return text
+
+    def stream(self, model_name, contents, policy='default'):
+        """Yield response text chunks, holding a slot until the stream ends
+
+        The policy's deadline applies to the first chunk and again to each
+        gap between chunks. Retries only happen before the first chunk;
+        streams are never hedged.
+        """
+        settings = self.policy(policy)
+        deadline = time.monotonic() + settings['deadline']
+        database.release_idle_connection()
+        completion = 0
+        chunks, text = self._with_retries(settings, deadline,
+                                          lambda: self._open_stream(model_name, contents, deadline))
+        stalled = False
+        try:
+            while text is not None:
+                completion += estimate_tokens(text)
+                yield text
+                text = self._next_chunk(chunks, time.monotonic() + settings['deadline'])
+        except LLMTimeout:
+            stalled = True
+            raise
+        finally:
+            # A stalled read frees its slot itself once it returns
+            if not stalled:
+                self._release()
+        metrics.record_llm_call(model_name, prompt_tokens(contents), completion)
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['breaker'] = self.breaker.state
+        return stats
+
+    def _with_retries(self, settings, deadline, call):
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._bump('short_circuited', 1)
+                raise LLMUnavailable('The AI service is unavailable right now, try again in '
+                                     f'{math.ceil(self.breaker.retry_after()) or 1}s')
+            try:
+                return call()
+            except LLMBusy:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt, self.retry_base, self.retry_cap, self._rng)
+                if attempt >= settings['retries'] or time.monotonic() + delay >= deadline:
+                    raise LLMUnavailable('The AI service is not responding, try again shortly') from e
+                attempt += 1
+                self._bump('retries', 1)
+                time.sleep(delay)
+
+    def _call(self, model_name, contents, deadline, hedge):
+        """One attempt, plus a hedge if it is slow; first success wins
+
+        Records a single breaker outcome for the call. Attempts still
+        running when it returns or times out are not counted.
+        """
+        self._acquire(deadline)
+        primary = self._submit(self._attempt, model_name, contents, deadline)
+        pending = [primary]
+        hedge_at = time.monotonic() + self._hedge_delay(model_name) if hedge and self.hedging else None
+        error = None
+        with metrics.phase('llm'):
+            while pending:
+                wake = min(deadline, hedge_at) if hedge_at else deadline
+                done, _ = wait(pending, timeout=max(0.0, wake - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    if future.exception() is None:
+                        if future is not primary:
+                            self._bump('hedge_wins', 1)
+                        self.breaker.record(True)
+                        return future.result()
+                    error = error or future.exception()
+                if not pending:
+                    break
+                now = time.monotonic()
+                if hedge_at and now >= hedge_at:
+                    hedge_at = None
+                    # Hedge only with a spare slot, never by queueing for one
+                    if self._slots.acquire(blocking=False):
+                        self._bump('hedges', 1)
+                        pending.append(self._submit(self._attempt, model_name, contents, deadline))
+                if now >= deadline:
+                    self._timed_out()
+        if is_retryable(error) and time.monotonic() >= deadline:
+            # The attempts ran into their transport timeout at the deadline
+            self._timed_out(error)
+        self.breaker.record(not is_retryable(error))
+        raise error
+
+    def _timed_out(self, cause=None):
+        self._bump('timeouts', 1)
+        self.breaker.record(False)
+        raise LLMTimeout('The AI service took too long to answer, try again shortly') from cause
+
+    def _attempt(self, model_name, contents, deadline):
+        started = time.monotonic()
+        # The transport gives up at the deadline too, so an abandoned attempt frees its slot
+        text = self.backend.generate(model_name, contents, timeout=max(0.0, deadline - started))
+        self._latencies.setdefault(model_name, LatencyWindow()).add(time.monotonic() - started)
+        return text
+
+    def _open_stream(self, model_name, contents, deadline):
+        """(chunk iterator, first chunk) for a new upstream stream"""
+        self._acquire(deadline)
+        self._bump('in_flight', 1)
+        self._bump('calls', 1)
+        chunks = iter(self.backend.stream(model_name, contents))
+        try:
+            first = self._next_chunk(chunks, deadline)
+        except LLMTimeout:
+            self.breaker.record(False)
+            raise
+        except Exception as e:
+            self.breaker.record(not is_retryable(e))
+            self._release()
+            raise
+        self.breaker.record(True)
+        return chunks, first
+
+    def _next_chunk(self, chunks, deadline):
+        future = self._executor.submit(next, chunks, None)
+        with metrics.phase('llm'):
+            done, _ = wait([future], timeout=max(0.0, deadline - time.monotonic()))
+        if not done:
+            self._bump('timeouts', 1)
+            future.add_done_callback(lambda _: self._release())
+            raise LLMTimeout('The AI service took too long to answer, try again shortly')
+        return future.result()
+
+    def _hedge_delay(self, model_name):
+        window = self._latencies.get(model_name)
+        if window is None or len(window) < HEDGE_MIN_SAMPLES:
+            return self.hedge_delay
+        return max(self.hedge_min_delay, window.percentile(self.hedge_percentile))
+
+    def _acquire(self, deadline):
+        """Take an upstream slot, waiting up to the queue timeout or the deadline"""
+        self._bump('waiting', 1)
+        with metrics.phase('llm_wait'):
+            acquired = self._slots.acquire(timeout=max(0.0, min(self.queue_timeout,
+                                                                deadline - time.monotonic())))
+        self._bump('waiting', -1)
+        if not acquired:
+            self._bump('rejected', 1)
+            raise LLMBusy('Too many AI requests in flight, try again shortly')
+
+    def _submit(self, fn, *args):
+        """Run fn on the attempt pool, holding the slot already taken until it returns"""
+        self._bump('in_flight', 1)
+        self._bump('calls', 1)
+
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        try:
+            return self._executor.submit(run)
+        except Exception:
+            self._release()
+            raise
+
+    def _release(self):
+        self._bump('in_flight', -1)
+        self._slots.release()
+
+    def _bump(self, counter, delta):
+        with self._stats_lock:
+            self.stats[counter] += delta
+
+
+# The current app's instance; create_app() builds one per app
+llm = LocalProxy(lambda: current_app.extensions['llm'])
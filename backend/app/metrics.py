@@ -0,0 +1,237 @@
+"""
+Request phase timing and Prometheus metrics
+Code wraps the expensive parts of a request in phase('db' | 'llm' |
+'image' | 'serialize' ...). Phase times are summed per request and, when
+the response is sent, observed into histograms labelled by endpoint, so a
+slow /api/notes/ocr can be broken down into decoding, Gemini and MySQL.
+
+Histograms are rendered at /metrics in the Prometheus text format, and
+requests slower than SLOW_REQUEST_MS are logged as one JSON line each.
+
+Metrics are per process; with several workers, scrape each one. Streamed
+(SSE) responses are measured up to the point the stream starts.
+"""
+
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.local import LocalProxy
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+slow_log = logging.getLogger('aivora.slow_requests')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Thread-safe labelled histogram with fixed upper bounds"""
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self, **labels):
+        """(bucket counts, sum, count) for one label set, or None"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return (list(series[0]), series[1], series[2]) if series else None
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        for key, (counts, total, count) in series:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{_labels(pairs + [("le", _number(bound))])}}} {cumulative}')
+            suffix = f'{{{_labels(pairs)}}}' if pairs else ''
+            lines.append(f'{self.name}_sum{suffix} {_number(total)}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return '\n'.join(lines)
+
+
+REQUEST_SECONDS = Histogram('aivora_request_duration_seconds',
+                            'Time to produce a response', ('endpoint', 'method', 'status'))
+PHASE_SECONDS = Histogram('aivora_request_phase_seconds',
+                          'Time spent per phase of a request (summed within the request)',
+                          ('endpoint', 'phase'))
+LLM_TOKENS = Histogram('aivora_llm_tokens',
+                       'Estimated tokens per LLM call', ('model', 'kind'), TOKEN_BUCKETS)
+REGISTRY = (REQUEST_SECONDS, PHASE_SECONDS, LLM_TOKENS)
+
+
+@contextmanager
+def phase(name):
+    """Time a block as part of the current request's `name` phase
+
+    Outside a request (background jobs, worker pools) the block is
+    observed directly under endpoint="background".
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if has_request_context():
+            if 'phases' in g:
+                g.phases[name] = g.phases.get(name, 0.0) + elapsed
+        else:
+            PHASE_SECONDS.observe(elapsed, endpoint='background', phase=name)
+
+
+def record_llm_call(model_name, prompt_tokens, completion_tokens):
+    """Count tokens for one LLM call"""
+    LLM_TOKENS.observe(prompt_tokens, model=model_name, kind='prompt')
+    LLM_TOKENS.observe(completion_tokens, model=model_name, kind='completion')
+    if has_request_context() and 'llm_tokens' in g:
+        g.llm_calls += 1
+        g.llm_tokens['prompt'] += prompt_tokens
+        g.llm_tokens['completion'] += completion_tokens
+
+
+class TimedCursor:
+    """DBAPI cursor proxy that counts execute/fetch time as the 'db' phase"""
+
+    __slots__ = ('_cursor',)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        with phase('db'):
+            return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        with phase('db'):
+            return self._cursor.executemany(*args, **kwargs)
+
+    def fetchone(self):
+        with phase('db'):
+            return self._cursor.fetchone()
+
+    def fetchmany(self, *args, **kwargs):
+        with phase('db'):
+            return self._cursor.fetchmany(*args, **kwargs)
+
+    def fetchall(self):
+        with phase('db'):
+            return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with dumps() timed as the 'serialize' phase"""
+
+    def dumps(self, obj, **kwargs):
+        with phase('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+class Metrics:
+    """Per-request timing hooks, /metrics and the slow request log"""
+
+    def __init__(self, app=None):
+        self.slow_ms = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_REQUEST_MS', 2000)
+        self.slow_ms = app.config['SLOW_REQUEST_MS']
+
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule('/metrics', 'metrics', self.render)
+        app.extensions['metrics'] = self
+
+    def render(self):
+        body = '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+        return Response(body, mimetype='text/plain; version=0.0.4')
+
+    def _start(self):
+        g.request_started = time.perf_counter()
+        g.phases = {}
+        g.llm_calls = 0
+        g.llm_tokens = {'prompt': 0, 'completion': 0}
+
+    def _finish(self, response):
+        started = g.pop('request_started', None)
+        if started is None or request.endpoint == 'metrics':
+            return response
+
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method,
+                                status=response.status_code)
+        phases = g.get('phases', {})
+        for name, seconds in phases.items():
+            PHASE_SECONDS.observe(seconds, endpoint=endpoint, phase=name)
+
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            slow_log.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 1),
+                'phases_ms': {name: round(s * 1000, 1) for name, s in phases.items()},
+                'unaccounted_ms': round((elapsed - sum(phases.values())) * 1000, 1),
+                'llm_calls': g.get('llm_calls', 0),
+                'llm_tokens': g.get('llm_tokens'),
+            }))
+        return response
+
+
+# The current app's instance; create_app() builds one per app
+request_metrics = LocalProxy(lambda: current_app.extensions['metrics'])
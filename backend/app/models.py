@@ -0,0 +1,161 @@
+"""
+Database models
+Mirror the tables created by setup_db.py, used for migrations and tests.
+Request handlers use raw SQL through app.database.
+"""
+
+from datetime import datetime
+
+from sqlalchemy.dialects import mysql
+
+from app.extensions import db
+
+
+class User(db.Model):
+    __tablename__ = 'users'
+
+    id = db.Column(db.Integer, primary_key=True)
+    display_name = db.Column('name', db.String(255))
+    email = db.Column(db.String(255), unique=True, nullable=False)
+    password_hash = db.Column('password', db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class Note(db.Model):
+    __tablename__ = 'notes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    title = db.Column(db.String(255))
+    content = db.Column(db.Text(length=2**32 - 1))
+    content_hash = db.Column(db.String(64))
+    summary = db.Column(db.Text(length=2**32 - 1))
+    summary_hash = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('idx_notes_user_created', 'user_id', 'created_at', 'id', 'title'),
+        db.Index('ft_notes_title_content', 'title', 'content', mysql_prefix='FULLTEXT'),
+    )
+
+
+class Quiz(db.Model):
+    __tablename__ = 'quizzes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    note_id = db.Column(db.Integer, db.ForeignKey('notes.id', ondelete='CASCADE'))
+    questions = db.Column(db.Text(length=2**32 - 1))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+
+class QuizAttempt(db.Model):
+    __tablename__ = 'quiz_attempts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    correct = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Integer, nullable=False)
+    answers = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('idx_attempts_quiz', 'quiz_id', 'id'),
+    )
+
+
+class Conversation(db.Model):
+    __tablename__ = 'conversations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    title = db.Column(db.String(255))
+    summary = db.Column(db.Text(length=2**32 - 1))
+    summarized_through_id = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class ChatHistory(db.Model):
+    __tablename__ = 'chat_history'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id', ondelete='CASCADE'))
+    question = db.Column(db.Text)
+    answer = db.Column(db.Text(length=2**32 - 1))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('idx_chat_conversation', 'conversation_id', 'id'),
+        db.Index('idx_chat_created', 'created_at'),
+        db.Index('ft_chat_question_answer', 'question', 'answer', mysql_prefix='FULLTEXT'),
+    )
+
+
+class ChatArchive(db.Model):
+    __tablename__ = 'chat_archives'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    conversation_id = db.Column(db.Integer)
+    path = db.Column(db.String(255), nullable=False)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
+    turns = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('idx_archives_user', 'user_id', 'last_id'),
+        db.Index('idx_archives_conversation', 'conversation_id', 'last_id'),
+    )
+
+
+class Progress(db.Model):
+    __tablename__ = 'progress'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    notes_created = db.Column(db.Integer, default=0)
+    quizzes_taken = db.Column(db.Integer, default=0)
+    questions_asked = db.Column(db.Integer, default=0)
+    study_streak = db.Column(db.Integer, default=0)
+    avg_score = db.Column(db.Float, default=0)
+    quiz_attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_activity_date = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    __table_args__ = (
+        db.Index('uq_progress_user', 'user_id', unique=True),
+    )
+
+
+class ImageFingerprint(db.Model):
+    __tablename__ = 'image_fingerprints'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+    # 64-bit dHash, so unsigned on MySQL like setup_db.py and migration 0007
+    phash = db.Column(db.BigInteger().with_variant(mysql.BIGINT(unsigned=True), 'mysql'), nullable=False)
+    ocr_text = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('uq_fingerprints_sha256', 'sha256', unique=True),
+    )
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
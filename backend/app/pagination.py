@@ -0,0 +1,38 @@
+"""
+Keyset (cursor) pagination helpers
+A cursor is the (created_at, id) of the last row on a page, encoded as an
+opaque URL-safe token. The next page starts strictly after it, so each
+page is an index range scan no matter how deep the client has paged.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+
+class InvalidCursor(ValueError):
+    """Cursor token could not be decoded"""
+
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (created_at, id) from a token made by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def parse_limit(value, default, maximum):
+    """Clamp a ?limit= query value to 1..maximum"""
+    try:
+        limit = int(value) if value is not None else default
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
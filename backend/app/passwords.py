@@ -0,0 +1,129 @@
+"""
+Password hashing off the request threads
+The KDFs behind generate_password_hash/check_password_hash are meant to
+burn CPU, and on a request thread they hold the GIL for their whole run.
+Hashing and checking run on a small process pool instead. Admission is
+bounded: once PASSWORD_WORKERS + PASSWORD_QUEUE_MAX calls are in flight,
+new ones fail fast with HasherBusy rather than queueing behind a login storm.
+
+Hashes record their parameters, so raising the cost (PASSWORD_HASH_METHOD)
+needs no migration: a successful login with an older hash returns a fresh
+one for the caller to store.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app import metrics
+
+
+class HasherBusy(Exception):
+    """Too many password hashes in flight, or one took too long"""
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method)
+
+
+def _verify(stored_hash, password, method, current_params):
+    """(matches, replacement hash or None) for one login attempt"""
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    if hash_params(stored_hash) != current_params:
+        return True, generate_password_hash(password, method)
+    return True, None
+
+
+def hash_params(password_hash):
+    """Method and cost prefix of a werkzeug hash, e.g. 'scrypt:32768:8:1'"""
+    return password_hash.split('$', 1)[0]
+
+
+class PasswordHasher:
+    """Bounded process pool for password KDF work"""
+
+    def __init__(self, app=None):
+        self.method = 'scrypt'
+        self.params = None
+        self.workers = 2
+        self.timeout = 10
+        self._executor = None
+        self._capacity = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+        app.config.setdefault('PASSWORD_WORKERS', 2)
+        app.config.setdefault('PASSWORD_QUEUE_MAX', 32)
+        app.config.setdefault('PASSWORD_TIMEOUT', 10)
+
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        # Canonical prefix with werkzeug's default cost filled in
+        self.params = hash_params(generate_password_hash('', self.method))
+        self.workers = app.config['PASSWORD_WORKERS']
+        self.timeout = app.config['PASSWORD_TIMEOUT']
+        self._capacity = threading.BoundedSemaphore(max(self.workers, 1) + app.config['PASSWORD_QUEUE_MAX'])
+        app.extensions['passwords'] = self
+
+    def hash(self, password):
+        """New hash for password with the configured method"""
+        return self._call(_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        """(matches, new hash if stored_hash uses outdated parameters)"""
+        return self._call(_verify, stored_hash, password, self.method, self.params)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _call(self, fn, *args):
+        if not self._capacity.acquire(blocking=False):
+            raise HasherBusy('Too many sign-ins in progress, try again shortly')
+        with metrics.phase('kdf'):
+            if self.workers <= 0:
+                try:
+                    return fn(*args)
+                finally:
+                    self._capacity.release()
+            try:
+                future = self._pool().submit(fn, *args)
+            except Exception:
+                self._capacity.release()
+                raise
+            # The slot is held until the KDF job ends, not until the caller stops
+            # waiting, so timed-out jobs still count against the limit
+            future.add_done_callback(lambda _: self._capacity.release())
+            try:
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                raise HasherBusy('Sign-in is taking too long, try again shortly')
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool for the next caller
+                self.shutdown()
+                raise
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: forking a process that already runs threads is unsafe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+
+# The current app's instance; create_app() builds one per app
+passwords = LocalProxy(lambda: current_app.extensions['passwords'])
@@ -0,0 +1,125 @@
+"""
+Failure handling for upstream calls
+Building blocks LLMClient combines per call: a circuit breaker over a
+rolling window of outcomes, full-jitter exponential backoff for retries,
+and a window of recent latencies whose p95 sets when a hedged second
+attempt starts.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+# HTTP-style codes google.api_core exceptions carry in .code; the fake
+# backend's UpstreamError uses the same ones
+RETRYABLE_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def is_retryable(error):
+    """Whether an upstream failure is worth another attempt"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_CODES
+
+
+def backoff_delay(attempt, base, cap, rng=random):
+    """Full-jitter delay before retry number attempt (0-based)"""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over the last `window` seconds
+
+    Opens when at least min_calls outcomes in the window include more than
+    error_rate failures. While open, allow() is False for `cooldown`
+    seconds; then one probe call is let through (half-open), and its
+    outcome closes the breaker or opens it for another cooldown. A probe
+    that never reports back is replaced after another cooldown.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window=30.0, min_calls=20, error_rate=0.5, cooldown=30.0, clock=time.monotonic):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = self.CLOSED
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = self.clock()
+            if self.state == self.OPEN and now - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probe_started = None
+            if self.state == self.HALF_OPEN and (self._probe_started is None
+                                                 or now - self._probe_started >= self.cooldown):
+                self._probe_started = now
+                return True
+            return False
+
+    def retry_after(self):
+        """Seconds until the breaker lets a probe through"""
+        with self._lock:
+            return max(0.0, self._opened_at + self.cooldown - self.clock())
+
+    def record(self, success):
+        with self._lock:
+            now = self.clock()
+            if self.state == self.HALF_OPEN:
+                if success:
+                    self._close()
+                else:
+                    self._open(now)
+                return
+            self._outcomes.append((now, success))
+            self._failures += not success
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._failures -= not self._outcomes.popleft()[1]
+            if (self.state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and self._failures > self.error_rate * len(self._outcomes)):
+                self._open(now)
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._probe_started = None
+
+    def _close(self):
+        self.state = self.CLOSED
+        self._outcomes.clear()
+        self._failures = 0
+        self._probe_started = None
+
+
+class LatencyWindow:
+    """The last `size` latencies, for percentile estimates"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
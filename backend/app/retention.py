@@ -0,0 +1,279 @@
+"""
+Chat history retention
+chat_history only keeps recent turns. The archiver moves turns older than
+CHAT_RETENTION_DAYS out in batches: each batch is written as one gzipped
+NDJSON file per user under CHAT_ARCHIVE_DIR, indexed in chat_archives (one
+row per file and conversation), and deleted from chat_history in the same
+transaction that records the index rows. The hot table stays sized by the
+retention window rather than by the age of the service, so it and its
+FULLTEXT index stay in the buffer pool.
+
+This stands in for range partitioning by created_at, which InnoDB does
+not allow on a table with foreign keys or a FULLTEXT index. Dropping old
+data is batched deletes along idx_chat_created instead of DROP PARTITION.
+
+Archived turns stay readable: turns() looks them up through chat_archives
+and only opens the files that hold the requested conversation or user.
+
+Deletes follow them into the files. Deleting a user cascades to their
+chat_archives rows, and each archive run then removes files no row points
+to. Turns of deleted conversations are dropped from their files, which are
+rewritten, before those index rows go.
+"""
+
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.local import LocalProxy
+
+from app import database
+from app.export import to_line
+
+LOCK_NAME = 'aivora_chat_archive'
+
+
+def write_archive(path, rows):
+    """Write rows as gzipped NDJSON, atomically"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + '.partial'
+    with gzip.open(partial, 'wb') as out:
+        for row in rows:
+            out.write(to_line(row))
+    os.replace(partial, path)
+
+
+def read_archive(path):
+    """Rows of an archive file, in id order"""
+    with gzip.open(path, 'rb') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+
+class ChatArchive:
+    """Moves old chat turns to compressed files and reads them back"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.root = None
+        self.retention_days = 90
+        self.batch_size = 1000
+        self.interval = 3600
+        self._stopped = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CHAT_RETENTION_DAYS', 90)
+        app.config.setdefault('CHAT_ARCHIVE_DIR', os.path.join(os.path.dirname(app.root_path), 'archive'))
+        app.config.setdefault('CHAT_ARCHIVE_BATCH', 1000)
+        app.config.setdefault('CHAT_ARCHIVE_PAUSE', 0.1)
+        app.config.setdefault('CHAT_ARCHIVE_INTERVAL', 3600)
+        self.app = app
+        self.root = app.config['CHAT_ARCHIVE_DIR']
+        self.retention_days = app.config['CHAT_RETENTION_DAYS']
+        self.batch_size = app.config['CHAT_ARCHIVE_BATCH']
+        self.interval = app.config['CHAT_ARCHIVE_INTERVAL']
+        app.extensions['chat_archive'] = self
+        app.cli.add_command(archive_chat_command)
+
+        # Every worker runs the loop; GET_LOCK lets one archive at a time
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='chat-archive', daemon=True)
+            self._thread.start()
+            atexit.register(self._stopped.set)
+
+    def cutoff(self, now=None):
+        return (now or datetime.now()) - timedelta(days=self.retention_days)
+
+    def may_hold(self, created_at):
+        """Whether anything created at created_at could have been archived yet"""
+        return created_at is not None and created_at < self.cutoff()
+
+    def archive(self, now=None, max_batches=None):
+        """Archive turns older than the retention window, returns how many moved
+
+        Returns 0 without doing anything if another process is archiving.
+        """
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute('SELECT GET_LOCK(%s, 0) AS locked', (LOCK_NAME,))
+        if not cursor.fetchone()['locked']:
+            return 0
+        try:
+            cutoff = self.cutoff(now)
+            moved = 0
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                count = self._archive_batch(cutoff)
+                moved += count
+                batches += 1
+                if count < self.batch_size:
+                    break
+                # Let replication and the purge thread keep up between batches
+                time.sleep(self.app.config['CHAT_ARCHIVE_PAUSE'])
+            # Under the lock, so no file is swept between its write and its index rows
+            self.purge()
+            return moved
+        finally:
+            cursor = database.get_cursor()
+            cursor.execute('SELECT RELEASE_LOCK(%s)', (LOCK_NAME,))
+
+    def purge(self):
+        """Drop archived turns whose conversation or user is gone, returns files removed
+
+        Callers must hold the archive lock.
+        """
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute('''SELECT a.id, a.path, a.conversation_id FROM chat_archives a
+                         LEFT JOIN conversations c ON c.id = a.conversation_id
+                         WHERE a.conversation_id IS NOT NULL AND c.id IS NULL''')
+        deleted = defaultdict(set)
+        entry_ids = []
+        for entry in cursor.fetchall():
+            deleted[entry['path']].add(entry['conversation_id'])
+            entry_ids.append(entry['id'])
+        for relative, conversation_ids in deleted.items():
+            path = os.path.join(self.root, relative)
+            if os.path.exists(path):
+                kept = [turn for turn in read_archive(path)
+                        if turn['conversation_id'] not in conversation_ids]
+                write_archive(path, kept)
+        if entry_ids:
+            with database.transaction() as cursor:
+                placeholders = ', '.join(['%s'] * len(entry_ids))
+                cursor.execute(f'DELETE FROM chat_archives WHERE id IN ({placeholders})', entry_ids)
+
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute('SELECT DISTINCT path FROM chat_archives')
+        indexed = {os.path.normpath(entry['path']) for entry in cursor.fetchall()}
+        removed = 0
+        chat_root = os.path.join(self.root, 'chat')
+        for directory, _, files in os.walk(chat_root, topdown=False):
+            for name in files:
+                path = os.path.join(directory, name)
+                if os.path.normpath(os.path.relpath(path, self.root)) not in indexed:
+                    os.remove(path)
+                    removed += 1
+            if directory != chat_root and not os.listdir(directory):
+                os.rmdir(directory)
+        return removed
+
+    def _archive_batch(self, cutoff):
+        cursor = database.get_cursor(dict_rows=True)
+        # idx_chat_created ends in the primary key, so this is an index range
+        cursor.execute('''SELECT id, user_id, conversation_id, question, answer, created_at
+                         FROM chat_history WHERE created_at < %s
+                         ORDER BY created_at, id LIMIT %s''', (cutoff, self.batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+
+        by_user = defaultdict(list)
+        for row in rows:
+            by_user[row['user_id']].append(row)
+
+        index_rows = []
+        for user_id, turns in by_user.items():
+            turns.sort(key=lambda turn: turn['id'])
+            relative = os.path.join('chat', str(user_id), f"{turns[0]['id']}-{turns[-1]['id']}.ndjson.gz")
+            # A crash before the commit below leaves a file that the retry overwrites
+            write_archive(os.path.join(self.root, relative), turns)
+            by_conversation = defaultdict(list)
+            for turn in turns:
+                by_conversation[turn['conversation_id']].append(turn['id'])
+            for conversation_id, ids in by_conversation.items():
+                index_rows.append((user_id, conversation_id, relative, ids[0], ids[-1], len(ids)))
+
+        with database.transaction() as cursor:
+            cursor.executemany('''INSERT INTO chat_archives (user_id, conversation_id, path,
+                                 first_id, last_id, turns) VALUES (%s, %s, %s, %s, %s, %s)''',
+                               index_rows)
+            placeholders = ', '.join(['%s'] * len(rows))
+            cursor.execute(f'DELETE FROM chat_history WHERE id IN ({placeholders})',
+                           [row['id'] for row in rows])
+        return len(rows)
+
+    def turns(self, user_id, conversation_id=None, before_id=None, limit=50):
+        """Archived turns of a user (or one of their conversations), newest first"""
+        cursor = database.get_cursor(dict_rows=True)
+        conditions = ['user_id = %s']
+        params = [user_id]
+        if conversation_id is not None:
+            conditions.append('conversation_id = %s')
+            params.append(conversation_id)
+        if before_id is not None:
+            conditions.append('first_id < %s')
+            params.append(before_id)
+        cursor.execute(f'''SELECT path, MAX(last_id) AS last_id FROM chat_archives
+                          WHERE {' AND '.join(conditions)}
+                          GROUP BY path ORDER BY last_id DESC''', params)
+
+        found = []
+        for entry in cursor.fetchall():
+            if len(found) >= limit:
+                found.sort(key=lambda turn: turn['id'], reverse=True)
+                # Newest files first; stop once no remaining file can make the cut
+                if entry['last_id'] < found[limit - 1]['id']:
+                    break
+            for turn in self._read(entry['path']):
+                if conversation_id is not None and turn['conversation_id'] != conversation_id:
+                    continue
+                if before_id is not None and turn['id'] >= before_id:
+                    continue
+                found.append(turn)
+        found.sort(key=lambda turn: turn['id'], reverse=True)
+        return found[:limit]
+
+    def all_turns(self, user_id=None, cursor=None):
+        """Every archived turn of one user (or of everyone), oldest file first
+
+        cursor, if given, reads the index (e.g. inside an export's snapshot).
+        """
+        cursor = cursor or database.get_cursor(dict_rows=True)
+        if user_id is None:
+            cursor.execute('SELECT path, MIN(first_id) AS first_id FROM chat_archives '
+                           'GROUP BY path ORDER BY first_id')
+        else:
+            cursor.execute('SELECT path, MIN(first_id) AS first_id FROM chat_archives '
+                           'WHERE user_id = %s GROUP BY path ORDER BY first_id', (user_id,))
+        for entry in cursor.fetchall():
+            yield from self._read(entry['path'])
+
+    def _read(self, relative):
+        """Rows of an indexed archive file; none if purge() removed it meanwhile"""
+        try:
+            yield from read_archive(os.path.join(self.root, relative))
+        except FileNotFoundError:
+            return
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    moved = self.archive()
+                if moved:
+                    self.app.logger.info('Archived %s chat turns', moved)
+            except Exception as e:
+                self.app.logger.warning('Chat archival failed: %s', e)
+
+
+@click.command('archive-chat')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches')
+@with_appcontext
+def archive_chat_command(max_batches):
+    """Move chat turns older than CHAT_RETENTION_DAYS to archive files"""
+    moved = chat_archive.archive(max_batches=max_batches)
+    click.echo(f'Archived {moved} chat turns')
+
+
+# The current app's instance; create_app() builds one per app
+chat_archive = LocalProxy(lambda: current_app.extensions['chat_archive'])
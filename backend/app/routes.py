@@ -0,0 +1,1129 @@
+"""
+HTTP routes
+Every API endpoint plus the catch-all that serves the React build,
+registered on the app by create_app().
+"""
+
+from flask import Blueprint, current_app, jsonify, request, session, Response, stream_with_context
+from datetime import date, datetime
+from werkzeug.exceptions import RequestEntityTooLarge
+import os
+import json
+import base64
+import binascii
+import hmac
+import shutil
+import tempfile
+from io import BytesIO
+from concurrent.futures import as_completed
+from app import database, metrics
+from app.cache import response_cache
+from app.counters import progress_counters
+from app.jobs import jobs, save_upload, task as job_task
+from app.imaging import preprocess_image, dhash, InvalidImage
+from app.fingerprints import fingerprints, sha256_hex
+from app.uploads import collect_pages, upload_limit, InvalidUpload
+from app.llm import llm, LLMBusy
+from app.passwords import passwords, HasherBusy
+from app.chunking import estimate_tokens
+from app.search import query_terms, make_snippet, merge_hits
+from app.conversation import assemble_prompt, create_conversation, load_context, fold_older_turns
+from app.pagination import encode_cursor, decode_cursor, parse_limit, InvalidCursor
+from app.summaries import content_hash, load_summary, refresh_summary
+from app.grading import grade_quiz, record_attempt, current_streak
+from app.export import export_rows, gzip_ndjson, zip_ndjson
+from app.retention import chat_archive
+
+bp = Blueprint('api', __name__)
+
+
+def generate_text(model_name, prompt, policy='default'):
+    """Generate text with Gemini, served from the response cache when possible
+
+    policy names the LLM_POLICIES entry (deadline, retries, hedging) used
+    on a cache miss.
+    """
+    return response_cache.get_or_compute(model_name, prompt,
+                                         lambda: llm.generate(model_name, prompt, policy))
+
+def stream_text(model_name, prompt, policy='default'):
+    """Yield Gemini output chunks as they arrive, caching the full answer at the end"""
+    cached = response_cache.peek(model_name, prompt)
+    if cached is not None:
+        yield cached
+        return
+    
+    parts = []
+    for text in llm.stream(model_name, prompt, policy):
+        parts.append(text)
+        yield text
+    response_cache.put(model_name, prompt, ''.join(parts))
+
+def submit_in_context(pool, fn, *args):
+    """Run fn(*args) on a worker pool inside the current app's context"""
+    app = current_app._get_current_object()
+    
+    def run():
+        with app.app_context():
+            return fn(*args)
+    return pool.submit(run)
+
+def wants_stream():
+    """Streaming is opt-in via ?stream=1 or Accept: text/event-stream"""
+    return (request.args.get('stream') == '1'
+            or 'text/event-stream' in request.headers.get('Accept', ''))
+
+def sse_response(chunks, on_complete=None):
+    """Forward text chunks as Server-Sent Events
+    
+    Each chunk is sent as a `data:` event, followed by a final `done` event
+    carrying the full text. on_complete(full_text) runs before `done`; any
+    dict it returns is merged into the `done` payload.
+    """
+    def events():
+        parts = []
+        try:
+            for text in chunks:
+                parts.append(text)
+                yield f"data: {json.dumps({'text': text})}\n\n"
+            done = {'text': ''.join(parts)}
+            if on_complete:
+                done.update(on_complete(done['text']) or {})
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# ============== API ENDPOINTS ==============
+
+@bp.route('/api/auth/register', methods=['POST'])
+def register():
+    """Register new user"""
+    try:
+        data = request.get_json()
+        email = data.get('email', '').strip()
+        password = data.get('password', '').strip()
+        name = data.get('name', 'User').strip()
+        
+        if not email or not password:
+            return jsonify({'error': 'Email and password required'}), 400
+        
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute('SELECT id FROM users WHERE email = %s', (email,))
+        
+        if cursor.fetchone():
+            return jsonify({'error': 'Email already exists'}), 409
+        
+        hashed_password = passwords.hash(password)
+        with database.transaction() as cursor:
+            cursor.execute('''INSERT INTO users (name, email, password, created_at) 
+                             VALUES (%s, %s, %s, %s)''',
+                          (name, email, hashed_password, datetime.now()))
+        
+        return jsonify({'success': True, 'message': 'User registered successfully'}), 201
+    except HasherBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/auth/login', methods=['POST'])
+def api_login():
+    """API login endpoint"""
+    try:
+        data = request.get_json()
+        email = data.get('email')
+        password = data.get('password')
+        
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute('SELECT id, name, email, password FROM users WHERE email = %s', (email,))
+        user = cursor.fetchone()
+        
+        matches, new_hash = passwords.verify(user['password'], password) if user and password else (False, None)
+        if matches:
+            if new_hash:
+                # Hash predates the current PASSWORD_HASH_METHOD, upgrade it in place
+                with database.transaction() as cursor:
+                    cursor.execute('UPDATE users SET password = %s WHERE id = %s AND password = %s',
+                                  (new_hash, user['id'], user['password']))
+            session['user_id'] = user['id']
+            session['email'] = user['email']
+            session['name'] = user['name']
+            return jsonify({'success': True, 'user': {'id': user['id'], 'name': user['name'], 'email': user['email']}}), 200
+        
+        return jsonify({'error': 'Invalid credentials'}), 401
+    except HasherBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/auth/logout', methods=['POST'])
+def api_logout():
+    """Logout user"""
+    session.clear()
+    return jsonify({'success': True}), 200
+
+@bp.route('/api/auth/me', methods=['GET'])
+def get_current_user():
+    """Get current logged in user"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    return jsonify({
+        'user_id': session.get('user_id'),
+        'email': session.get('email'),
+        'name': session.get('name')
+    }), 200
+
+@bp.route('/api/chat', methods=['POST'])
+def chat():
+    """Chat with Gemini
+    
+    Pass the `conversationId` from a previous reply to continue that
+    conversation; without it a new conversation is started. The prompt
+    carries a rolling summary plus the turns not yet folded into it (at
+    least the last CHAT_RECENT_TURNS), capped at CHAT_CONTEXT_TOKENS.
+    """
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        data = request.get_json()
+        message = data.get('message') or data.get('question', '')
+        conversation_id = data.get('conversationId')
+        
+        if not message:
+            return jsonify({'error': 'Message required'}), 400
+        
+        user_id = session.get('user_id')
+        summary, turns = None, []
+        if conversation_id:
+            conversation, turns = load_context(conversation_id, user_id, current_app.config['CHAT_RECENT_TURNS'])
+            if not conversation:
+                return jsonify({'error': 'Conversation not found'}), 404
+            summary = conversation['summary']
+        prompt = assemble_prompt(message, summary, turns, current_app.config['CHAT_CONTEXT_TOKENS'])
+        
+        def save_answer(answer):
+            nonlocal conversation_id
+            # Store in chat history
+            with database.transaction() as cursor:
+                if not conversation_id:
+                    conversation_id = create_conversation(cursor, user_id, message)
+                cursor.execute('''INSERT INTO chat_history (user_id, conversation_id, question, answer, created_at)
+                                 VALUES (%s, %s, %s, %s, %s)''',
+                              (user_id, conversation_id, message, answer, datetime.now()))
+            progress_counters.add(user_id, 'questions_asked')
+            
+            # Older turns are folded into the summary in the background
+            if len(turns) >= current_app.config['CHAT_RECENT_TURNS']:
+                submit_in_context(current_app.extensions['summary_pool'], fold_conversation, conversation_id)
+            return {'conversation_id': conversation_id}
+        
+        if wants_stream():
+            return sse_response(stream_text('gemini-pro', prompt, 'chat'), on_complete=save_answer)
+        
+        answer = generate_text('gemini-pro', prompt, 'chat')
+        save_answer(answer)
+        
+        return jsonify({
+            'success': True,
+            'question': message,
+            'answer': answer,
+            'conversation_id': conversation_id
+        }), 200
+    except LLMBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/chat/history', methods=['GET'])
+def get_chat_history():
+    """Chat turns of the current user, newest first
+    
+    Optional ?conversationId= narrows to one conversation. Keyset-paginated
+    like /api/user/notes (?limit=, ?after=next_cursor). Turns past the
+    retention window are only included with ?archived=1; they are read from
+    the archive files once chat_history runs out.
+    """
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        user_id = session.get('user_id')
+        conversation_id = request.args.get('conversationId', type=int)
+        include_archived = request.args.get('archived') == '1'
+        limit = parse_limit(request.args.get('limit'), current_app.config['CHAT_HISTORY_PAGE_SIZE'],
+                            current_app.config['CHAT_HISTORY_PAGE_MAX'])
+        before_id = None
+        if request.args.get('after'):
+            try:
+                _, before_id = decode_cursor(request.args['after'])
+            except InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+        
+        conditions = ['user_id = %s']
+        params = [user_id]
+        if conversation_id is not None:
+            conditions.append('conversation_id = %s')
+            params.append(conversation_id)
+        if before_id is not None:
+            conditions.append('id < %s')
+            params.append(before_id)
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute(f'''SELECT id, conversation_id, question, answer, created_at FROM chat_history
+                          WHERE {' AND '.join(conditions)} ORDER BY id DESC LIMIT %s''',
+                      params + [limit + 1])
+        rows = [dict(row, archived=False) for row in cursor.fetchall()]
+        
+        if include_archived and len(rows) <= limit:
+            oldest = rows[-1]['id'] if rows else before_id
+            archived = chat_archive.turns(user_id, conversation_id, oldest, limit + 1 - len(rows))
+            rows += [dict(turn, archived=True,
+                          created_at=datetime.fromisoformat(turn['created_at']) if turn['created_at'] else None)
+                     for turn in archived]
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'] or datetime.min, rows[-1]['id'])
+        turns = [{
+            'id': row['id'],
+            'conversation_id': row['conversation_id'],
+            'question': row['question'],
+            'answer': row['answer'],
+            'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+            'archived': row['archived']
+        } for row in rows]
+        
+        return jsonify({'success': True, 'turns': turns, 'next_cursor': next_cursor}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def fold_conversation(conversation_id):
+    """Background step advancing a conversation's rolling summary"""
+    try:
+        fold_older_turns(conversation_id, current_app.config['CHAT_RECENT_TURNS'],
+                         lambda prompt: generate_text('gemini-pro', prompt, 'background'),
+                         current_app.config['CHAT_SUMMARY_BATCH'])
+    except Exception as e:
+        current_app.logger.warning('Conversation summary update failed: %s', e)
+
+def summarize_text(text):
+    """Concise summary of text, map-reduced over chunks when it is long"""
+    return current_app.extensions['summarizer'].summarize(
+        text, lambda text: f"Provide a concise summary of the following:\n\n{text}")
+
+@bp.route('/api/notes/summarize', methods=['POST'])
+def summarize_note():
+    """Summarize note with Gemini
+    
+    Pass `noteId` instead of `text` to get a stored note's summary, which
+    is only regenerated when the note's content has changed.
+    """
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        data = request.get_json()
+        text = data.get('text', '')
+        
+        if data.get('noteId') and not text:
+            return get_note_summary(data['noteId'])
+        
+        if not text:
+            return jsonify({'error': 'Text required'}), 400
+        
+        summary = summarize_text(text)
+        
+        return jsonify({
+            'success': True,
+            'summary': summary
+        }), 200
+    except LLMBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/notes/<int:note_id>/summary', methods=['GET'])
+def get_note_summary(note_id):
+    """Stored summary of a note, regenerated only if the content changed"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        found = load_summary(note_id, session.get('user_id'), summarize_text)
+        if not found:
+            return jsonify({'error': 'Note not found'}), 404
+        
+        summary, regenerated = found
+        return jsonify({
+            'success': True,
+            'note_id': note_id,
+            'summary': summary,
+            'regenerated': regenerated
+        }), 200
+    except LLMBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def store_note_summary(note_id):
+    """Background step summarizing a newly ingested note"""
+    try:
+        refresh_summary(note_id, summarize_text)
+    except Exception as e:
+        current_app.logger.warning('Summary for note %s failed: %s', note_id, e)
+
+def summarize_in_background(note_ids):
+    pool = current_app.extensions['ingest_pool']
+    for note_id in note_ids:
+        submit_in_context(pool, store_note_summary, note_id)
+
+def ocr_text(image_bytes):
+    """Run Gemini vision on a preprocessed JPEG, reusing the text of a seen image"""
+    if fingerprints.enabled:
+        with metrics.phase('image'):
+            digest = sha256_hex(image_bytes)
+            phash = dhash(image_bytes)
+        text = fingerprints.lookup(digest, phash)
+        if text is not None:
+            return text
+    
+    text = llm.generate('gemini-1.5-flash', [
+        "Extract and summarize all the text and key points from this image. Format it clearly:",
+        {'mime_type': 'image/jpeg', 'data': image_bytes}
+    ], policy='ocr')
+    if fingerprints.enabled:
+        fingerprints.add(digest, phash, text)
+    return text
+
+def extract_note_from_image(user_id, image_bytes, file_name):
+    """Run Gemini vision on a preprocessed JPEG and store the result as a note"""
+    text = ocr_text(image_bytes)
+    
+    # Store note in database
+    with database.transaction() as cursor:
+        cursor.execute('''INSERT INTO notes (user_id, title, content, content_hash, created_at)
+                         VALUES (%s, %s, %s, %s, %s)''',
+                      (user_id, file_name, text, content_hash(text), datetime.now()))
+        note_id = cursor.lastrowid
+    progress_counters.add(user_id, 'notes_created')
+    summarize_in_background([note_id])
+    
+    return note_id, text
+
+@job_task('ocr')
+def ocr_job(user_id, path, file_name):
+    """Background OCR job, consumes the upload saved by process_note_image"""
+    try:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        note_id, _ = extract_note_from_image(user_id, image_bytes, file_name)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return {'note_id': note_id}
+
+def read_image_upload():
+    """Return (file-like image, file name, options) from the request
+    
+    Accepts a multipart `image` file field, a raw image/* body, or the
+    legacy JSON body with a base64 `image` string. Multipart and raw
+    bodies are read straight from the stream (werkzeug spools large
+    multipart files to disk), so no base64 copy is held in memory. The
+    caller closes the returned file. Bad base64 raises InvalidImage.
+    """
+    if request.files:
+        upload = request.files.get('image')
+        if upload is None:
+            return None, None, {}
+        return upload.stream, upload.filename or 'note.jpg', request.form
+    
+    if request.mimetype and request.mimetype.startswith('image/'):
+        # PIL needs a seekable file, spool the raw body to disk past 1MB
+        body = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        shutil.copyfileobj(request.stream, body)
+        body.seek(0)
+        file_name = request.args.get('fileName') or request.headers.get('X-File-Name', 'note.jpg')
+        return body, file_name, request.args
+    
+    data = request.get_json(silent=True) or {}
+    image_data = data.get('image', '')
+    if not image_data:
+        return None, None, data
+    
+    # Parse base64
+    if ',' in image_data:
+        image_data = image_data.split(',')[1]
+    try:
+        image = base64.b64decode(image_data)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidImage('Image is not valid base64') from e
+    return BytesIO(image), data.get('fileName', 'note.jpg'), data
+
+@bp.route('/api/notes/ocr', methods=['POST'])
+def process_note_image():
+    """Process image note with OCR using Gemini vision API
+    
+    The image may be sent as multipart/form-data, a raw image/* body, or
+    base64 in JSON. It is rotated, downscaled and re-encoded before the
+    vision call. Pass ?async=1 (or "async": true) to get a job id back
+    immediately and poll /api/jobs/<id> for the resulting note_id.
+    """
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        # Reject oversized uploads before reading the body
+        if request.content_length and request.content_length > current_app.config['MAX_CONTENT_LENGTH']:
+            return jsonify({'error': 'Upload too large'}), 413
+        
+        user_id = session.get('user_id')
+        source = None
+        try:
+            with metrics.phase('image'):
+                source, file_name, options = read_image_upload()
+                if source is None:
+                    return jsonify({'error': 'Image required'}), 400
+                image_bytes, _ = preprocess_image(source,
+                                                  max_dimension=current_app.config['OCR_MAX_DIMENSION'],
+                                                  grayscale=current_app.config['OCR_GRAYSCALE'],
+                                                  quality=current_app.config['OCR_JPEG_QUALITY'])
+        except InvalidImage as e:
+            return jsonify({'error': str(e)}), 400
+        finally:
+            # Raw bodies over 1MB are spooled to a temporary file
+            if source is not None:
+                source.close()
+        
+        if request.args.get('async') == '1' or options.get('async') in (True, '1', 'true'):
+            path = save_upload(current_app.config['UPLOAD_FOLDER'], image_bytes)
+            job_id = jobs.submit('ocr', user_id, user_id=user_id, path=path, file_name=file_name)
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': 'queued'
+            }), 202
+        
+        note_id, text = extract_note_from_image(user_id, image_bytes, file_name)
+        
+        return jsonify({
+            'success': True,
+            'text': text,
+            'summary': text,
+            'note_id': note_id
+        }), 200
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'Upload too large'}), 413
+    except LLMBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def ocr_page(path, options):
+    """Preprocess and OCR one page of a bulk upload"""
+    with open(path, 'rb') as f:
+        with metrics.phase('image'):
+            image_bytes, _ = preprocess_image(f, **options)
+    return ocr_text(image_bytes)
+
+def insert_notes(cursor, user_id, rows):
+    """Insert (title, content) rows in the caller's transaction, returns their ids
+
+    One INSERT per row: a multi-row INSERT only gets consecutive ids with
+    innodb_autoinc_lock_mode 0 or 1, and MySQL 8 defaults to 2, where
+    concurrent inserts interleave.
+    """
+    now = datetime.now()
+    note_ids = []
+    for title, content in rows:
+        cursor.execute('''INSERT INTO notes (user_id, title, content, content_hash, created_at)
+                         VALUES (%s, %s, %s, %s, %s)''',
+                       (user_id, title, content, content_hash(content), now))
+        note_ids.append(cursor.lastrowid)
+    return note_ids
+
+@bp.route('/api/notes/ocr/bulk', methods=['POST'])
+@upload_limit('BULK_MAX_UPLOAD_SIZE')
+def bulk_ocr():
+    """OCR many pages in one request
+    
+    Send images and/or zip archives as multipart parts, or a zip as the
+    raw body. Pages are OCR'd concurrently on ocr_pool and reported as
+    Server-Sent Events as each one finishes (`item`); the notes are then
+    stored in one transaction and the final `done` event lists their ids
+    in upload order.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    user_id = session.get('user_id')
+    workdir = tempfile.mkdtemp(prefix='bulk-ocr-')
+    try:
+        pages = collect_pages(request, workdir, current_app.config['BULK_MAX_PAGES'],
+                              current_app.config['MAX_CONTENT_LENGTH'])
+    except InvalidUpload as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        return jsonify({'error': str(e)}), 400
+    except RequestEntityTooLarge:
+        shutil.rmtree(workdir, ignore_errors=True)
+        return jsonify({'error': 'Upload too large'}), 413
+    except Exception as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        return jsonify({'error': str(e)}), 500
+    
+    options = {'max_dimension': current_app.config['OCR_MAX_DIMENSION'],
+               'grayscale': current_app.config['OCR_GRAYSCALE'],
+               'quality': current_app.config['OCR_JPEG_QUALITY']}
+    pool = current_app.extensions['ocr_pool']
+    futures = {submit_in_context(pool, ocr_page, path, options): index
+               for index, (_, path) in enumerate(pages)}
+    
+    def events():
+        texts = {}
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                item = {'index': index, 'file_name': pages[index][0]}
+                try:
+                    texts[index] = future.result()
+                except Exception as e:
+                    item.update(status='failed', error=str(e))
+                else:
+                    item.update(status='done', text=texts[index])
+                yield f"event: item\ndata: {json.dumps(item)}\n\n"
+            
+            order = sorted(texts)
+            note_ids = []
+            if order:
+                with database.transaction() as cursor:
+                    note_ids = insert_notes(cursor, user_id,
+                                            [(pages[i][0], texts[i]) for i in order])
+                progress_counters.add(user_id, 'notes_created', len(note_ids))
+                summarize_in_background(note_ids)
+            
+            done = {
+                'success': True,
+                'total': len(pages),
+                'created': len(note_ids),
+                'failed': len(pages) - len(note_ids),
+                'notes': [{'index': i, 'note_id': note_id} for i, note_id in zip(order, note_ids)]
+            }
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            for future in futures:
+                future.cancel()
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Poll a background job"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        job = jobs.get(job_id, session.get('user_id'))
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        result = job['result'] or {}
+        return jsonify({
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status'],
+            'note_id': result.get('note_id'),
+            'error': job['error']
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/code-help', methods=['POST'])
+def get_code_help():
+    """Get code help from Gemini"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        data = request.get_json()
+        code = data.get('code', '')
+        question = data.get('question', 'Help with this code')
+        
+        if not code:
+            return jsonify({'error': 'Code required'}), 400
+        
+        prompt = f"{question}\n\nCode:\n```\n{code}\n```"
+        
+        if wants_stream():
+            return sse_response(stream_text('gemini-pro', prompt, 'code_help'))
+        
+        analysis = generate_text('gemini-pro', prompt, 'code_help')
+        
+        return jsonify({
+            'success': True,
+            'analysis': analysis
+        }), 200
+    except LLMBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/user/notes', methods=['GET'])
+def get_user_notes():
+    """Get notes for current user, newest first
+    
+    Keyset-paginated: pass ?limit= and the `next_cursor` from the previous
+    page as ?after=. Served from idx_notes_user_created.
+    """
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        user_id = session.get('user_id')
+        limit = parse_limit(request.args.get('limit'),
+                            current_app.config['NOTES_PAGE_SIZE'], current_app.config['NOTES_PAGE_MAX'])
+        after = request.args.get('after')
+        
+        cursor = database.get_cursor(dict_rows=True)
+        if after:
+            try:
+                created_at, note_id = decode_cursor(after)
+            except InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+            cursor.execute('''SELECT id, title, created_at FROM notes
+                             WHERE user_id = %s
+                               AND (created_at < %s OR (created_at = %s AND id < %s))
+                             ORDER BY created_at DESC, id DESC LIMIT %s''',
+                          (user_id, created_at, created_at, note_id, limit + 1))
+        else:
+            cursor.execute('''SELECT id, title, created_at FROM notes
+                             WHERE user_id = %s
+                             ORDER BY created_at DESC, id DESC LIMIT %s''',
+                          (user_id, limit + 1))
+        rows = cursor.fetchall()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        notes = [{'id': row['id'], 'title': row['title']} for row in rows]
+        
+        return jsonify({'success': True, 'notes': notes, 'next_cursor': next_cursor}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def create_quiz_questions(content):
+    """Ask Gemini for 5 multiple choice questions about content"""
+    # Notes too long for one prompt are quizzed on their summary
+    if estimate_tokens(content or '') > current_app.config['SUMMARY_CHUNK_TOKENS']:
+        content = summarize_text(content)
+    
+    prompt = f"""Create 5 multiple choice questions based on this text. 
+    Format as JSON array with this structure:
+    [
+        {{
+            "id": 1,
+            "question": "Question text?",
+            "options": ["Option A", "Option B", "Option C", "Option D"],
+            "correct": "Option A"
+        }}
+    ]
+    
+    Text:
+    {content}
+    
+    Return ONLY the JSON array, no other text."""
+    
+    # Cached like other text calls: the same note text gets the same quiz back
+    response_text = generate_text('gemini-pro', prompt, 'quiz')
+    
+    # Parse JSON response
+    try:
+        return json.loads(response_text)
+    except ValueError:
+        # If JSON parsing fails, create a simple question
+        return [{
+            "id": 1,
+            "question": "Based on the notes, what is the main topic?",
+            "options": ["Topic 1", "Topic 2", "Topic 3", "Topic 4"],
+            "correct": "Topic 1"
+        }]
+
+@bp.route('/api/quiz/generate', methods=['POST'])
+def generate_quiz():
+    """Generate quiz questions from note using Gemini"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        user_id = session.get('user_id')
+        data = request.get_json()
+        note_id = data.get('noteId')
+        
+        if not note_id:
+            return jsonify({'error': 'Note ID required'}), 400
+        
+        # Get note content
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute('SELECT content FROM notes WHERE id = %s AND user_id = %s',
+                      (note_id, user_id))
+        note = cursor.fetchone()
+        
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+        
+        # Generate quiz with Gemini
+        questions = create_quiz_questions(note['content'])
+        
+        # Store quiz in database
+        with database.transaction() as cursor:
+            cursor.execute('''INSERT INTO quizzes (user_id, note_id, questions, created_at)
+                             VALUES (%s, %s, %s, %s)''',
+                          (user_id, note_id, json.dumps(questions), datetime.now()))
+        progress_counters.add(user_id, 'quizzes_taken')
+        
+        return jsonify({
+            'success': True,
+            'questions': questions
+        }), 200
+    except LLMBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/quiz/generate-batch', methods=['POST'])
+def generate_quiz_batch():
+    """Generate quizzes for several notes at once
+    
+    Notes are loaded with one query, quizzes are generated concurrently on
+    quiz_pool, and every successful quiz is stored with a single insert.
+    Each note gets its own entry in `results`; failures don't sink the batch.
+    """
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        user_id = session.get('user_id')
+        data = request.get_json() or {}
+        note_ids = data.get('noteIds')
+        
+        if not isinstance(note_ids, list) or not note_ids:
+            return jsonify({'error': 'Note IDs required'}), 400
+        try:
+            note_ids = list(dict.fromkeys(int(note_id) for note_id in note_ids))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Note IDs must be integers'}), 400
+        if len(note_ids) > current_app.config['QUIZ_BATCH_MAX']:
+            return jsonify({'error': f"At most {current_app.config['QUIZ_BATCH_MAX']} notes per batch"}), 400
+        
+        # Get all note contents in one round-trip
+        placeholders = ', '.join(['%s'] * len(note_ids))
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute(f'SELECT id, content FROM notes WHERE user_id = %s AND id IN ({placeholders})',
+                      (user_id, *note_ids))
+        contents = {row['id']: row['content'] for row in cursor.fetchall()}
+        
+        quiz_pool = current_app.extensions['quiz_pool']
+        futures = {note_id: submit_in_context(quiz_pool, create_quiz_questions, contents[note_id])
+                   for note_id in note_ids if note_id in contents}
+        
+        results = []
+        rows = []
+        now = datetime.now()
+        for note_id in note_ids:
+            if note_id not in futures:
+                results.append({'noteId': note_id, 'success': False, 'error': 'Note not found'})
+                continue
+            try:
+                questions = futures[note_id].result()
+            except Exception as e:
+                results.append({'noteId': note_id, 'success': False, 'error': str(e)})
+                continue
+            rows.append((user_id, note_id, json.dumps(questions), now))
+            results.append({'noteId': note_id, 'success': True, 'questions': questions})
+        
+        # Store quizzes with one insert, progress gets a single increment
+        if rows:
+            with database.transaction() as cursor:
+                cursor.executemany('''INSERT INTO quizzes (user_id, note_id, questions, created_at)
+                                     VALUES (%s, %s, %s, %s)''', rows)
+            progress_counters.add(user_id, 'quizzes_taken', len(rows))
+        
+        return jsonify({
+            'success': True,
+            'generated': len(rows),
+            'failed': len(results) - len(rows),
+            'results': results
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/quiz/<int:quiz_id>/submit', methods=['POST'])
+def submit_quiz(quiz_id):
+    """Grade answers for a stored quiz and record the attempt
+    
+    `answers` is a list in question order or an object keyed by question
+    id, each answer being the option text or its index. The attempt also
+    updates avg_score and study_streak on the user's progress row.
+    """
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        user_id = session.get('user_id')
+        data = request.get_json(silent=True) or {}
+        answers = data.get('answers')
+        
+        if not isinstance(answers, (list, dict)):
+            return jsonify({'error': 'Answers required'}), 400
+        
+        cursor = database.get_cursor(dict_rows=True)
+        cursor.execute('SELECT questions FROM quizzes WHERE id = %s AND user_id = %s',
+                      (quiz_id, user_id))
+        quiz = cursor.fetchone()
+        
+        if not quiz:
+            return jsonify({'error': 'Quiz not found'}), 404
+        
+        correct, total, results = grade_quiz(json.loads(quiz['questions'] or '[]'), answers)
+        
+        with database.transaction(dict_rows=True) as cursor:
+            attempt_id, score = record_attempt(cursor, user_id, quiz_id, correct, total,
+                                               [r['answer'] for r in results], date.today())
+            cursor.execute('SELECT avg_score, study_streak FROM progress WHERE user_id = %s',
+                          (user_id,))
+            progress = cursor.fetchone()
+        
+        return jsonify({
+            'success': True,
+            'attempt_id': attempt_id,
+            'score': score,
+            'correct': correct,
+            'total': total,
+            'results': results,
+            'avg_score': round(progress['avg_score'], 2),
+            'study_streak': progress['study_streak']
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/search', methods=['GET'])
+def search():
+    """Search the current user's notes and chat history
+    
+    Ranked by MySQL FULLTEXT relevance, normalized per table so notes and
+    chat turns rank fairly together. ?type=notes|chat narrows the search,
+    ?limit= caps the number of hits. Each hit carries a highlighted snippet.
+    """
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        user_id = session.get('user_id')
+        query = request.args.get('q', '').strip()
+        kind = request.args.get('type', 'all')
+        limit = parse_limit(request.args.get('limit'), 10, current_app.config['SEARCH_MAX_RESULTS'])
+        
+        terms = query_terms(query)
+        if not terms:
+            return jsonify({'error': 'Query required'}), 400
+        if kind not in ('all', 'notes', 'chat'):
+            return jsonify({'error': 'type must be notes, chat or all'}), 400
+        
+        # Only the top hits' text is read, capped at SEARCH_SNIPPET_SCAN characters
+        scan = current_app.config['SEARCH_SNIPPET_SCAN']
+        match_query = ' '.join(terms)
+        cursor = database.get_cursor(dict_rows=True)
+        notes, chats = [], []
+        
+        if kind in ('all', 'notes'):
+            cursor.execute('''SELECT id, title, LEFT(content, %s) AS text, created_at,
+                                    MATCH(title, content) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+                             FROM notes
+                             WHERE user_id = %s AND MATCH(title, content) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                             ORDER BY score DESC LIMIT %s''',
+                          (scan, match_query, user_id, match_query, limit))
+            for row in cursor.fetchall():
+                notes.append({
+                    'type': 'note',
+                    'id': row['id'],
+                    'title': row['title'],
+                    'snippet': make_snippet(row['text'], terms),
+                    'score': float(row['score']),
+                    'created_at': row['created_at'].isoformat() if row['created_at'] else None
+                })
+        
+        if kind in ('all', 'chat'):
+            cursor.execute('''SELECT id, question, LEFT(answer, %s) AS text, created_at,
+                                    MATCH(question, answer) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+                             FROM chat_history
+                             WHERE user_id = %s AND MATCH(question, answer) AGAINST (%s IN NATURAL LANGUAGE MODE)
+                             ORDER BY score DESC LIMIT %s''',
+                          (scan, match_query, user_id, match_query, limit))
+            for row in cursor.fetchall():
+                chats.append({
+                    'type': 'chat',
+                    'id': row['id'],
+                    'title': row['question'],
+                    'snippet': make_snippet(row['text'], terms),
+                    'score': float(row['score']),
+                    'created_at': row['created_at'].isoformat() if row['created_at'] else None
+                })
+        
+        results = merge_hits([notes, chats], limit)
+        return jsonify({'success': True, 'query': query, 'results': results}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/user/progress', methods=['GET'])
+def get_user_progress():
+    """Get user progress stats"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': 'Not authenticated'}), 401
+        
+        user_id = session.get('user_id')
+        cursor = database.get_cursor(dict_rows=True)
+        
+        def load_progress():
+            cursor.execute('''SELECT notes_created, quizzes_taken, questions_asked, 
+                             study_streak, avg_score, last_activity_date
+                             FROM progress WHERE user_id = %s''',
+                          (user_id,))
+            return cursor.fetchone()
+        
+        # Persisted counters plus this worker's unflushed increments (see app/counters.py)
+        progress = progress_counters.read(user_id, load_progress)
+        
+        if not progress:
+            # Create default progress if doesn't exist
+            with database.transaction() as cursor:
+                cursor.execute('''INSERT IGNORE INTO progress (user_id, notes_created, quizzes_taken, 
+                                questions_asked, study_streak, avg_score)
+                                VALUES (%s, 0, 0, 0, 0, 0)''', (user_id,))
+            progress = progress_counters.read(user_id, lambda: {
+                'notes_created': 0,
+                'quizzes_taken': 0,
+                'questions_asked': 0,
+                'study_streak': 0,
+                'avg_score': 0
+            })
+        
+        return jsonify({
+            'success': True,
+            'notes_created': progress['notes_created'],
+            'quizzes_taken': progress['quizzes_taken'],
+            'questions_asked': progress['questions_asked'],
+            'study_streak': current_streak(progress['study_streak'],
+                                           progress.get('last_activity_date'), date.today()),
+            'avg_score': round(progress['avg_score'] or 0, 2)
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def export_response(records, export_format, name):
+    """Stream (table, row) records as a gzipped NDJSON or zip download"""
+    options = {'level': current_app.config['EXPORT_COMPRESSION_LEVEL'],
+               'chunk_size': current_app.config['EXPORT_CHUNK_SIZE']}
+    if export_format == 'zip':
+        body, mimetype, file_name = zip_ndjson(records, **options), 'application/zip', f'{name}.zip'
+    else:
+        body, mimetype, file_name = gzip_ndjson(records, **options), 'application/gzip', f'{name}.ndjson.gz'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{file_name}"',
+                             'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/api/user/export', methods=['GET'])
+def export_user_data():
+    """Download everything stored for the current user
+    
+    ?format=ndjson (default) is one gzipped NDJSON stream of
+    {"table", "row"} lines; ?format=zip holds one NDJSON file per table.
+    Rows are streamed from the database as the download proceeds.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'zip'):
+        return jsonify({'error': 'format must be ndjson or zip'}), 400
+    
+    user_id = session.get('user_id')
+    records = export_rows(user_id, current_app.config['EXPORT_NET_WRITE_TIMEOUT'], chat_archive.all_turns)
+    return export_response(records, export_format, f'aivora-export-{user_id}')
+
+def check_admin_token(config_key):
+    """Error response unless X-Admin-Token matches config[config_key], else None
+    
+    While the token is unset the endpoint answers 404, as if it didn't exist.
+    """
+    token = current_app.config.get(config_key)
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode()):
+        return jsonify({'error': 'Forbidden'}), 403
+    return None
+
+@bp.route('/api/admin/export', methods=['GET'])
+def export_all_data():
+    """Download every user's data, same formats as /api/user/export
+    
+    Requires the X-Admin-Token header to match ADMIN_EXPORT_TOKEN; the
+    endpoint does not exist while that is unset.
+    """
+    denied = check_admin_token('ADMIN_EXPORT_TOKEN')
+    if denied:
+        return denied
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'zip'):
+        return jsonify({'error': 'format must be ndjson or zip'}), 400
+    
+    records = export_rows(None, current_app.config['EXPORT_NET_WRITE_TIMEOUT'], chat_archive.all_turns)
+    return export_response(records, export_format, f'aivora-export-{date.today().isoformat()}')
+
+@bp.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Response cache and OCR fingerprint hit/miss counters (X-Admin-Token, ADMIN_STATS_TOKEN)"""
+    denied = check_admin_token('ADMIN_STATS_TOKEN')
+    if denied:
+        return denied
+    return jsonify({'success': True, 'cache': response_cache.snapshot(),
+                    'fingerprints': fingerprints.snapshot()}), 200
+
+@bp.route('/api/llm/stats', methods=['GET'])
+def get_llm_stats():
+    """Upstream concurrency counters (X-Admin-Token, ADMIN_STATS_TOKEN)"""
+    denied = check_admin_token('ADMIN_STATS_TOKEN')
+    if denied:
+        return denied
+    return jsonify({'success': True, 'llm': llm.snapshot()}), 200
+
+# ============== ERROR HANDLERS ==============
+
+@bp.app_errorhandler(404)
+def not_found(e):
+    return jsonify({'error': 'Not found'}), 404
+
+@bp.app_errorhandler(413)
+def too_large(e):
+    return jsonify({'error': 'Upload too large'}), 413
+
+@bp.app_errorhandler(500)
+def server_error(e):
+    return jsonify({'error': 'Server error'}), 500
+
+# ============== FRONTEND ==============
+
+@bp.route('/', defaults={'path': ''})
+@bp.route('/<path:path>')
+def serve(path):
+    """Serve React static files"""
+    return current_app.extensions['static_index'].serve(path, request)
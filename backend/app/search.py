@@ -0,0 +1,88 @@
+"""
+Full-text search helpers
+Matching and ranking happen in MySQL through the FULLTEXT indexes on
+notes(title, content) and chat_history(question, answer); only the top
+hits' text is read back, and this module cuts it down to a highlighted
+snippet around the best match. Relevance from the two indexes is not
+comparable, so merge_hits() normalizes each before ranking them together.
+"""
+
+import html
+import re
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def query_terms(query, max_terms=10):
+    """Distinct lower-cased words from a search query"""
+    terms = []
+    for term in WORD.findall(query.lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:max_terms]
+
+
+def merge_hits(groups, limit):
+    """One ranking from several lists of hits with a 'score', best first
+
+    FULLTEXT relevance depends on each index's own word statistics, so a
+    raw score from notes means nothing next to one from chat_history. Each
+    list's scores are divided by its top score first; equal scores keep
+    the order of groups.
+    """
+    merged = []
+    for hits in groups:
+        top = max((hit['score'] for hit in hits), default=0.0)
+        for hit in hits:
+            hit['score'] = hit['score'] / top if top > 0 else 0.0
+            merged.append(hit)
+    merged.sort(key=lambda hit: hit['score'], reverse=True)
+    return merged[:limit]
+
+
+def make_snippet(text, terms, width=200):
+    """HTML-escaped window of text around the densest cluster of terms
+
+    Matches are wrapped in <mark>. Falls back to the start of the text
+    when no term occurs in it.
+    """
+    text = text or ''
+    if not terms:
+        return html.escape(_trim(text, 0, width))
+
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(t) for t in terms) + r')', re.IGNORECASE)
+    positions = [m.start() for m in pattern.finditer(text)]
+
+    start = 0
+    if positions:
+        # Slide a window over the match positions, keep the one with most hits
+        best, best_hits, j = positions[0], 0, 0
+        for i, pos in enumerate(positions):
+            while positions[j] < pos - width // 2:
+                j += 1
+            if i - j + 1 > best_hits:
+                best, best_hits = positions[j], i - j + 1
+        start = max(0, best - width // 4)
+
+    snippet = _trim(text, start, width)
+    highlighted = []
+    last = 0
+    for m in pattern.finditer(snippet):
+        highlighted.append(html.escape(snippet[last:m.start()]))
+        highlighted.append('<mark>' + html.escape(m.group(0)) + '</mark>')
+        last = m.end()
+    highlighted.append(html.escape(snippet[last:]))
+    return ''.join(highlighted)
+
+
+def _trim(text, start, width):
+    """text[start:start+width] widened to word boundaries, with ellipses"""
+    end = min(len(text), start + width)
+    if start > 0:
+        space = text.rfind(' ', 0, start)
+        start = space + 1 if space != -1 and start - space < 20 else start
+    if end < len(text):
+        space = text.find(' ', end)
+        end = space if space != -1 and space - end < 20 else end
+    snippet = ' '.join(text[start:end].split())
+    return ('…' if start > 0 else '') + snippet + ('…' if end < len(text) else '')
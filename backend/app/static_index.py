@@ -0,0 +1,135 @@
+"""
+Static asset index for the React build
+Scans frontend/dist once at startup and keeps every file in memory with its
+ETag and gzip/brotli variants, so serving an asset is a dict lookup with
+no filesystem access per request.
+
+Vite's content-hashed files under assets/ are served as immutable; other
+files (index.html) must be revalidated. Unknown paths fall back to
+index.html so client-side routes keep working.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+HASHED_ASSET = re.compile(r'(^|/)assets/.+[-.][A-Za-z0-9_-]{8,}\.\w+$')
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json',
+                'image/svg+xml', 'application/wasm', 'application/xml')
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+class StaticFile:
+    """One indexed file and its encoded variants"""
+
+    __slots__ = ('path', 'mimetype', 'etag', 'cache_control', 'variants')
+
+    def __init__(self, path, data, mimetype, cache_control):
+        self.path = path
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(data).hexdigest()[:20]
+        self.cache_control = cache_control
+        self.variants = {'identity': data}
+
+    @property
+    def size(self):
+        return len(self.variants['identity'])
+
+
+class StaticIndex:
+    """In-memory index of a built frontend"""
+
+    def __init__(self, root, fallback='index.html'):
+        self.root = root
+        self.fallback = fallback
+        self.files = {}
+        self.scan()
+
+    def scan(self):
+        """(Re)build the index from disk"""
+        files = {}
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename.endswith(('.gz', '.br')):
+                        continue
+                    full = os.path.join(dirpath, filename)
+                    rel = os.path.relpath(full, self.root).replace(os.sep, '/')
+                    files[rel] = self._load(full, rel)
+        self.files = files
+
+    def lookup(self, path):
+        """Indexed file for a request path, with the SPA fallback"""
+        return self.files.get(path) or self.files.get(self.fallback)
+
+    def serve(self, path, request):
+        entry = self.lookup(path)
+        if entry is None:
+            return Response('Frontend not built', status=404, mimetype='text/plain')
+
+        encoding = self._negotiate(entry, request.headers.get('Accept-Encoding', ''))
+        etag = entry.etag if encoding == 'identity' else f'{entry.etag}-{encoding}'
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': entry.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+
+        if_none_match = request.headers.get('If-None-Match', '')
+        if if_none_match == '*' or f'"{etag}"' in if_none_match:
+            return Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(entry.variants[encoding], mimetype=entry.mimetype, headers=headers)
+
+    def _load(self, full, rel):
+        with open(full, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(rel)[0] or 'application/octet-stream'
+        cache_control = IMMUTABLE if HASHED_ASSET.search(rel) else REVALIDATE
+        entry = StaticFile(rel, data, mimetype, cache_control)
+
+        if len(data) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE):
+            # Prefer variants the build already produced (vite-plugin-compression)
+            gz = self._read_if_exists(full + '.gz') or gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                entry.variants['gzip'] = gz
+            br = self._read_if_exists(full + '.br')
+            if br is None and brotli is not None:
+                br = brotli.compress(data, quality=11)
+            if br is not None and len(br) < len(data):
+                entry.variants['br'] = br
+        return entry
+
+    @staticmethod
+    def _read_if_exists(path):
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        return None
+
+    @staticmethod
+    def _negotiate(entry, accept_encoding):
+        accepted = set()
+        for part in accept_encoding.split(','):
+            token, _, params = part.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(token.strip().lower())
+        for encoding in ('br', 'gzip'):
+            if encoding in entry.variants and (encoding in accepted or '*' in accepted):
+                return encoding
+        return 'identity'
@@ -0,0 +1,61 @@
+"""
+Stored note summaries
+Each note keeps a summary together with the hash of the content it was
+made from (summary_hash). content_hash is written alongside content, so
+checking whether a summary is current is a primary-key read of two short
+columns; the LONGTEXT content is only fetched when a summary has to be
+(re)generated.
+"""
+
+import hashlib
+
+from app import database
+
+
+def content_hash(text):
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def refresh_summary(note_id, summarize):
+    """Generate and store a note's summary if its content changed, returns it
+
+    summarize(text) -> str does the work. Returns None for a missing note.
+    """
+    cursor = database.get_cursor(dict_rows=True)
+    cursor.execute('SELECT content, summary, summary_hash FROM notes WHERE id = %s', (note_id,))
+    note = cursor.fetchone()
+    if not note:
+        return None
+
+    digest = content_hash(note['content'])
+    if note['summary'] is not None and note['summary_hash'] == digest:
+        return note['summary']
+
+    summary = summarize(note['content'] or '')
+    # Stored only if the note still holds the content it was made from, so a
+    # stale summary never lands on an edited note. Notes from before
+    # content_hash existed get it filled in here.
+    with database.transaction() as cursor:
+        cursor.execute('''UPDATE notes SET summary = %s, summary_hash = %s,
+                                            content_hash = COALESCE(content_hash, %s)
+                         WHERE id = %s AND (content_hash IS NULL OR content_hash = %s)''',
+                       (summary, digest, digest, note_id, digest))
+    return summary
+
+
+def load_summary(note_id, user_id, summarize):
+    """(summary, regenerated) for a note owned by user_id, or None
+
+    Serves the stored summary when it matches content_hash and only falls
+    back to refresh_summary() when it is missing or stale.
+    """
+    cursor = database.get_cursor(dict_rows=True)
+    cursor.execute('''SELECT summary, content_hash, summary_hash FROM notes
+                     WHERE id = %s AND user_id = %s''', (note_id, user_id))
+    note = cursor.fetchone()
+    if not note:
+        return None
+
+    if note['summary'] is not None and note['content_hash'] and note['summary_hash'] == note['content_hash']:
+        return note['summary'], False
+    return refresh_summary(note_id, summarize), True
@@ -0,0 +1,126 @@
+"""
+Bulk upload intake
+Accepts many images as multipart parts, a zip archive (as a part or as the
+raw request body), or a mix, and writes every page to its own file under a
+scratch directory. Bodies are copied in chunks and zip entries are
+extracted one at a time, so nothing holds the whole upload in memory.
+
+Endpoints that take large bodies raise the request size limit for
+themselves with @upload_limit instead of raising MAX_CONTENT_LENGTH for
+every route.
+"""
+
+import os
+import shutil
+import zipfile
+
+from flask import Request, current_app
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff')
+ZIP_TYPES = ('application/zip', 'application/x-zip-compressed')
+CHUNK_SIZE = 64 * 1024
+
+
+class InvalidUpload(ValueError):
+    """Bulk upload was empty, too large or not images/zip"""
+
+
+class UploadRequest(Request):
+    """Request whose size limit can be raised per view with @upload_limit"""
+
+    @property
+    def max_content_length(self):
+        view = current_app.view_functions.get(self.endpoint) if self.endpoint else None
+        key = getattr(view, 'upload_limit_key', None)
+        if key is not None:
+            return current_app.config[key]
+        return super().max_content_length
+
+
+def upload_limit(config_key):
+    """Use app.config[config_key] as this view's request size limit"""
+    def decorator(view):
+        view.upload_limit_key = config_key
+        return view
+    return decorator
+
+
+def _is_zip(file_name, mimetype):
+    return (mimetype or '') in ZIP_TYPES or (file_name or '').lower().endswith('.zip')
+
+
+def _copy(source, path, max_size):
+    """Copy a stream to path in chunks, refusing more than max_size bytes"""
+    written = 0
+    with open(path, 'wb') as out:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_size:
+                raise InvalidUpload('An image in the upload is too large')
+            out.write(chunk)
+
+
+class _Collector:
+    """Numbered page files under folder, with a page limit"""
+
+    def __init__(self, folder, max_items, max_item_size):
+        self.folder = folder
+        self.max_items = max_items
+        self.max_item_size = max_item_size
+        self.items = []
+
+    def add(self, file_name, stream):
+        if len(self.items) >= self.max_items:
+            raise InvalidUpload(f'At most {self.max_items} pages per upload')
+        path = os.path.join(self.folder, f'{len(self.items):04d}')
+        _copy(stream, path, self.max_item_size)
+        self.items.append((os.path.basename(file_name) or f'page-{len(self.items) + 1}.jpg', path))
+
+    def add_zip(self, stream):
+        try:
+            archive = zipfile.ZipFile(stream)
+        except zipfile.BadZipFile as e:
+            raise InvalidUpload('Invalid zip archive') from e
+        with archive:
+            entries = sorted((info for info in archive.infolist()
+                              if not info.is_dir()
+                              and not info.filename.startswith('__MACOSX/')
+                              and info.filename.lower().endswith(IMAGE_EXTENSIONS)),
+                             key=lambda info: info.filename)
+            for info in entries:
+                if info.file_size > self.max_item_size:
+                    raise InvalidUpload('An image in the upload is too large')
+                with archive.open(info) as entry:
+                    self.add(info.filename, entry)
+
+
+def collect_pages(request, folder, max_items, max_item_size):
+    """Write each uploaded page to folder, returns [(file name, path)] in upload order
+
+    Zip entries are taken in name order, skipping non-image files.
+    """
+    collector = _Collector(folder, max_items, max_item_size)
+
+    if request.files:
+        for _, upload in request.files.items(multi=True):
+            if _is_zip(upload.filename, upload.mimetype):
+                collector.add_zip(upload.stream)
+            else:
+                collector.add(upload.filename or '', upload.stream)
+    elif _is_zip(None, request.mimetype):
+        # Spool the archive to disk first, zipfile needs to seek
+        archive_path = os.path.join(folder, 'upload.zip')
+        with open(archive_path, 'wb') as out:
+            shutil.copyfileobj(request.stream, out, CHUNK_SIZE)
+        with open(archive_path, 'rb') as archive:
+            collector.add_zip(archive)
+        os.remove(archive_path)
+    elif request.mimetype and request.mimetype.startswith('image/'):
+        collector.add(request.args.get('fileName') or 'page-1.jpg', request.stream)
+
+    if not collector.items:
+        raise InvalidUpload('No images in upload')
+    return collector.items
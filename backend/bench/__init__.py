@@ -0,0 +1,4 @@
+"""
+AIVORA - benchmark suite
+Load tests for the Flask API, see bench/loadtest.py
+"""
@@ -0,0 +1,350 @@
+"""
+Load test for the AIVORA API
+Drives a realistic mix of register/login/OCR/chat/summarize/quiz/progress
+traffic at one or more concurrency levels and reports p50/p95/p99 latency
+and requests per second per endpoint.
+
+By default the app from wsgi.py is started in-process on a local port with
+the fake LLM backend (LLM_BACKEND=fake, FAKE_LLM_LATENCY), against the
+database in DATABASE_URL. Pass --url to hit an already running server.
+--llm-error-rate and --llm-slow-rate inject upstream failures and slow
+calls, to see how retries, hedging and the circuit breaker hold up.
+
+    python -m bench.loadtest --concurrency 1,8,32 --duration 30 --out bench.json
+    python -m bench.loadtest --compare baseline.json bench.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from io import BytesIO
+
+# Weighted operations for one virtual user after it has registered and logged in
+DEFAULT_MIX = {
+    'chat': 30,
+    'progress': 20,
+    'summarize': 15,
+    'ocr': 10,
+    'quiz': 10,
+    'notes': 10,
+    'login': 5,
+}
+
+SAMPLE_TEXT = ("Photosynthesis converts light energy into chemical energy. "
+               "Chlorophyll in the chloroplasts absorbs light, water is split and "
+               "oxygen is released, and the Calvin cycle fixes carbon dioxide. ") * 8
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def summarize_samples(samples, elapsed):
+    """Latency percentiles (ms) and throughput for one endpoint"""
+    latencies = [s['ms'] for s in samples]
+    errors = sum(1 for s in samples if s['status'] >= 500 or s['status'] == 0)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': _round(percentile(latencies, 50)),
+        'p95_ms': _round(percentile(latencies, 95)),
+        'p99_ms': _round(percentile(latencies, 99)),
+        'max_ms': _round(max(latencies) if latencies else None),
+    }
+
+
+def compare(baseline, current, tolerance=0.10):
+    """Per-endpoint p95/rps changes between two result files
+
+    Returns (rows, regressions) where a regression is a p95 more than
+    `tolerance` slower, or rps more than `tolerance` lower, than baseline.
+    """
+    rows, regressions = [], []
+    base_levels = {level['concurrency']: level for level in baseline['levels']}
+    for level in current['levels']:
+        base = base_levels.get(level['concurrency'])
+        if base is None:
+            continue
+        for endpoint, stats in level['endpoints'].items():
+            old = base['endpoints'].get(endpoint)
+            if not old or not old['p95_ms'] or not stats['p95_ms']:
+                continue
+            p95_change = stats['p95_ms'] / old['p95_ms'] - 1
+            rps_change = stats['rps'] / old['rps'] - 1 if old['rps'] else 0.0
+            row = {'concurrency': level['concurrency'], 'endpoint': endpoint,
+                   'p95_change': round(p95_change, 4), 'rps_change': round(rps_change, 4)}
+            rows.append(row)
+            if p95_change > tolerance or rps_change < -tolerance:
+                regressions.append(row)
+    return rows, regressions
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def make_image():
+    from PIL import Image, ImageDraw
+    image = Image.new('RGB', (1200, 900), 'white')
+    draw = ImageDraw.Draw(image)
+    for i in range(30):
+        draw.text((40, 20 + i * 28), f'Lecture note line {i}: mitochondria, ATP, glycolysis', fill='black')
+    out = BytesIO()
+    image.save(out, format='JPEG', quality=85)
+    return out.getvalue()
+
+
+class VirtualUser:
+    """One simulated student with its own session cookie"""
+
+    def __init__(self, base_url, record, rng, image):
+        self.base_url = base_url.rstrip('/')
+        self.record = record
+        self.rng = rng
+        self.image = image
+        self.email = f'bench-{uuid.uuid4().hex[:12]}@example.com'
+        self.password = 'BenchPass123'
+        self.note_ids = []
+        self.conversation_id = None
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, name, method, path, body=None, headers=None):
+        data = None
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif body is not None:
+            data = body
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+
+        started = time.perf_counter()
+        status, payload = 0, None
+        try:
+            with self.opener.open(req, timeout=120) as response:
+                status = response.status
+                payload = response.read()
+        except urllib.error.HTTPError as e:
+            status = e.code
+            payload = e.read()
+        except (urllib.error.URLError, OSError):
+            status = 0
+        self.record(name, status, (time.perf_counter() - started) * 1000)
+
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+    def sign_up(self):
+        self.request('register', 'POST', '/api/auth/register',
+                     {'email': self.email, 'password': self.password, 'name': 'Bench User'})
+        self.login()
+
+    def login(self):
+        self.request('login', 'POST', '/api/auth/login',
+                     {'email': self.email, 'password': self.password})
+
+    def chat(self):
+        body = {'message': f'Explain topic {self.rng.randint(1, 50)} from my biology notes'}
+        if self.conversation_id:
+            body['conversationId'] = self.conversation_id
+        status, payload = self.request('chat', 'POST', '/api/chat', body)
+        if status == 200 and payload:
+            self.conversation_id = payload.get('conversation_id')
+
+    def summarize(self):
+        self.request('summarize', 'POST', '/api/notes/summarize',
+                     {'text': SAMPLE_TEXT + str(self.rng.randint(1, 20))})
+
+    def ocr(self):
+        status, payload = self.request('ocr', 'POST', '/api/notes/ocr?fileName=page.jpg', self.image,
+                                       {'Content-Type': 'image/jpeg'})
+        if status == 200 and payload and payload.get('note_id'):
+            self.note_ids.append(payload['note_id'])
+
+    def quiz(self):
+        if not self.note_ids:
+            return self.ocr()
+        self.request('quiz', 'POST', '/api/quiz/generate', {'noteId': self.rng.choice(self.note_ids)})
+
+    def notes(self):
+        self.request('notes', 'GET', '/api/user/notes?limit=20')
+
+    def progress(self):
+        self.request('progress', 'GET', '/api/user/progress')
+
+
+def run_level(base_url, concurrency, duration, mix, seed, image):
+    """Run `concurrency` virtual users for `duration` seconds"""
+    samples = {}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def record(name, status, ms):
+        with lock:
+            samples.setdefault(name, []).append({'status': status, 'ms': ms})
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        user = VirtualUser(base_url, record, rng, image)
+        user.sign_up()
+        while not stop.is_set():
+            getattr(user, rng.choices(names, weights)[0])()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=150)
+    elapsed = time.perf_counter() - started
+
+    endpoints = {name: summarize_samples(items, elapsed) for name, items in sorted(samples.items())}
+    total = [item for items in samples.values() for item in items]
+    return {
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'total': summarize_samples(total, elapsed),
+        'endpoints': endpoints,
+    }
+
+
+def use_fake_llm(llm_latency, llm_error_rate=0.0, llm_slow_rate=0.0):
+    """Point the in-process app at the fake LLM backend with these settings
+
+    Overrides whatever the environment or .env says, so a run never reaches
+    real Gemini and the settings recorded in the results are the ones used.
+    Must run before app.config is first imported.
+    """
+    os.environ.update({
+        'LLM_BACKEND': 'fake',
+        'FAKE_LLM_LATENCY': str(llm_latency),
+        'FAKE_LLM_ERROR_RATE': str(llm_error_rate),
+        'FAKE_LLM_SLOW_RATE': str(llm_slow_rate),
+    })
+
+
+def start_local_server(port, llm_latency, llm_error_rate=0.0, llm_slow_rate=0.0):
+    """Serve wsgi.app on a background thread with the fake LLM backend"""
+    use_fake_llm(llm_latency, llm_error_rate, llm_slow_rate)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from werkzeug.serving import make_server
+    from wsgi import app
+
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{port}'
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(level):
+    print(f"\nconcurrency={level['concurrency']}  "
+          f"{level['total']['rps']} req/s  errors={level['total']['errors']}")
+    print(f"{'endpoint':<12}{'reqs':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}")
+    for name, stats in level['endpoints'].items():
+        print(f"{name:<12}{stats['requests']:>7}{stats['rps']:>9}{stats['p50_ms']:>9}"
+              f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['errors']:>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AIVORA API load test')
+    parser.add_argument('--url', help='Target a running server instead of starting one')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--concurrency', default='1,8,32', help='Comma-separated levels')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per level')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Fake LLM seconds per call')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Share of fake LLM calls failing')
+    parser.add_argument('--llm-slow-rate', type=float, default=0.0,
+                        help='Share of fake LLM calls taking FAKE_LLM_SLOW_LATENCY longer')
+    parser.add_argument('--mix', help='JSON object of operation weights')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='Write results as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='Compare two result files and exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        rows, regressions = compare(baseline, current, args.tolerance)
+        for row in rows:
+            flag = '  REGRESSION' if row in regressions else ''
+            print(f"c={row['concurrency']:<4}{row['endpoint']:<12}"
+                  f"p95 {row['p95_change']:+.1%}  rps {row['rps_change']:+.1%}{flag}")
+        return 1 if regressions else 0
+
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = start_local_server(args.port, args.llm_latency,
+                                             args.llm_error_rate, args.llm_slow_rate)
+
+    image = make_image()
+    results = {
+        'meta': {
+            'git_revision': git_revision(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'target': args.url or 'in-process',
+            'llm_latency_s': None if args.url else args.llm_latency,
+            'llm_error_rate': None if args.url else args.llm_error_rate,
+            'llm_slow_rate': None if args.url else args.llm_slow_rate,
+            'duration_s': args.duration,
+            'mix': mix,
+            'seed': args.seed,
+        },
+        'levels': [],
+    }
+    try:
+        for concurrency in (int(c) for c in args.concurrency.split(',')):
+            level = run_level(base_url, concurrency, args.duration, mix, args.seed, image)
+            results['levels'].append(level)
+            print_level(level)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""
+Synthetic data for AIVORA
+Generates users with notes, quizzes, conversations, chat turns and
+progress rows at production-like volume, so query plans, pagination,
+search and the progress endpoints can be exercised against realistic
+tables. Used by `python setup_db.py seed`.
+
+Every user's rows come from a random generator seeded with (seed, user
+id), so a run is reproducible for a given seed and --as-of date, and
+does not depend on the batch size. Text lengths are log-normal like real
+notes: mostly a few KB, with a long tail of very large ones. Words are
+drawn Zipf-style from a study vocabulary so full-text search sees a
+natural mix of common and rare terms.
+
+Rows are written with multi-row INSERTs (cursor.executemany) in batches,
+with foreign key and unique checks off for the session. The FULLTEXT
+indexes are dropped for the load and rebuilt afterwards in one sort.
+"""
+
+import hashlib
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+
+VOCABULARY = (
+    'the of and to in is that for as with on by are this be from it an at or which cell energy '
+    'function process system theory equation value data model structure form change rate '
+    'example result method force reaction protein molecule atom electron gene species market '
+    'price demand supply history war empire revolution economy policy law court constitution '
+    'algorithm array pointer recursion graph tree node memory variable loop compiler integral '
+    'derivative matrix vector limit probability distribution variance hypothesis experiment '
+    'photosynthesis mitochondria enzyme membrane nucleus chromosome mitosis meiosis evolution '
+    'ecosystem climate carbon oxygen nitrogen velocity acceleration momentum gravity wave '
+    'frequency circuit voltage current resistance magnet thermodynamics entropy temperature '
+    'pressure volume solution acid base salt bond ion isotope periodic element compound '
+    'literature poem novel author character theme metaphor narrative chapter essay argument '
+    'evidence analysis source primary secondary author claim conclusion introduction summary '
+    'key point definition property theorem proof lemma axiom set logic inference premise '
+    'population sample survey statistic mean median mode correlation regression trend '
+    'geography river mountain continent border trade resource culture religion language'
+).split()
+# Zipf-like word frequencies: the n-th word is drawn ~1/n as often as the first
+WORD_WEIGHTS = list(accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+SUBJECTS = ('Biology', 'Chemistry', 'Physics', 'Calculus', 'Statistics', 'History', 'Economics',
+            'Literature', 'Computer Science', 'Geography', 'Law', 'Psychology')
+
+# Insert statements, in the column order generate() yields
+COLUMNS = {
+    'users': ('id', 'name', 'email', 'password', 'created_at'),
+    'notes': ('id', 'user_id', 'title', 'content', 'content_hash', 'created_at'),
+    'quizzes': ('id', 'user_id', 'note_id', 'questions', 'created_at'),
+    'conversations': ('id', 'user_id', 'title', 'summarized_through_id', 'created_at'),
+    'chat_history': ('id', 'user_id', 'conversation_id', 'question', 'answer', 'created_at'),
+    'progress': ('user_id', 'notes_created', 'quizzes_taken', 'questions_asked', 'study_streak',
+                 'avg_score', 'quiz_attempts', 'last_activity_date'),
+}
+
+# Dropped for the load, rebuilt by setup_db.create_indexes()
+DEFERRED_INDEXES = (('notes', 'ft_notes_title_content'), ('chat_history', 'ft_chat_question_answer'))
+
+
+@lru_cache(maxsize=8)
+def password_hash(password, seed, iterations=600000):
+    """werkzeug-compatible pbkdf2 hash with a salt derived from seed, shared by all seeded users"""
+    salt = hashlib.sha256(f'aivora-seed:{seed}'.encode()).hexdigest()[:16]
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
+    return f'pbkdf2:sha256:{iterations}${salt}${digest}'
+
+
+def lognormal_length(rng, median, sigma, maximum):
+    return max(1, min(int(rng.lognormvariate(math.log(median), sigma)), maximum))
+
+
+def make_sentences(rng, count=8192):
+    """Pool of sentences drawn word by word; text is then assembled from whole sentences"""
+    return [' '.join(rng.choices(VOCABULARY, cum_weights=WORD_WEIGHTS, k=rng.randint(6, 18))).capitalize()
+            + '.' for _ in range(count)]
+
+
+def make_text(rng, chars, sentences):
+    """About `chars` characters of text in paragraphs of six sentences"""
+    picked = rng.choices(sentences, k=max(chars // 64, 1))
+    return '\n\n'.join(' '.join(picked[i:i + 6]) for i in range(0, len(picked), 6))
+
+
+def _spread(rng, count, start, end):
+    """count sorted datetimes between start and end"""
+    span = (end - start).total_seconds()
+    return sorted(start + timedelta(seconds=rng.random() * span) for _ in range(count))
+
+
+def _around(rng, mean):
+    """Non-negative count averaging mean, with per-user variation"""
+    return int(rng.expovariate(1 / mean)) if mean > 0 else 0
+
+
+def generate(users, seed=42, as_of=None, first_ids=None, password='password123',
+             notes_per_user=20, note_chars=3000, quiz_rate=0.3, conversations_per_user=3,
+             turns_per_conversation=8, answer_chars=800, days=365, max_chars=400000):
+    """Yield (table, row) for `users` synthetic users and everything they own
+
+    first_ids maps a table to the first id to use (default 1 each), so a
+    seeded database can be topped up. Rows reference each other by these
+    explicit ids, and names and emails are numbered by user id so a top-up
+    never repeats an existing email.
+    """
+    as_of = as_of or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    next_ids = {table: 1 for table in ('users', 'notes', 'quizzes', 'conversations', 'chat_history')}
+    next_ids.update(first_ids or {})
+    hashed = password_hash(password, seed)
+    sentences = make_sentences(random.Random(f'{seed}:sentences'))
+
+    for _ in range(users):
+        user_id = next_ids['users']
+        next_ids['users'] += 1
+        rng = random.Random(f'{seed}:{user_id}')
+        joined = as_of - timedelta(days=rng.uniform(1, days))
+        yield 'users', (user_id, f'Student {user_id}', f'student{user_id}@seed.aivora.test',
+                        hashed, joined)
+
+        note_times = _spread(rng, _around(rng, notes_per_user), joined, as_of)
+        quizzes = 0
+        for created_at in note_times:
+            note_id = next_ids['notes']
+            next_ids['notes'] += 1
+            subject = rng.choice(SUBJECTS)
+            content = make_text(rng, lognormal_length(rng, note_chars, 1.0, max_chars), sentences)
+            yield 'notes', (note_id, user_id, f'{subject} notes {note_id}', content,
+                            hashlib.sha256(content.encode('utf-8')).hexdigest(), created_at)
+
+            if rng.random() < quiz_rate:
+                quiz_id = next_ids['quizzes']
+                next_ids['quizzes'] += 1
+                quizzes += 1
+                questions = [{'id': i + 1,
+                              'question': make_text(rng, 80, sentences).rstrip('.') + '?',
+                              'options': [make_text(rng, 30, sentences).rstrip('.') for _ in range(4)],
+                              'correct': None}
+                             for i in range(5)]
+                for question in questions:
+                    question['correct'] = rng.choice(question['options'])
+                yield 'quizzes', (quiz_id, user_id, note_id, json.dumps(questions),
+                                  created_at + timedelta(minutes=rng.uniform(1, 120)))
+
+        asked = 0
+        for started in _spread(rng, _around(rng, conversations_per_user), joined, as_of):
+            conversation_id = next_ids['conversations']
+            next_ids['conversations'] += 1
+            yield 'conversations', (conversation_id, user_id, f'{rng.choice(SUBJECTS)} questions',
+                                    0, started)
+            turn_time = started
+            for _ in range(max(1, _around(rng, turns_per_conversation))):
+                turn_time += timedelta(seconds=rng.uniform(20, 600))
+                if turn_time > as_of:
+                    break
+                turn_id = next_ids['chat_history']
+                next_ids['chat_history'] += 1
+                asked += 1
+                question = make_text(rng, lognormal_length(rng, 90, 0.5, 2000), sentences)
+                answer = make_text(rng, lognormal_length(rng, answer_chars, 0.8, max_chars), sentences)
+                yield 'chat_history', (turn_id, user_id, conversation_id, question.rstrip('.') + '?',
+                                       answer, turn_time)
+
+        last_active = max([joined] + note_times).date()
+        yield 'progress', (user_id, len(note_times), quizzes, asked, rng.randint(0, 14),
+                           round(rng.uniform(40, 100), 2) if quizzes else 0, 0, last_active)
+
+
+class BulkLoader:
+    """Buffers rows per table and writes them as batched multi-row INSERTs"""
+
+    def __init__(self, conn, batch_size=1000, max_statement_bytes=8 * 1024 * 1024):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.max_statement_bytes = max_statement_bytes
+        self.buffers = {table: [] for table in COLUMNS}
+        self.counts = dict.fromkeys(COLUMNS, 0)
+
+    def add(self, table, row):
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in [table] if table else list(COLUMNS):
+            rows = self.buffers[name]
+            if not rows:
+                continue
+            columns = COLUMNS[name]
+            cursor = self.conn.cursor()
+            # executemany folds the rows into INSERTs of up to this many bytes
+            cursor.max_stmt_length = self.max_statement_bytes
+            cursor.executemany(f"INSERT INTO {name} ({', '.join(columns)}) "
+                               f"VALUES ({', '.join(['%s'] * len(columns))})", rows)
+            cursor.close()
+            self.conn.commit()
+            self.counts[name] += len(rows)
+            self.buffers[name] = []
+
+
+def current_max_ids(conn):
+    """Next free id per table, so seeding can add to existing data"""
+    cursor = conn.cursor()
+    first_ids = {}
+    for table in ('users', 'notes', 'quizzes', 'conversations', 'chat_history'):
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}')
+        first_ids[table] = cursor.fetchone()[0]
+    cursor.close()
+    return first_ids
+
+
+def drop_deferred_indexes(conn):
+    cursor = conn.cursor()
+    for table, index in DEFERRED_INDEXES:
+        cursor.execute('''SELECT COUNT(*) FROM information_schema.STATISTICS
+                          WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s''',
+                       (table, index))
+        if cursor.fetchone()[0]:
+            cursor.execute(f'ALTER TABLE {table} DROP INDEX {index}')
+    cursor.close()
+
+
+def seed(conn, users, batch_size=1000, defer_indexes=True, progress=print, **options):
+    """Generate and load `users` users' data into conn, returns rows per table
+
+    With defer_indexes the FULLTEXT indexes are dropped first; the caller
+    recreates them (setup_db.create_indexes) once the load is done.
+    """
+    if defer_indexes:
+        drop_deferred_indexes(conn)
+
+    cursor = conn.cursor()
+    cursor.execute('SET SESSION foreign_key_checks = 0, unique_checks = 0')
+    cursor.close()
+    conn.autocommit(False)
+
+    loader = BulkLoader(conn, batch_size)
+    started = time.monotonic()
+    seeded_users = 0
+    try:
+        for table, row in generate(users, first_ids=current_max_ids(conn), **options):
+            loader.add(table, row)
+            if table == 'progress':
+                seeded_users += 1
+                if seeded_users % 10000 == 0:
+                    progress(f'  {seeded_users} users, {sum(loader.counts.values())} rows, '
+                             f'{time.monotonic() - started:.0f}s')
+        loader.flush()
+    finally:
+        cursor = conn.cursor()
+        cursor.execute('SET SESSION foreign_key_checks = 1, unique_checks = 1')
+        cursor.close()
+    return loader.counts
@@ -0,0 +1,38 @@
+"""
+Gunicorn configuration for production
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gevent workers serve each request on a greenlet, so a handler waiting on
+Gemini (REST transport) or MySQL (PyMySQL is pure Python) yields instead of
+holding an OS thread. One worker per core keeps hundreds of upstream
+calls in flight; LLM_MAX_CONCURRENCY still caps them per process.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+# Concurrent requests per gevent worker
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+# Used instead when GUNICORN_WORKER_CLASS=gthread
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+
+# Gemini calls and SSE streams can legitimately run for a while
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# The app starts threads and pools at import; load it in each worker, after the fork
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+raw_env = ['FLASK_ENV=' + os.getenv('FLASK_ENV', 'production')]
@@ -9,7 +9,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.extensions import db
-from app.models import User, Note, Asset, Quiz, Job
+from app.models import User, Note, Quiz, QuizAttempt, Conversation, ChatHistory, ChatArchive, Progress, ImageFingerprint, Job
 
 # this is the Alembic Config object
 config = context.config
@@ -0,0 +1,21 @@
+"""Add covering index for keyset pagination of notes"""
+# Migration: 0001_notes_user_created_index
+# Downgrade: None
+
+from alembic import op
+
+revision = '0001_notes_user_created_index'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Upgrade database schema"""
+    op.create_index('idx_notes_user_created', 'notes',
+                    ['user_id', 'created_at', 'id', 'title'])
+
+def downgrade():
+    """Downgrade database schema"""
+    # notes.user_id's foreign key needs an index, add a plain one back first
+    op.create_index('idx_notes_user_id', 'notes', ['user_id'])
+    op.drop_index('idx_notes_user_created', table_name='notes')
@@ -0,0 +1,32 @@
+"""Make progress.user_id unique for batched counter upserts"""
+# Migration: 0002_progress_user_unique
+# Downgrade: 0001_notes_user_created_index
+
+from alembic import op
+
+revision = '0002_progress_user_unique'
+down_revision = '0001_notes_user_created_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Upgrade database schema"""
+    # Fold duplicate rows into the oldest one before adding the constraint
+    op.execute('''UPDATE progress p
+                  JOIN (SELECT user_id, MIN(id) AS keep_id,
+                               SUM(notes_created) AS notes_created,
+                               SUM(quizzes_taken) AS quizzes_taken,
+                               SUM(questions_asked) AS questions_asked
+                        FROM progress GROUP BY user_id HAVING COUNT(*) > 1) d
+                    ON p.id = d.keep_id
+                  SET p.notes_created = d.notes_created,
+                      p.quizzes_taken = d.quizzes_taken,
+                      p.questions_asked = d.questions_asked''')
+    op.execute('''DELETE p FROM progress p
+                  JOIN progress keep ON keep.user_id = p.user_id AND keep.id < p.id''')
+    op.create_index('uq_progress_user', 'progress', ['user_id'], unique=True)
+
+def downgrade():
+    """Downgrade database schema"""
+    op.create_index('idx_progress_user_id', 'progress', ['user_id'])
+    op.drop_index('uq_progress_user', table_name='progress')
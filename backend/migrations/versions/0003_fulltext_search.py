@@ -0,0 +1,22 @@
+"""Add FULLTEXT indexes for /api/search"""
+# Migration: 0003_fulltext_search
+# Downgrade: 0002_progress_user_unique
+
+from alembic import op
+
+revision = '0003_fulltext_search'
+down_revision = '0002_progress_user_unique'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Upgrade database schema"""
+    op.create_index('ft_notes_title_content', 'notes', ['title', 'content'],
+                    mysql_prefix='FULLTEXT')
+    op.create_index('ft_chat_question_answer', 'chat_history', ['question', 'answer'],
+                    mysql_prefix='FULLTEXT')
+
+def downgrade():
+    """Downgrade database schema"""
+    op.drop_index('ft_chat_question_answer', table_name='chat_history')
+    op.drop_index('ft_notes_title_content', table_name='notes')
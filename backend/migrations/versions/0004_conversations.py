@@ -0,0 +1,35 @@
+"""Add conversations with rolling summaries and link chat turns to them"""
+# Migration: 0004_conversations
+# Downgrade: 0003_fulltext_search
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004_conversations'
+down_revision = '0003_fulltext_search'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Upgrade database schema"""
+    op.create_table(
+        'conversations',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('title', sa.String(255)),
+        sa.Column('summary', sa.Text(length=2**32 - 1)),
+        sa.Column('summarized_through_id', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime, server_default=sa.func.now(), onupdate=sa.func.now()),
+    )
+    op.add_column('chat_history', sa.Column('conversation_id', sa.Integer))
+    op.create_foreign_key('fk_chat_conversation', 'chat_history', 'conversations',
+                          ['conversation_id'], ['id'], ondelete='CASCADE')
+    op.create_index('idx_chat_conversation', 'chat_history', ['conversation_id', 'id'])
+
+def downgrade():
+    """Downgrade database schema"""
+    op.drop_constraint('fk_chat_conversation', 'chat_history', type_='foreignkey')
+    op.drop_index('idx_chat_conversation', table_name='chat_history')
+    op.drop_column('chat_history', 'conversation_id')
+    op.drop_table('conversations')
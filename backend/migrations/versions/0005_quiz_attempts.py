@@ -0,0 +1,35 @@
+"""Record graded quiz attempts and track running score and streak on progress"""
+# Migration: 0005_quiz_attempts
+# Downgrade: 0004_conversations
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005_quiz_attempts'
+down_revision = '0004_conversations'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Upgrade database schema"""
+    op.create_table(
+        'quiz_attempts',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('quiz_id', sa.Integer, sa.ForeignKey('quizzes.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('score', sa.Float, nullable=False),
+        sa.Column('correct', sa.Integer, nullable=False),
+        sa.Column('total', sa.Integer, nullable=False),
+        sa.Column('answers', sa.Text),
+        sa.Column('created_at', sa.DateTime, server_default=sa.func.now()),
+    )
+    op.create_index('idx_attempts_quiz', 'quiz_attempts', ['quiz_id', 'id'])
+    op.add_column('progress', sa.Column('quiz_attempts', sa.Integer, nullable=False, server_default='0'))
+    op.add_column('progress', sa.Column('last_activity_date', sa.Date))
+
+def downgrade():
+    """Downgrade database schema"""
+    op.drop_column('progress', 'last_activity_date')
+    op.drop_column('progress', 'quiz_attempts')
+    op.drop_index('idx_attempts_quiz', table_name='quiz_attempts')
+    op.drop_table('quiz_attempts')
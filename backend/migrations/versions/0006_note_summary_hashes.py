@@ -0,0 +1,21 @@
+"""Track content and summary hashes so stored note summaries regenerate only on change"""
+# Migration: 0006_note_summary_hashes
+# Downgrade: 0005_quiz_attempts
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006_note_summary_hashes'
+down_revision = '0005_quiz_attempts'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Upgrade database schema"""
+    op.add_column('notes', sa.Column('content_hash', sa.String(64)))
+    op.add_column('notes', sa.Column('summary_hash', sa.String(64)))
+
+def downgrade():
+    """Downgrade database schema"""
+    op.drop_column('notes', 'summary_hash')
+    op.drop_column('notes', 'content_hash')
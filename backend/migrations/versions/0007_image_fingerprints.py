@@ -0,0 +1,29 @@
+"""Store OCR results by image fingerprint so repeated uploads skip Gemini"""
+# Migration: 0007_image_fingerprints
+# Downgrade: 0006_note_summary_hashes
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = '0007_image_fingerprints'
+down_revision = '0006_note_summary_hashes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Upgrade database schema"""
+    op.create_table(
+        'image_fingerprints',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('sha256', sa.String(64), nullable=False),
+        sa.Column('phash', mysql.BIGINT(unsigned=True), nullable=False),
+        sa.Column('ocr_text', mysql.LONGTEXT),
+        sa.Column('created_at', sa.DateTime, server_default=sa.func.now()),
+    )
+    op.create_index('uq_fingerprints_sha256', 'image_fingerprints', ['sha256'], unique=True)
+
+def downgrade():
+    """Downgrade database schema"""
+    op.drop_index('uq_fingerprints_sha256', table_name='image_fingerprints')
+    op.drop_table('image_fingerprints')
@@ -0,0 +1,33 @@
+"""Index chat turns by age and track turns archived out of chat_history"""
+# Migration: 0008_chat_retention
+# Downgrade: 0007_image_fingerprints
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0008_chat_retention'
+down_revision = '0007_image_fingerprints'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Upgrade database schema"""
+    op.create_index('idx_chat_created', 'chat_history', ['created_at'])
+    op.create_table(
+        'chat_archives',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('conversation_id', sa.Integer),
+        sa.Column('path', sa.String(255), nullable=False),
+        sa.Column('first_id', sa.Integer, nullable=False),
+        sa.Column('last_id', sa.Integer, nullable=False),
+        sa.Column('turns', sa.Integer, nullable=False),
+        sa.Column('created_at', sa.DateTime, server_default=sa.func.now()),
+    )
+    op.create_index('idx_archives_user', 'chat_archives', ['user_id', 'last_id'])
+    op.create_index('idx_archives_conversation', 'chat_archives', ['conversation_id', 'last_id'])
+
+def downgrade():
+    """Downgrade database schema"""
+    op.drop_table('chat_archives')
+    op.drop_index('idx_chat_created', table_name='chat_history')
@@ -0,0 +1,29 @@
+"""Track background jobs (async OCR, summaries) and their results"""
+# Migration: 0009_jobs
+# Downgrade: 0008_chat_retention
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0009_jobs'
+down_revision = '0008_chat_retention'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    """Upgrade database schema"""
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.String(32), primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('kind', sa.String(50), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='queued'),
+        sa.Column('result', sa.Text),
+        sa.Column('error', sa.Text),
+        sa.Column('created_at', sa.DateTime, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime, server_default=sa.func.now(), onupdate=sa.func.now()),
+    )
+
+def downgrade():
+    """Downgrade database schema"""
+    op.drop_table('jobs')
@@ -1,11 +1,14 @@
 """
 Database setup for AIVORA
 Creates MySQL tables and initializes database
+
+    python setup_db.py                      # create/upgrade the schema
+    python setup_db.py seed --users 50000   # ...then load synthetic data (bench/seed.py)
 """
 
-import MySQLdb
-import MySQLdb.cursors
-import os
+import argparse
+import pymysql
+import time
 from datetime import datetime
 
 # MySQL connection parameters
@@ -17,10 +20,10 @@ DATABASE = 'aivora_db'
 def create_database():
     """Create database if it doesn't exist"""
     try:
-        conn = MySQLdb.connect(
+        conn = pymysql.connect(
             host=HOST,
             user=USER,
-            passwd=PASSWORD
+            password=PASSWORD
         )
         cursor = conn.cursor()
         cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DATABASE}")
@@ -53,8 +56,12 @@ def create_tables(conn):
             user_id INT NOT NULL,
             title VARCHAR(255),
             content LONGTEXT,
+            content_hash CHAR(64),
             summary LONGTEXT,
+            summary_hash CHAR(64),
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_notes_user_created (user_id, created_at, id, title),
+            FULLTEXT INDEX ft_notes_title_content (title, content),
             FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
         )""",
         
@@ -69,13 +76,45 @@ def create_tables(conn):
             FOREIGN KEY (note_id) REFERENCES notes(id) ON DELETE CASCADE
         )""",
         
+        # Conversations table (rolling summary of turns up to summarized_through_id)
+        """CREATE TABLE IF NOT EXISTS conversations (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            title VARCHAR(255),
+            summary LONGTEXT,
+            summarized_through_id INT NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )""",
+        
         # Chat history table
         """CREATE TABLE IF NOT EXISTS chat_history (
             id INT AUTO_INCREMENT PRIMARY KEY,
             user_id INT NOT NULL,
+            conversation_id INT,
             question TEXT,
             answer LONGTEXT,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_chat_conversation (conversation_id, id),
+            INDEX idx_chat_created (created_at),
+            FULLTEXT INDEX ft_chat_question_answer (question, answer),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+        )""",
+        
+        # Archived chat turns: one row per archive file and conversation
+        """CREATE TABLE IF NOT EXISTS chat_archives (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            conversation_id INT,
+            path VARCHAR(255) NOT NULL,
+            first_id INT NOT NULL,
+            last_id INT NOT NULL,
+            turns INT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_archives_user (user_id, last_id),
+            INDEX idx_archives_conversation (conversation_id, last_id),
             FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
         )""",
         
@@ -88,6 +127,47 @@ def create_tables(conn):
             questions_asked INT DEFAULT 0,
             study_streak INT DEFAULT 0,
             avg_score FLOAT DEFAULT 0,
+            quiz_attempts INT NOT NULL DEFAULT 0,
+            last_activity_date DATE,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_progress_user (user_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )""",
+        
+        # Graded quiz submissions
+        """CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            quiz_id INT NOT NULL,
+            score FLOAT NOT NULL,
+            correct INT NOT NULL,
+            total INT NOT NULL,
+            answers TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_attempts_quiz (quiz_id, id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (quiz_id) REFERENCES quizzes(id) ON DELETE CASCADE
+        )""",
+        
+        # OCR results by image fingerprint (SHA-256 and 64-bit dHash)
+        """CREATE TABLE IF NOT EXISTS image_fingerprints (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            sha256 CHAR(64) NOT NULL,
+            phash BIGINT UNSIGNED NOT NULL,
+            ocr_text LONGTEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_fingerprints_sha256 (sha256)
+        )""",
+        
+        # Background jobs table
+        """CREATE TABLE IF NOT EXISTS jobs (
+            id VARCHAR(32) PRIMARY KEY,
+            user_id INT NOT NULL,
+            kind VARCHAR(50) NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
         )"""
@@ -104,7 +184,109 @@ def create_tables(conn):
     cursor.close()
     print("✅ All tables created/verified")
 
-def main():
+def upgrade_columns(conn):
+    """Add columns to tables created before they were in the schema"""
+    cursor = conn.cursor()
+    
+    columns = [
+        ("chat_history", "conversation_id",
+         "ALTER TABLE chat_history ADD COLUMN conversation_id INT AFTER user_id, "
+         "ADD FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE"),
+        ("notes", "content_hash",
+         "ALTER TABLE notes ADD COLUMN content_hash CHAR(64) AFTER content"),
+        ("notes", "summary_hash",
+         "ALTER TABLE notes ADD COLUMN summary_hash CHAR(64) AFTER summary"),
+        ("progress", "quiz_attempts",
+         "ALTER TABLE progress ADD COLUMN quiz_attempts INT NOT NULL DEFAULT 0 AFTER avg_score"),
+        ("progress", "last_activity_date",
+         "ALTER TABLE progress ADD COLUMN last_activity_date DATE AFTER quiz_attempts"),
+    ]
+    
+    for table, column, statement in columns:
+        cursor.execute("""SELECT COUNT(*) FROM information_schema.COLUMNS
+                          WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND COLUMN_NAME = %s""",
+                       (DATABASE, table, column))
+        if cursor.fetchone()[0]:
+            print(f"⚠️  Column {table}.{column} already exists")
+            continue
+        cursor.execute(statement)
+        conn.commit()
+        print(f"✅ Column {table}.{column} added")
+    
+    cursor.close()
+
+def create_indexes(conn):
+    """Add secondary indexes to tables created before they were in the schema"""
+    cursor = conn.cursor()
+    
+    indexes = [
+        # Keyset pagination of a user's notes, newest first (covers id, title)
+        "CREATE INDEX idx_notes_user_created ON notes (user_id, created_at, id, title)",
+        # One progress row per user, batched counter upserts rely on it
+        "CREATE UNIQUE INDEX uq_progress_user ON progress (user_id)",
+        # /api/search
+        "CREATE FULLTEXT INDEX ft_notes_title_content ON notes (title, content)",
+        "CREATE FULLTEXT INDEX ft_chat_question_answer ON chat_history (question, answer)",
+        # Last N turns of a conversation for chat context
+        "CREATE INDEX idx_chat_conversation ON chat_history (conversation_id, id)",
+        # Retention: chat turns past CHAT_RETENTION_DAYS, oldest first
+        "CREATE INDEX idx_chat_created ON chat_history (created_at)",
+    ]
+    
+    for index in indexes:
+        try:
+            cursor.execute(index)
+            conn.commit()
+            print("✅ Index created")
+        except pymysql.err.OperationalError as e:
+            # 1061: duplicate key name, the index is already there
+            if e.args[0] != 1061:
+                raise
+            print("⚠️  Index already exists")
+    
+    cursor.close()
+    print("✅ All indexes created/verified")
+
+def seed_database(conn, args):
+    """Load synthetic users, notes, quizzes and chat turns"""
+    from bench.seed import seed
+    
+    print(f"🌱 Seeding {args.users} users (seed {args.seed})...")
+    started = time.monotonic()
+    counts = seed(conn, args.users, batch_size=args.batch_size, defer_indexes=not args.keep_indexes,
+                  seed=args.seed, as_of=args.as_of, notes_per_user=args.notes_per_user,
+                  note_chars=args.note_chars, quiz_rate=args.quiz_rate,
+                  conversations_per_user=args.conversations_per_user,
+                  turns_per_conversation=args.turns_per_conversation, days=args.days)
+    loaded = time.monotonic() - started
+    for table, count in counts.items():
+        print(f"   {table}: {count} rows")
+    print(f"✅ Loaded {sum(counts.values())} rows in {loaded:.0f}s")
+    
+    # Rebuilds the FULLTEXT indexes dropped for the load
+    create_indexes(conn)
+    print(f"✅ Seeding complete in {time.monotonic() - started:.0f}s")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Create the AIVORA schema, optionally with synthetic data')
+    parser.add_argument('mode', nargs='?', choices=('setup', 'seed'), default='setup')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42, help='Same seed and --as-of give the same data')
+    parser.add_argument('--as-of', type=datetime.fromisoformat, default=None,
+                        help='Date the generated history ends (default today)')
+    parser.add_argument('--notes-per-user', type=float, default=20)
+    parser.add_argument('--note-chars', type=int, default=3000, help='Median note length')
+    parser.add_argument('--quiz-rate', type=float, default=0.3, help='Share of notes with a quiz')
+    parser.add_argument('--conversations-per-user', type=float, default=3)
+    parser.add_argument('--turns-per-conversation', type=float, default=8)
+    parser.add_argument('--days', type=int, default=365, help='Span of generated history')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per executemany')
+    parser.add_argument('--keep-indexes', action='store_true',
+                        help='Maintain FULLTEXT indexes during the load instead of rebuilding after')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     print("🔧 Setting up AIVORA Database...")
     
     # Create database
@@ -115,6 +297,11 @@ def main():
     
     # Create tables
     create_tables(conn)
+    upgrade_columns(conn)
+    create_indexes(conn)
+    
+    if args.mode == 'seed':
+        seed_database(conn, args)
     
     conn.close()
     print("✅ Database setup complete!")
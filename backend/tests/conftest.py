@@ -1,6 +1,9 @@
 """Test configuration and fixtures"""
+import re
+from contextlib import contextmanager
+
 import pytest
-from app import create_app
+from app import create_app, database
 from app.extensions import db
 from app.models import User
 from werkzeug.security import generate_password_hash
@@ -47,3 +50,129 @@ def auth_headers(client, test_user):
     })
     token = response.json['access_token']
     return {'Authorization': f'Bearer {token}'}
+
+
+class FakeCursor:
+    """DBAPI cursor answering from a FakeDatabase"""
+
+    def __init__(self, fake, dict_rows):
+        self.fake = fake
+        self.dict_rows = dict_rows
+        self.rows = []
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        self.fake.statements.append((sql, params))
+        rows = self.fake.answer(sql, params)
+        self.rows = [dict(row) if self.dict_rows else tuple(row.values()) for row in rows]
+        self.rowcount = len(self.rows)
+        if sql.startswith('INSERT'):
+            self.lastrowid = self.fake.next_id()
+
+    def executemany(self, sql, rows):
+        for params in rows:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        taken, self.rows = self.rows[:size], self.rows[size:]
+        return taken
+
+    def fetchall(self):
+        taken, self.rows = self.rows, []
+        return taken
+
+    def __iter__(self):
+        while self.rows:
+            yield self.rows.pop(0)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, fake):
+        self.fake = fake
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.fake, cursor_class is not None)
+
+    def commit(self):
+        self.fake.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    """Stands in for MySQL behind app.database
+
+    on(pattern, rows) answers statements matching the regex with rows, a
+    list of dicts or a callable(params) returning one; later registrations
+    win. Every statement is recorded as (sql, params) with whitespace
+    collapsed, and INSERTs get increasing lastrowid values.
+    """
+
+    def __init__(self):
+        self.handlers = []
+        self.statements = []
+        self.commits = 0
+        self.last_id = 100
+
+    def on(self, pattern, rows):
+        self.handlers.insert(0, (re.compile(pattern), rows))
+
+    def answer(self, sql, params):
+        for pattern, rows in self.handlers:
+            if pattern.search(sql):
+                return rows(params) if callable(rows) else rows
+        return []
+
+    def next_id(self):
+        self.last_id += 1
+        return self.last_id
+
+    def executed(self, pattern):
+        """Params of every recorded statement matching pattern"""
+        return [params for sql, params in self.statements if re.search(pattern, sql)]
+
+    @contextmanager
+    def streaming_cursor(self, net_write_timeout=600):
+        yield FakeCursor(self, True)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """FakeDatabase serving every query made through app.database"""
+    fake = FakeDatabase()
+    connection = FakeConnection(fake)
+    monkeypatch.setattr(database, 'get_connection', lambda: connection)
+    monkeypatch.setattr(database, 'streaming_cursor', fake.streaming_cursor)
+    return fake
+
+@pytest.fixture
+def api_app(fake_db, tmp_path):
+    """Testing app on the fake database"""
+    app = create_app('testing')
+    app.config.update(UPLOAD_FOLDER=str(tmp_path / 'uploads'), CHAT_ARCHIVE_DIR=str(tmp_path / 'archive'))
+    app.extensions['chat_archive'].root = app.config['CHAT_ARCHIVE_DIR']
+    yield app
+    # Flush buffered counters into the fake, not the real database at exit
+    app.extensions['progress_counters'].shutdown()
+
+@pytest.fixture
+def user_client(api_app):
+    """Test client logged in as user 7"""
+    client = api_app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 7
+        sess['email'] = 'student@example.com'
+        sess['name'] = 'Student'
+    return client
@@ -0,0 +1,44 @@
+"""Test the application factory"""
+import os
+
+from app import create_app
+
+
+def test_testing_config():
+    """Test the testing config runs offline"""
+    app = create_app('testing')
+    assert app.config['TESTING'] is True
+    assert app.config['LLM_BACKEND'] == 'fake'
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == os.getenv('TEST_DATABASE_URL', 'sqlite:///:memory:')
+
+def test_routes_registered():
+    """Test API routes, /metrics and the frontend fallback are served"""
+    app = create_app('testing')
+    client = app.test_client()
+    assert client.get('/api/llm/stats').status_code == 404
+    assert client.get('/api/auth/me').status_code == 401
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/some/client/route').status_code in (200, 404)
+
+def test_apps_are_independent():
+    """Test each call builds its own app, extensions and worker pools"""
+    first, second = create_app('testing'), create_app('testing')
+    assert first is not second
+    for name in ('quiz_pool', 'llm', 'jobs', 'progress_counters', 'response_cache',
+                 'fingerprints', 'passwords', 'chat_archive', 'metrics'):
+        assert first.extensions[name] is not second.extensions[name]
+    assert first.extensions['jobs'].app is first
+    assert first.extensions['progress_counters'].app is first
+
+def test_module_names_follow_current_app():
+    """Test llm, jobs, ... resolve to the extension of the app in context"""
+    from app.jobs import jobs
+    from app.llm import llm
+
+    first, second = create_app('testing'), create_app('testing')
+    with first.app_context():
+        assert llm._get_current_object() is first.extensions['llm']
+        assert jobs.app is first
+    with second.app_context():
+        assert llm._get_current_object() is second.extensions['llm']
+        assert 'ocr' in jobs.handlers
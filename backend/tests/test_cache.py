@@ -0,0 +1,97 @@
+"""Test Gemini response cache"""
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from app.cache import LRUCache, ResponseCache, cache_key
+
+
+@pytest.fixture
+def response_cache():
+    """Cache with the local shared-tier stand-in"""
+    flask_app = Flask(__name__)
+    flask_app.config['RESPONSE_CACHE_SHARED'] = 'local'
+    return ResponseCache(flask_app)
+
+def test_cache_key_depends_on_model():
+    """Test the same prompt on different models gets different keys"""
+    assert cache_key('gemini-pro', 'hi') == cache_key('gemini-pro', 'hi')
+    assert cache_key('gemini-pro', 'hi') != cache_key('gemini-1.5-flash', 'hi')
+
+def test_lru_evicts_by_size():
+    """Test the oldest entries are evicted when over the byte budget"""
+    lru = LRUCache(max_entries=10, max_bytes=10, ttl=60)
+    lru.set('a', '12345')
+    lru.set('b', '12345')
+    lru.get('a')
+    lru.set('c', '12345')
+    assert lru.get('a') == '12345'
+    assert lru.get('b') is None
+    assert lru.size == 10
+
+def test_lru_ttl_expiry():
+    """Test expired entries are not returned"""
+    lru = LRUCache(ttl=0)
+    lru.set('a', 'value')
+    time.sleep(0.01)
+    assert lru.get('a') is None
+    assert len(lru) == 0
+
+def test_get_or_compute_hits(response_cache):
+    """Test repeated prompts are served from cache"""
+    calls = []
+    compute = lambda: calls.append(1) or 'answer'
+    assert response_cache.get_or_compute('gemini-pro', 'p', compute) == 'answer'
+    assert response_cache.get_or_compute('gemini-pro', 'p', compute) == 'answer'
+    assert len(calls) == 1
+    stats = response_cache.snapshot()
+    assert stats['misses'] == 1
+    assert stats['local_hits'] == 1
+
+def test_shared_tier_fills_local(response_cache):
+    """Test a shared-tier hit is promoted into the local tier"""
+    response_cache.shared.set(cache_key('gemini-pro', 'p'), 'shared answer', 60)
+    assert response_cache.get_or_compute('gemini-pro', 'p', lambda: 'fresh') == 'shared answer'
+    assert response_cache.snapshot()['shared_hits'] == 1
+    assert response_cache.snapshot()['local_entries'] == 1
+
+def test_peek_counts_each_tier(response_cache):
+    """Test peek reports shared-tier hits as shared, then local once promoted"""
+    assert response_cache.peek('gemini-pro', 'p') is None
+    response_cache.shared.set(cache_key('gemini-pro', 'p'), 'shared answer', 60)
+    assert response_cache.peek('gemini-pro', 'p') == 'shared answer'
+    assert response_cache.peek('gemini-pro', 'p') == 'shared answer'
+    stats = response_cache.snapshot()
+    assert (stats['misses'], stats['shared_hits'], stats['local_hits']) == (1, 1, 1)
+
+def test_concurrent_misses_coalesce(response_cache):
+    """Test identical concurrent requests make one upstream call"""
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return 'answer'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        response_cache.get_or_compute('gemini-pro', 'p', compute))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == ['answer'] * 5
+    assert len(calls) == 1
+
+def test_errors_are_not_cached(response_cache):
+    """Test a failed upstream call is retried on the next request"""
+    def fail():
+        raise RuntimeError('quota')
+    with pytest.raises(RuntimeError):
+        response_cache.get_or_compute('gemini-pro', 'p', fail)
+    assert response_cache.get_or_compute('gemini-pro', 'p', lambda: 'ok') == 'ok'
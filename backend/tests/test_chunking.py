@@ -0,0 +1,76 @@
+"""Test chunking and map-reduce summarization"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.chunking import MapReduceSummarizer, estimate_tokens, split_into_chunks
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+def test_short_text_is_one_chunk():
+    """Test text under budget is left whole"""
+    assert split_into_chunks('One.\n\nTwo.', 100) == ['One.\n\nTwo.']
+
+def test_chunks_respect_budget():
+    """Test paragraphs are packed without exceeding the token budget"""
+    text = '\n\n'.join(f'Paragraph {i} ' + 'word ' * 40 for i in range(30))
+    chunks = split_into_chunks(text, 200)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 200 for chunk in chunks)
+    assert ''.join(''.join(chunks).split()) == ''.join(text.split())
+
+def test_heading_starts_new_chunk():
+    """Test a heading always opens a new chunk"""
+    text = 'intro ' * 20 + '\n\n# Section Two\n\nbody text'
+    chunks = split_into_chunks(text, 200)
+    assert chunks[1].startswith('# Section Two')
+
+def test_oversized_paragraph_is_split():
+    """Test one huge paragraph is broken up by sentence"""
+    text = ' '.join(f'Sentence number {i} is here.' for i in range(200))
+    chunks = split_into_chunks(text, 100)
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert len(chunks) > 1
+
+def test_editing_one_section_changes_one_chunk():
+    """Test chunk boundaries are stable so unchanged chunks hit the cache"""
+    sections = [f'# Part {i}\n\n' + f'Fact {i}. ' * 90 for i in range(5)]
+    before = split_into_chunks('\n\n'.join(sections), 300)
+    sections[2] = sections[2].replace('Fact 2.', 'Updated fact 2.', 1)
+    after = split_into_chunks('\n\n'.join(sections), 300)
+    assert len(before) == len(after)
+    assert sum(a != b for a, b in zip(before, after)) == 1
+
+def test_edit_without_headings_keeps_later_chunks():
+    """Test an early edit in text without headings leaves the chunks after it unchanged"""
+    paragraphs = [f'Paragraph {i} on topic {i * 37}. ' + 'word ' * (20 + i * 7 % 40) for i in range(40)]
+    before = split_into_chunks('\n\n'.join(paragraphs), 300)
+    paragraphs[1] += ' More detail.' * 40
+    after = split_into_chunks('\n\n'.join(paragraphs), 300)
+    assert len(set(after) - set(before)) <= 2
+    assert after[-5:] == before[-5:]
+
+def test_short_text_uses_direct_prompt(executor):
+    """Test text that fits is summarized with a single call"""
+    prompts = []
+    summarizer = MapReduceSummarizer(lambda p: prompts.append(p) or 'summary', executor, max_tokens=100)
+    assert summarizer.summarize('short note', lambda t: f'DIRECT {t}') == 'summary'
+    assert prompts == ['DIRECT short note']
+
+def test_long_text_map_reduce(executor):
+    """Test long text is summarized per chunk, then reduced once"""
+    prompts = []
+
+    def generate(prompt):
+        prompts.append(prompt)
+        return 'partial' if prompt.startswith('Summarize this section') else 'final'
+
+    summarizer = MapReduceSummarizer(generate, executor, max_tokens=100)
+    text = '\n\n'.join('word ' * 60 for _ in range(6))
+    assert summarizer.summarize(text, lambda t: 'DIRECT') == 'final'
+    assert sum(p.startswith('Summarize this section') for p in prompts) == 6
+    assert sum(p.startswith('Combine') for p in prompts) == 1
@@ -0,0 +1,43 @@
+"""Test chat context assembly"""
+from app.chunking import estimate_tokens
+from app.conversation import assemble_prompt, load_context
+
+
+def turns(count, answer_words=20):
+    return [{'question': f'question {i}', 'answer': ' '.join(['answer'] * answer_words) + f' {i}'}
+            for i in range(count)]
+
+def test_first_message_is_sent_as_is():
+    """Test a new conversation sends just the message"""
+    assert assemble_prompt('What is osmosis?', None, [], 1000) == 'What is osmosis?'
+
+def test_includes_summary_and_turns_in_order():
+    """Test context is summary, then recent turns oldest first, then the message"""
+    prompt = assemble_prompt('next?', 'We covered cells.', turns(3), 1000)
+    assert prompt.index('We covered cells.') < prompt.index('question 0') < prompt.index('question 2')
+    assert prompt.endswith('Student: next?\nAssistant:')
+
+def test_prompt_stays_within_budget():
+    """Test prompt size is bounded however many turns are passed in"""
+    for count in (5, 50, 500):
+        prompt = assemble_prompt('next?', 'summary ' * 2000, turns(count, 200), 1500)
+        assert estimate_tokens(prompt) <= 1500
+
+def test_oldest_turns_dropped_first():
+    """Test the newest turns are kept when the budget is tight"""
+    prompt = assemble_prompt('next?', None, turns(20, 100), 800)
+    assert 'question 19' in prompt
+    assert 'question 0\n' not in prompt
+
+def test_unfolded_turns_stay_in_context(fake_db):
+    """Test turns past the recent window but not yet folded are still loaded"""
+    fake_db.on('FROM conversations', [{'id': 3, 'summary': 'earlier', 'summarized_through_id': 10,
+                                       'created_at': None}])
+    history = [{'id': turn_id, 'question': f'question {turn_id}', 'answer': 'answer'}
+               for turn_id in range(19, 0, -1)]
+    fake_db.on('FROM chat_history', lambda params: [turn for turn in history
+                                                    if turn['id'] > params[1]][:params[2]])
+    conversation, loaded = load_context(3, 7, recent_turns=6)
+    assert conversation['summary'] == 'earlier'
+    assert [turn['id'] for turn in loaded] == list(range(11, 20))
+    assert 'question 11' in assemble_prompt('next?', conversation['summary'], loaded, 4000)
@@ -0,0 +1,125 @@
+"""Test write-behind progress counters"""
+import threading
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+
+from app import counters as counters_module
+from app.counters import ProgressCounters
+
+
+class RecordingCursor:
+    """Stands in for a DB cursor, records executemany batches"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def executemany(self, query, rows):
+        if self.fail:
+            raise RuntimeError('db down')
+        self.batches.append(sorted(rows))
+
+
+@pytest.fixture
+def cursor(monkeypatch):
+    cursor = RecordingCursor()
+
+    @contextmanager
+    def transaction(dict_rows=False):
+        yield cursor
+
+    monkeypatch.setattr(counters_module.database, 'transaction', transaction)
+    return cursor
+
+@pytest.fixture
+def counters():
+    """Counters without the background thread, flushed explicitly"""
+    counters = ProgressCounters()
+    counters.app = Flask(__name__)
+    return counters
+
+def test_increments_are_batched(counters, cursor):
+    """Test many increments become one upsert row per user"""
+    for _ in range(3):
+        counters.add(1, 'notes_created')
+    counters.add(1, 'quizzes_taken', 5)
+    counters.add(2, 'questions_asked')
+    assert counters.flush() == 2
+    assert cursor.batches == [[(1, 3, 5, 0), (2, 0, 0, 1)]]
+    assert counters.pending(1) == {'notes_created': 0, 'quizzes_taken': 0, 'questions_asked': 0}
+
+def test_empty_flush_skips_db(counters, cursor):
+    """Test nothing is written when no increments are pending"""
+    assert counters.flush() == 0
+    assert cursor.batches == []
+
+def test_read_merges_pending(counters, cursor):
+    """Test reads add buffered deltas to persisted values"""
+    counters.add(1, 'notes_created', 2)
+    row = counters.read(1, lambda: {'notes_created': 10, 'quizzes_taken': 1,
+                                    'questions_asked': 0, 'avg_score': 80})
+    assert row['notes_created'] == 12
+    assert row['quizzes_taken'] == 1
+    assert row['avg_score'] == 80
+    assert counters.read(1, lambda: None) is None
+
+def test_flush_does_not_block_increments_or_reads(counters, monkeypatch):
+    """Test add() and read() go ahead while a batch is being written"""
+    writing, release = threading.Event(), threading.Event()
+    batches = []
+
+    class SlowCursor:
+        def executemany(self, query, rows):
+            writing.set()
+            release.wait(5)
+            batches.append(sorted(rows))
+
+    @contextmanager
+    def transaction(dict_rows=False):
+        yield SlowCursor()
+
+    monkeypatch.setattr(counters_module.database, 'transaction', transaction)
+    counters.add(1, 'notes_created')
+    flusher = threading.Thread(target=counters.flush)
+    flusher.start()
+    assert writing.wait(5)
+
+    counters.add(1, 'notes_created', 2)
+    row = counters.read(1, lambda: {'notes_created': 10, 'quizzes_taken': 0, 'questions_asked': 0})
+    # The batch in flight is in neither the table nor the buffer yet
+    assert row['notes_created'] == 12
+    release.set()
+    flusher.join()
+    counters.flush()
+    assert batches == [[(1, 1, 0, 0)], [(1, 2, 0, 0)]]
+
+def test_failed_flush_keeps_increments(counters, cursor):
+    """Test deltas survive a failed flush and go out with the next one"""
+    counters.add(1, 'notes_created')
+    cursor.fail = True
+    with pytest.raises(RuntimeError):
+        counters.flush()
+    counters.add(1, 'notes_created')
+    cursor.fail = False
+    counters.flush()
+    assert cursor.batches == [[(1, 2, 0, 0)]]
+
+def test_threshold_wakes_flusher(counters):
+    """Test reaching the threshold signals the flush thread"""
+    counters.threshold = 2
+    counters.add(1, 'notes_created')
+    assert not counters._wakeup.is_set()
+    counters.add(1, 'notes_created')
+    assert counters._wakeup.is_set()
+
+def test_shutdown_flushes(counters, cursor):
+    """Test graceful shutdown writes pending increments"""
+    counters.add(3, 'quizzes_taken')
+    counters.shutdown()
+    assert cursor.batches == [[(3, 0, 1, 0)]]
+
+def test_unknown_field(counters):
+    with pytest.raises(KeyError):
+        counters.add(1, 'avg_score')
@@ -0,0 +1,68 @@
+"""Test pooled data-access layer"""
+import pytest
+from flask import Flask
+
+from app import database
+
+
+@pytest.fixture
+def db_app(tmp_path):
+    """App bound to a throwaway SQLite file"""
+    flask_app = Flask(__name__)
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    database.init_app(flask_app)
+    with flask_app.app_context():
+        with database.transaction() as cursor:
+            cursor.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+    return flask_app
+
+def count_items():
+    cursor = database.get_cursor()
+    cursor.execute('SELECT COUNT(*) FROM items')
+    return cursor.fetchone()[0]
+
+def test_engine_options(db_app):
+    """Test pre-ping and recycle are configured"""
+    options = db_app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    assert options['pool_pre_ping'] is True
+    assert options['pool_recycle'] == 1800
+
+def test_one_connection_per_context(db_app):
+    """Test the context reuses a single pooled connection"""
+    with db_app.app_context():
+        assert database.get_connection() is database.get_connection()
+
+def test_transaction_commits(db_app):
+    """Test writes in a transaction are visible to the next request"""
+    with db_app.app_context():
+        with database.transaction() as cursor:
+            cursor.execute("INSERT INTO items (name) VALUES ('a')")
+            cursor.execute("INSERT INTO items (name) VALUES ('b')")
+    with db_app.app_context():
+        assert count_items() == 2
+
+def test_transaction_rolls_back(db_app):
+    """Test a failure inside the block discards every write"""
+    with db_app.app_context():
+        with pytest.raises(RuntimeError):
+            with database.transaction() as cursor:
+                cursor.execute("INSERT INTO items (name) VALUES ('a')")
+                raise RuntimeError('boom')
+        assert count_items() == 0
+
+def test_uncommitted_writes_dropped_on_teardown(db_app):
+    """Test writes outside transaction() are rolled back when the context ends"""
+    with db_app.app_context():
+        database.get_cursor().execute("INSERT INTO items (name) VALUES ('a')")
+    with db_app.app_context():
+        assert count_items() == 0
+
+def test_idle_connection_released_outside_transactions(db_app):
+    """Test the connection goes back to the pool only when no transaction is open"""
+    with db_app.app_context():
+        conn = database.get_connection()
+        with database.transaction():
+            database.release_idle_connection()
+            assert database.get_connection() is conn
+        database.release_idle_connection()
+        assert database.get_connection() is not conn
@@ -0,0 +1,119 @@
+"""Test streaming data export"""
+import gzip
+import hashlib
+import json
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+
+from app import create_app, database, routes
+from app.export import export_rows, gzip_ndjson, zip_ndjson
+
+
+def sample_records(notes=3):
+    yield 'users', {'id': 7, 'name': 'Ada', 'email': 'ada@example.com',
+                    'created_at': datetime(2024, 1, 2, 3, 4, 5)}
+    for note_id in range(1, notes + 1):
+        yield 'notes', {'id': note_id, 'user_id': 7, 'title': f'Note {note_id}',
+                        'content': 'mitosis ' * 50}
+    yield 'chat_history', {'id': 1, 'user_id': 7, 'question': 'why?', 'answer': 'because'}
+
+def test_gzip_ndjson_round_trip():
+    """Test every record becomes one tagged line, dates as ISO strings"""
+    lines = gzip.decompress(b''.join(gzip_ndjson(sample_records()))).decode().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [record['table'] for record in records] == ['users', 'notes', 'notes', 'notes', 'chat_history']
+    assert records[0]['row']['created_at'] == '2024-01-02T03:04:05'
+    assert records[1]['row']['title'] == 'Note 1'
+
+def test_gzip_ndjson_streams_in_chunks():
+    """Test output is handed over as it is produced, not all at the end"""
+    records = (('notes', {'i': i, 'text': hashlib.sha256(str(i).encode()).hexdigest()}) for i in range(20000))
+    chunks = list(gzip_ndjson(records, level=1, chunk_size=4096))
+    assert len(chunks) > 10
+    # Bounded by chunk_size plus what zlib emits at once, not by the input
+    assert max(len(chunk) for chunk in chunks) < sum(len(chunk) for chunk in chunks) / 5
+    assert len(gzip.decompress(b''.join(chunks)).splitlines()) == 20000
+
+def test_zip_ndjson_one_file_per_table():
+    """Test the zip holds a readable NDJSON member per table"""
+    data = b''.join(zip_ndjson(sample_records(), chunk_size=128))
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        assert archive.namelist() == ['users.ndjson', 'notes.ndjson', 'chat_history.ndjson']
+        notes = [json.loads(line) for line in archive.read('notes.ndjson').splitlines()]
+    assert [note['id'] for note in notes] == [1, 2, 3]
+
+def test_archived_turns_read_in_snapshot(monkeypatch):
+    """Test the archive index is read on the snapshot's cursor, after the snapshot starts"""
+    class SnapshotCursor:
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, sql, params=None):
+            self.statements.append(sql)
+
+        def __iter__(self):
+            return iter([])
+
+    snapshot = SnapshotCursor()
+
+    @contextmanager
+    def streaming_cursor(net_write_timeout=600):
+        yield snapshot
+
+    def archived_turns(user_id, cursor):
+        assert cursor is snapshot and cursor.statements[0].startswith('START TRANSACTION')
+        return [{'id': 1, 'user_id': user_id}]
+
+    monkeypatch.setattr(database, 'streaming_cursor', streaming_cursor)
+    records = list(export_rows(7, archived_turns=archived_turns))
+    assert records == [('chat_history', {'id': 1, 'user_id': 7})]
+
+@pytest.fixture
+def app(monkeypatch):
+    calls = []
+
+    def export_rows(user_id=None, net_write_timeout=600, archived_turns=None):
+        calls.append(user_id)
+        yield from sample_records()
+
+    monkeypatch.setattr(routes, 'export_rows', export_rows)
+    app = create_app('testing')
+    app.config['ADMIN_EXPORT_TOKEN'] = 's3cret'
+    app.export_calls = calls
+    return app
+
+def test_user_export_requires_login(app):
+    """Test anonymous requests are refused"""
+    assert app.test_client().get('/api/user/export').status_code == 401
+
+def test_user_export_downloads_own_data(app):
+    """Test the export is scoped to the session's user and served as a download"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 7
+    response = client.get('/api/user/export?format=zip')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    assert 'aivora-export-7.zip' in response.headers['Content-Disposition']
+    assert zipfile.ZipFile(BytesIO(response.data)).namelist()[0] == 'users.ndjson'
+    assert app.export_calls == [7]
+
+    assert client.get('/api/user/export?format=csv').status_code == 400
+
+def test_admin_export_needs_token(app):
+    """Test the admin export checks the token and covers all users"""
+    client = app.test_client()
+    assert client.get('/api/admin/export').status_code == 403
+    assert client.get('/api/admin/export', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+
+    response = client.get('/api/admin/export', headers={'X-Admin-Token': 's3cret'})
+    assert response.status_code == 200
+    assert len(gzip.decompress(response.data).splitlines()) == 5
+    assert app.export_calls == [None]
+
+    app.config['ADMIN_EXPORT_TOKEN'] = None
+    assert client.get('/api/admin/export', headers={'X-Admin-Token': 's3cret'}).status_code == 404
@@ -0,0 +1,173 @@
+"""Test OCR reuse by image fingerprint"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+
+from app import fingerprints as fingerprints_module
+from app.fingerprints import FingerprintStore, HammingIndex, sha256_hex
+
+
+def flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+def test_index_exact_and_near_matches():
+    """Test search finds hashes within the distance, closest first"""
+    index = HammingIndex()
+    base = 0x0123456789ABCDEF
+    index.add(base, 1)
+    index.add(flip(base, [0, 17, 40]), 2)
+    index.add(flip(base, [3, 9, 21, 33, 50, 60]), 3)
+
+    assert index.search(base, 0) == [(0, 1)]
+    assert index.search(flip(base, [0]), 4, limit=3) == [(1, 1), (2, 2)]
+    assert index.search(base, 6, limit=3) == [(0, 1), (3, 2), (6, 3)]
+    assert index.search(~base & (2 ** 64 - 1), 10) == []
+
+def test_index_matches_brute_force():
+    """Test multi-index search returns exactly what a linear scan would"""
+    rng = random.Random(7)
+    index = HammingIndex()
+    hashes = []
+    for item_id in range(500):
+        base = rng.getrandbits(64) if item_id % 5 == 0 else flip(hashes[-1][0], rng.sample(range(64), rng.randint(1, 12)))
+        hashes.append((base, item_id))
+        index.add(base, item_id)
+
+    for query, _ in hashes[::25]:
+        query = flip(query, rng.sample(range(64), 3))
+        expected = sorted(((stored ^ query).bit_count(), item_id) for stored, item_id in hashes
+                          if (stored ^ query).bit_count() <= 10)
+        assert index.search(query, 10, limit=len(hashes)) == expected
+
+
+class FakeFingerprints:
+    """Just enough of a cursor to serve the image_fingerprints queries"""
+
+    def __init__(self):
+        self.rows = []
+        self.result = []
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, sql, params):
+        if sql.startswith('INSERT'):
+            sha256, phash, text = params
+            if any(row['sha256'] == sha256 for row in self.rows):
+                self.rowcount = 0
+                return
+            self.lastrowid = len(self.rows) + 1
+            self.rowcount = 1
+            self.rows.append({'id': self.lastrowid, 'sha256': sha256, 'phash': phash, 'ocr_text': text})
+        elif 'WHERE sha256' in sql:
+            self.result = [{'ocr_text': row['ocr_text']} for row in self.rows if row['sha256'] == params[0]]
+        elif 'WHERE id = ' in sql:
+            self.result = [{'ocr_text': row['ocr_text']} for row in self.rows if row['id'] == params[0]]
+        else:
+            after, limit = params
+            self.result = [(row['id'], row['phash']) for row in self.rows if row['id'] > after][:limit]
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+@pytest.fixture
+def cursor(monkeypatch):
+    cursor = FakeFingerprints()
+
+    @contextmanager
+    def transaction(dict_rows=False):
+        yield cursor
+
+    monkeypatch.setattr(fingerprints_module.database, 'get_cursor', lambda dict_rows=False: cursor)
+    monkeypatch.setattr(fingerprints_module.database, 'transaction', transaction)
+    return cursor
+
+def make_store(distance):
+    app = Flask(__name__)
+    app.config.update(OCR_NEAR_DUPLICATE_DISTANCE=distance, FINGERPRINT_SYNC_INTERVAL=0)
+    return FingerprintStore(app)
+
+def test_exact_match_reused(cursor):
+    """Test the same bytes reuse stored text, near matches are off by default"""
+    store = make_store(0)
+    digest = sha256_hex(b'page')
+    assert store.lookup(digest, 0xFF) is None
+    store.add(digest, 0xFF, 'cell biology')
+
+    assert store.lookup(digest, 0xFF) == 'cell biology'
+    assert store.lookup(sha256_hex(b'other photo'), 0xFE) is None
+    assert store.snapshot() == {'exact_hits': 1, 'near_hits': 0, 'misses': 2, 'indexed': 0}
+
+def test_near_match_within_distance(cursor):
+    """Test a dHash within the configured distance reuses text, farther ones do not"""
+    store = make_store(4)
+    store.add(sha256_hex(b'page'), 0xF0F0, 'cell biology')
+
+    assert store.lookup(sha256_hex(b'retake'), flip(0xF0F0, [1, 30])) == 'cell biology'
+    assert store.lookup(sha256_hex(b'other page'), flip(0xF0F0, [1, 2, 3, 4, 5])) is None
+    assert store.snapshot()['near_hits'] == 1
+
+def test_rows_from_other_workers_synced(cursor):
+    """Test fingerprints written elsewhere are loaded once, locally added ones not twice"""
+    store = make_store(4)
+    cursor.rows.append({'id': 1, 'sha256': 'a' * 64, 'phash': 0xAAAA, 'ocr_text': 'from elsewhere'})
+    store.add(sha256_hex(b'page'), 0x5555, 'local')
+
+    assert store.lookup(sha256_hex(b'retake'), flip(0xAAAA, [0])) == 'from elsewhere'
+    assert store.lookup(sha256_hex(b'retake 2'), flip(0x5555, [0])) == 'local'
+    assert store.snapshot()['indexed'] == 2
+
+def test_late_committed_rows_synced(cursor):
+    """Test a row whose lower id commits after a higher one was synced is still loaded, once"""
+    store = make_store(4)
+    cursor.rows.append({'id': 3, 'sha256': 'c' * 64, 'phash': 0xCCCC, 'ocr_text': 'third'})
+    assert store.lookup(sha256_hex(b'retake'), flip(0xCCCC, [0])) == 'third'
+    cursor.rows.insert(0, {'id': 2, 'sha256': 'b' * 64, 'phash': 0xBBBB, 'ocr_text': 'second'})
+
+    assert store.lookup(sha256_hex(b'retake 2'), flip(0xBBBB, [0])) == 'second'
+    assert store.lookup(sha256_hex(b'retake 3'), flip(0xCCCC, [1])) == 'third'
+    assert store.snapshot()['indexed'] == 2
+
+def test_model_phash_unsigned_on_mysql():
+    """Test the model creates phash as BIGINT UNSIGNED, like setup_db.py, so dHashes >= 2**63 fit"""
+    from sqlalchemy.dialects import mysql
+    from sqlalchemy.schema import CreateTable
+
+    from app.models import ImageFingerprint
+
+    ddl = str(CreateTable(ImageFingerprint.__table__).compile(dialect=mysql.dialect()))
+    assert 'phash BIGINT UNSIGNED NOT NULL' in ddl
+
+def test_lookups_not_blocked_by_sync(cursor):
+    """Test lookups search the current index while another thread reads new rows"""
+    store = make_store(4)
+    store.add(sha256_hex(b'page'), 0xF0F0, 'cell biology')
+    reading, release = threading.Event(), threading.Event()
+    fetchall = cursor.fetchall
+
+    def slow_fetchall():
+        rows = fetchall()
+        if threading.current_thread() is not main:
+            reading.set()
+            release.wait(5)
+        return rows
+
+    main = threading.current_thread()
+    cursor.fetchall = slow_fetchall
+    syncing = threading.Thread(target=store._sync)
+    syncing.start()
+    assert reading.wait(5)
+
+    started = time.monotonic()
+    assert store.lookup(sha256_hex(b'retake'), flip(0xF0F0, [3])) == 'cell biology'
+    assert time.monotonic() - started < 1
+    release.set()
+    syncing.join()
@@ -0,0 +1,34 @@
+"""Test quiz grading and streak helpers"""
+from datetime import date
+
+from app.grading import current_streak, grade_quiz
+
+QUESTIONS = [
+    {'id': 1, 'question': 'Q1?', 'options': ['A', 'B', 'C', 'D'], 'correct': 'B'},
+    {'id': 2, 'question': 'Q2?', 'options': ['Mitosis', 'Meiosis'], 'correct': 'Meiosis'},
+    {'id': 3, 'question': 'Q3?', 'options': ['x', 'y'], 'correct': 'x'},
+]
+
+
+def test_grade_list_answers():
+    """Test answers by position, as option text or index"""
+    correct, total, results = grade_quiz(QUESTIONS, ['B', 1, 'y'])
+    assert (correct, total) == (2, 3)
+    assert [r['correct'] for r in results] == [True, True, False]
+    assert results[1]['answer'] == 'Meiosis'
+    assert results[2]['correct_answer'] == 'x'
+
+def test_grade_dict_answers_and_missing():
+    """Test answers keyed by question id; unanswered questions are wrong"""
+    correct, total, results = grade_quiz(QUESTIONS, {'2': ' meiosis ', 3: 'x'})
+    assert (correct, total) == (2, 3)
+    assert results[0]['answer'] is None
+    assert results[0]['correct'] is False
+
+def test_current_streak_lapses():
+    """Test a streak survives until a full day passes without activity"""
+    today = date(2024, 3, 10)
+    assert current_streak(4, date(2024, 3, 10), today) == 4
+    assert current_streak(4, date(2024, 3, 9), today) == 4
+    assert current_streak(4, date(2024, 3, 8), today) == 0
+    assert current_streak(0, None, today) == 0
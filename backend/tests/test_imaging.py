@@ -0,0 +1,96 @@
+"""Test OCR image preprocessing"""
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app.imaging import InvalidImage, dhash, preprocess_image
+
+
+def make_image(size, fmt='PNG', exif_orientation=None):
+    image = Image.new('RGB', size, (200, 30, 30))
+    out = BytesIO()
+    if exif_orientation:
+        exif = Image.Exif()
+        exif[0x0112] = exif_orientation
+        image.save(out, format=fmt, exif=exif)
+    else:
+        image.save(out, format=fmt)
+    return out.getvalue()
+
+def test_downscales_to_max_dimension():
+    """Test large images are shrunk, keeping aspect ratio"""
+    data, size = preprocess_image(make_image((4000, 2000)), max_dimension=1000)
+    assert size == (1000, 500)
+    assert Image.open(BytesIO(data)).format == 'JPEG'
+
+def test_small_images_not_upscaled():
+    """Test images under the limit keep their size"""
+    _, size = preprocess_image(make_image((300, 200)), max_dimension=1000)
+    assert size == (300, 200)
+
+def test_grayscale_conversion():
+    """Test output is single-channel when grayscale is on"""
+    data, _ = preprocess_image(make_image((300, 200)), grayscale=True)
+    assert Image.open(BytesIO(data)).mode == 'L'
+    data, _ = preprocess_image(make_image((300, 200)), grayscale=False)
+    assert Image.open(BytesIO(data)).mode == 'RGB'
+
+def test_exif_rotation_applied():
+    """Test EXIF orientation 6 (rotate 90) swaps width and height"""
+    _, size = preprocess_image(make_image((400, 200), fmt='JPEG', exif_orientation=6))
+    assert size == (200, 400)
+
+def test_accepts_file_objects():
+    """Test a file-like upload stream is accepted"""
+    _, size = preprocess_image(BytesIO(make_image((50, 40))))
+    assert size == (50, 40)
+
+def test_invalid_image():
+    """Test non-image bytes raise InvalidImage"""
+    with pytest.raises(InvalidImage):
+        preprocess_image(b'not an image')
+
+@pytest.mark.parametrize('fmt', ['PNG', 'JPEG'])
+def test_truncated_image(fmt):
+    """Test a file cut off after its header raises InvalidImage, not OSError"""
+    data = make_image((400, 300), fmt)
+    with pytest.raises(InvalidImage, match='truncated or corrupt'):
+        preprocess_image(data[:len(data) // 2])
+
+def test_decompression_bomb(monkeypatch):
+    """Test images past PIL's pixel limit raise InvalidImage"""
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    with pytest.raises(InvalidImage, match='too large'):
+        preprocess_image(make_image((100, 100)))
+
+def make_page(size, text_rows):
+    """Lit-from-one-side page with dark bars standing in for lines of text"""
+    width, height = size
+    image = Image.linear_gradient('L').rotate(90).resize(size).point(lambda v: 190 + v // 6)
+    for top, length in text_rows:
+        image.paste(20, (width // 10, int(top * height), int(length * width), int(top * height) + height // 12))
+    return image
+
+def as_jpeg(image, quality=80):
+    out = BytesIO()
+    image.save(out, format='JPEG', quality=quality)
+    return out.getvalue()
+
+def test_dhash_survives_rescale_and_recompression():
+    """Test a resized, recompressed copy hashes within a few bits"""
+    page = make_page((1200, 1600), [(0.1, 0.8), (0.3, 0.5), (0.55, 0.9), (0.8, 0.4)])
+    original = dhash(as_jpeg(page, quality=90))
+    copy = dhash(as_jpeg(page.resize((600, 800)), quality=50))
+    assert (original ^ copy).bit_count() <= 8
+
+def test_dhash_differs_between_pages():
+    """Test different layouts are far apart"""
+    first = dhash(as_jpeg(make_page((1200, 1600), [(0.1, 0.8), (0.3, 0.5), (0.55, 0.9)])))
+    second = dhash(as_jpeg(make_page((1200, 1600), [(0.2, 0.3), (0.45, 0.85), (0.7, 0.6)])))
+    assert (first ^ second).bit_count() >= 16
+
+def test_dhash_invalid_image():
+    """Test non-image bytes raise InvalidImage"""
+    with pytest.raises(InvalidImage):
+        dhash(b'not an image')
@@ -0,0 +1,123 @@
+"""Test the submit/poll job queue on its thread-pool backend"""
+import base64
+import threading
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app import jobs as jobs_module
+
+
+@pytest.fixture
+def job_table(fake_db):
+    """Jobs table on the fake database; maps job id to its row and status history"""
+    rows = {}
+
+    def insert(params):
+        job_id, user_id, kind, status, created_at = params
+        rows[job_id] = {'id': job_id, 'user_id': user_id, 'kind': kind, 'status': status, 'result': None,
+                        'error': None, 'created_at': created_at, 'updated_at': created_at,
+                        'history': [status]}
+        return []
+
+    def update(params):
+        status, result, error, job_id = params
+        rows[job_id].update(status=status, result=result, error=error)
+        rows[job_id]['history'].append(status)
+        return []
+
+    def select(params):
+        job_id, user_id = params
+        row = rows.get(job_id)
+        return [{key: value for key, value in row.items() if key != 'history'}] \
+            if row and row['user_id'] == user_id else []
+
+    fake_db.on('INSERT INTO jobs', insert)
+    fake_db.on('UPDATE jobs', update)
+    fake_db.on('FROM jobs WHERE id', select)
+    return rows
+
+@pytest.fixture
+def queue(api_app, job_table, monkeypatch):
+    """The app's job queue with a blocking, an echoing and a failing test task"""
+    release = threading.Event()
+
+    def blocking(value):
+        release.wait(5)
+        return {'value': value}
+
+    def failing():
+        raise ValueError('page unreadable')
+
+    monkeypatch.setitem(jobs_module.HANDLERS, 'test-blocking', blocking)
+    monkeypatch.setitem(jobs_module.HANDLERS, 'test-echo', lambda value: {'value': value})
+    monkeypatch.setitem(jobs_module.HANDLERS, 'test-failing', failing)
+    queue = api_app.extensions['jobs']
+    queue.release = release
+    return queue
+
+def wait_for(job_table, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job_table[job_id]['status'] != status:
+        assert time.monotonic() < deadline, job_table[job_id]
+        time.sleep(0.01)
+
+def test_status_transitions_to_done(api_app, queue, job_table):
+    """Test a job goes queued -> running -> done and its result can be fetched"""
+    with api_app.app_context():
+        job_id = queue.submit('test-blocking', 7, value=3)
+        assert job_table[job_id]['history'][0] == 'queued'
+        wait_for(job_table, job_id, 'running')
+        assert queue.get(job_id, 7)['status'] == 'running'
+
+        queue.release.set()
+        wait_for(job_table, job_id, 'done')
+        job = queue.get(job_id, 7)
+    assert job_table[job_id]['history'] == ['queued', 'running', 'done']
+    assert job['result'] == {'value': 3}
+    assert job['error'] is None
+
+def test_failing_job_records_error(api_app, queue, job_table):
+    """Test a raising handler marks the job failed with its message"""
+    with api_app.app_context():
+        job_id = queue.submit('test-failing', 7)
+        wait_for(job_table, job_id, 'failed')
+        job = queue.get(job_id, 7)
+    assert job_table[job_id]['history'] == ['queued', 'running', 'failed']
+    assert job['error'] == 'page unreadable'
+    assert job['result'] is None
+
+def test_jobs_are_private_and_kinds_checked(api_app, queue, job_table):
+    """Test another user's job is not visible and unknown kinds are refused"""
+    with api_app.app_context():
+        job_id = queue.submit('test-echo', 7, value=1)
+        wait_for(job_table, job_id, 'done')
+        assert queue.get(job_id, 8) is None
+        with pytest.raises(KeyError):
+            queue.submit('no-such-kind', 7)
+
+def test_async_ocr_submit_and_poll(queue, job_table, user_client, api_app):
+    """Test ?async=1 answers 202 with a job id that polls through to the note id"""
+    buffer = BytesIO()
+    Image.new('RGB', (40, 30), (90, 90, 90)).save(buffer, 'PNG')
+    image = base64.b64encode(buffer.getvalue()).decode()
+    response = user_client.post('/api/notes/ocr?async=1', json={'image': image})
+    assert response.status_code == 202
+    assert response.json['status'] == 'queued'
+    job_id = response.json['job_id']
+
+    wait_for(job_table, job_id, 'done')
+    polled = user_client.get(f'/api/jobs/{job_id}').json
+    assert (polled['status'], polled['error']) == ('done', None)
+    assert isinstance(polled['note_id'], int)
+    assert user_client.get('/api/jobs/unknown').status_code == 404
+
+def test_failed_job_polls_with_error(queue, job_table, user_client, api_app):
+    """Test a failed job reports its error to the owner"""
+    with api_app.app_context():
+        job_id = queue.submit('test-failing', 7)
+    wait_for(job_table, job_id, 'failed')
+    polled = user_client.get(f'/api/jobs/{job_id}').json
+    assert (polled['status'], polled['note_id'], polled['error']) == ('failed', None, 'page unreadable')
@@ -0,0 +1,211 @@
+"""Test shared LLM client"""
+import json
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from app.llm import FakeBackend, LLMBusy, LLMClient, LLMTimeout, LLMUnavailable, UpstreamError
+
+
+@pytest.fixture
+def llm():
+    """Client on the fake backend with two upstream slots"""
+    flask_app = Flask(__name__)
+    flask_app.config.update(LLM_BACKEND='fake', LLM_MAX_CONCURRENCY=2,
+                            LLM_QUEUE_TIMEOUT=0.05, FAKE_LLM_LATENCY=0.2)
+    return LLMClient(flask_app)
+
+def test_fake_backend_is_deterministic():
+    """Test the same prompt always gets the same answer"""
+    backend = FakeBackend()
+    assert backend.generate('gemini-pro', 'hello') == backend.generate('gemini-pro', 'hello')
+    assert backend.generate('gemini-pro', 'hello') != backend.generate('gemini-pro', 'bye')
+
+def test_fake_backend_quiz_json():
+    """Test quiz prompts get a parseable question list"""
+    questions = json.loads(FakeBackend().generate('gemini-pro', 'Format as JSON array ...'))
+    assert len(questions) == 5
+    assert questions[0]['correct'] in questions[0]['options']
+
+def test_fake_backend_stream_matches_generate():
+    """Test streamed chunks join up to the full answer"""
+    backend = FakeBackend()
+    assert ''.join(backend.stream('gemini-pro', 'a b c')) == backend.generate('gemini-pro', 'a b c')
+
+def test_fake_backend_accepts_image_parts():
+    """Test vision-style content lists are handled"""
+    answer = FakeBackend().generate('gemini-1.5-flash', ['Extract', {'mime_type': 'image/jpeg', 'data': b'xx'}])
+    assert answer.startswith('[gemini-1.5-flash ')
+
+def test_concurrency_is_bounded(llm):
+    """Test callers beyond the limit are rejected after the queue timeout"""
+    results = []
+
+    def call():
+        try:
+            results.append(llm.generate('gemini-pro', 'slow'))
+        except LLMBusy:
+            results.append('busy')
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+        time.sleep(0.01)
+    for t in threads:
+        t.join()
+    assert results.count('busy') == 1
+    stats = llm.snapshot()
+    assert stats['rejected'] == 1
+    assert stats['calls'] == 2
+    assert stats['in_flight'] == 0
+
+def test_stream_holds_slot(llm):
+    """Test a slot is released once a stream is exhausted"""
+    llm.backend.latency = 0
+    list(llm.stream('gemini-pro', 'one two'))
+    assert llm.snapshot()['in_flight'] == 0
+
+@pytest.fixture
+def resilient():
+    """Client on an instant fake backend with fast retries and a small breaker"""
+    flask_app = Flask(__name__)
+    flask_app.config.update(LLM_BACKEND='fake', LLM_MAX_CONCURRENCY=4, LLM_QUEUE_TIMEOUT=1,
+                            LLM_RETRY_BASE=0.001, LLM_RETRY_CAP=0.01,
+                            LLM_BREAKER_MIN_CALLS=4, LLM_BREAKER_COOLDOWN=60,
+                            LLM_HEDGE_DELAY=0.05, LLM_HEDGE_MIN_DELAY=0.05,
+                            LLM_POLICIES={'short': {'deadline': 0.2, 'retries': 0},
+                                          'hedged': {'deadline': 5, 'hedge': True}})
+    return LLMClient(flask_app)
+
+def test_fake_backend_timeout():
+    """Test a fake call slower than its timeout raises TimeoutError after the timeout"""
+    backend = FakeBackend(latency=1.0)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        backend.generate('gemini-pro', 'hi', timeout=0.05)
+    assert time.monotonic() - started < 0.5
+    assert FakeBackend(latency=0.01).generate('gemini-pro', 'hi', timeout=1)
+
+def test_fake_backend_injected_faults():
+    """Test queued faults apply to the next calls in order"""
+    backend = FakeBackend()
+    backend.inject(UpstreamError('down', 503), None)
+    with pytest.raises(UpstreamError):
+        backend.generate('gemini-pro', 'hi')
+    assert backend.generate('gemini-pro', 'hi')
+    assert FakeBackend(error_rate=1.0).calls == 0
+    with pytest.raises(UpstreamError):
+        FakeBackend(error_rate=1.0).generate('gemini-pro', 'hi')
+
+def test_retries_transient_errors(resilient):
+    """Test 503s and 429s are retried until a call succeeds"""
+    resilient.backend.inject(UpstreamError('down', 503), UpstreamError('slow down', 429))
+    assert resilient.generate('gemini-pro', 'hello')
+    stats = resilient.snapshot()
+    assert stats['retries'] == 2
+    assert stats['in_flight'] == 0
+
+def test_client_errors_are_not_retried(resilient):
+    """Test a non-retryable error surfaces unchanged after one attempt"""
+    resilient.backend.inject(UpstreamError('bad request', 400))
+    with pytest.raises(UpstreamError):
+        resilient.generate('gemini-pro', 'hello')
+    assert resilient.backend.calls == 1
+
+def test_retries_exhausted(resilient):
+    """Test LLMUnavailable once the policy's retries are used up"""
+    resilient.backend.inject(*[UpstreamError('down', 503)] * 3)
+    with pytest.raises(LLMUnavailable):
+        resilient.generate('gemini-pro', 'hello')
+    assert resilient.backend.calls == 3
+
+def test_deadline(resilient):
+    """Test a call slower than its deadline raises LLMTimeout on time"""
+    resilient.backend.inject(1.0)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeout):
+        resilient.generate('gemini-pro', 'hello', policy='short')
+    assert time.monotonic() - started < 0.5
+    assert resilient.snapshot()['timeouts'] == 1
+
+def test_deadline_bounds_upstream_call(resilient):
+    """Test the backend gets the time left as its timeout, so a stuck attempt frees its slot"""
+    timeouts = []
+    generate = resilient.backend.generate
+
+    def recording_generate(model_name, contents, timeout=None):
+        timeouts.append(timeout)
+        return generate(model_name, contents, timeout=timeout)
+    resilient.backend.generate = recording_generate
+    resilient.backend.inject(5.0)
+    with pytest.raises(LLMTimeout):
+        resilient.generate('gemini-pro', 'hello', policy='short')
+    assert 0 < timeouts[0] <= 0.2
+    time.sleep(0.1)
+    assert resilient.snapshot()['in_flight'] == 0
+
+def test_timeout_recorded_once(resilient, monkeypatch):
+    """Test a timed-out call is one breaker failure, not another when the attempt ends"""
+    outcomes = []
+    monkeypatch.setattr(resilient.breaker, 'record', outcomes.append)
+    resilient.backend.inject(0.3)
+    with pytest.raises(LLMTimeout):
+        resilient.generate('gemini-pro', 'hello', policy='short')
+    time.sleep(0.2)
+    assert outcomes == [False]
+
+def test_late_success_does_not_close_breaker(resilient):
+    """Test a half-open probe that times out reopens the breaker even if it answers later"""
+    def slow_generate(model_name, contents, timeout=None):
+        time.sleep(0.4)
+        return 'late'
+    resilient.backend.generate = slow_generate
+    resilient.breaker.state = resilient.breaker.HALF_OPEN
+    with pytest.raises(LLMTimeout):
+        resilient.generate('gemini-pro', 'hello', policy='short')
+    assert resilient.snapshot()['breaker'] == 'open'
+    time.sleep(0.4)
+    assert resilient.snapshot()['breaker'] == 'open'
+
+def test_breaker_fails_fast(resilient):
+    """Test calls are refused without reaching upstream once the breaker opens"""
+    resilient.backend.error_rate = 1.0
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            resilient.generate('gemini-pro', 'hello')
+    assert resilient.snapshot()['breaker'] == 'open'
+    calls = resilient.backend.calls
+    refused = resilient.snapshot()['short_circuited']
+    with pytest.raises(LLMUnavailable, match='unavailable'):
+        resilient.generate('gemini-pro', 'hello')
+    assert resilient.backend.calls == calls
+    assert resilient.snapshot()['short_circuited'] == refused + 1
+
+def test_hedge_beats_slow_call(resilient):
+    """Test a hedged second attempt answers when the first is stuck"""
+    resilient.backend.inject(1.0)
+    started = time.monotonic()
+    assert resilient.generate('gemini-pro', 'hello', policy='hedged')
+    assert time.monotonic() - started < 0.5
+    stats = resilient.snapshot()
+    assert stats['hedges'] == 1
+    assert stats['hedge_wins'] == 1
+
+def test_stream_retries_before_first_chunk(resilient):
+    """Test a stream failing to start is retried and then completes"""
+    resilient.backend.inject(UpstreamError('down', 503))
+    text = ''.join(resilient.stream('gemini-pro', 'one two three'))
+    assert text == FakeBackend().generate('gemini-pro', 'one two three')
+    stats = resilient.snapshot()
+    assert stats['retries'] == 1
+    assert stats['in_flight'] == 0
+
+def test_stream_deadline(resilient):
+    """Test a stream that stops sending times out and its slot comes back"""
+    resilient.backend.inject(0.5)
+    with pytest.raises(LLMTimeout):
+        list(resilient.stream('gemini-pro', 'hello', policy='short'))
+    time.sleep(0.6)
+    assert resilient.snapshot()['in_flight'] == 0
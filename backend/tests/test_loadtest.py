@@ -0,0 +1,49 @@
+"""Test load test result aggregation and comparison"""
+import os
+
+from bench.loadtest import compare, percentile, summarize_samples, use_fake_llm
+
+
+def test_percentile_nearest_rank():
+    """Test percentiles pick an actual sample by nearest rank"""
+    samples = list(range(1, 101))
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 95) == 95
+    assert percentile(samples, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+def test_summarize_counts_errors_and_rps():
+    """Test 5xx and connection failures count as errors"""
+    samples = [{'status': 200, 'ms': 10}, {'status': 503, 'ms': 20},
+               {'status': 0, 'ms': 30}, {'status': 401, 'ms': 5}]
+    stats = summarize_samples(samples, elapsed=2.0)
+    assert stats['requests'] == 4
+    assert stats['errors'] == 2
+    assert stats['rps'] == 2.0
+    assert stats['max_ms'] == 30
+
+def test_compare_flags_regressions():
+    """Test slower p95 or lower throughput beyond tolerance is a regression"""
+    def result(p95, rps):
+        return {'levels': [{'concurrency': 8, 'endpoints': {
+            'chat': {'p95_ms': p95, 'rps': rps},
+            'login': {'p95_ms': 10.0, 'rps': 50.0}}}]}
+
+    rows, regressions = compare(result(100.0, 20.0), result(130.0, 20.0))
+    assert len(rows) == 2
+    assert [r['endpoint'] for r in regressions] == ['chat']
+
+    _, regressions = compare(result(100.0, 20.0), result(105.0, 19.0))
+    assert regressions == []
+
+def test_fake_llm_overrides_environment(monkeypatch):
+    """Test the in-process server uses the fake backend even when .env says gemini"""
+    monkeypatch.setenv('LLM_BACKEND', 'gemini')
+    monkeypatch.setenv('FAKE_LLM_LATENCY', '9')
+    for name in ('FAKE_LLM_ERROR_RATE', 'FAKE_LLM_SLOW_RATE'):
+        monkeypatch.setenv(name, '0')
+    use_fake_llm(0.25, 0.1, 0.05)
+    assert os.environ['LLM_BACKEND'] == 'fake'
+    assert (os.environ['FAKE_LLM_LATENCY'], os.environ['FAKE_LLM_ERROR_RATE'],
+            os.environ['FAKE_LLM_SLOW_RATE']) == ('0.25', '0.1', '0.05')
@@ -0,0 +1,63 @@
+"""Test request phase timing and the Prometheus endpoint"""
+import json
+import logging
+import time
+
+from flask import Flask, jsonify
+
+from app import metrics
+
+
+def make_app(slow_ms=0):
+    app = Flask(__name__)
+    app.config['SLOW_REQUEST_MS'] = slow_ms
+    metrics.Metrics(app)
+
+    @app.route('/work')
+    def work():
+        with metrics.phase('db'):
+            time.sleep(0.01)
+        with metrics.phase('db'):
+            time.sleep(0.01)
+        metrics.record_llm_call('fake-model', 100, 20)
+        return jsonify({'ok': True})
+
+    return app
+
+def test_histogram_renders_cumulative_buckets():
+    """Test buckets are cumulative and end with +Inf, sum and count"""
+    hist = metrics.Histogram('test_seconds', 'Test', ('endpoint',), buckets=(0.1, 1.0))
+    hist.observe(0.05, endpoint='a')
+    hist.observe(0.5, endpoint='a')
+    hist.observe(5, endpoint='a')
+    text = hist.render()
+    assert 'test_seconds_bucket{endpoint="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{endpoint="a",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{endpoint="a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{endpoint="a"} 3' in text
+
+def test_phases_are_summed_per_request():
+    """Test repeated phases within one request are observed once, summed"""
+    app = make_app()
+    before = metrics.PHASE_SECONDS.samples(endpoint='work', phase='db')
+    before_count = before[2] if before else 0
+
+    assert app.test_client().get('/work').status_code == 200
+    counts, total, count = metrics.PHASE_SECONDS.samples(endpoint='work', phase='db')
+    assert count == before_count + 1
+    assert metrics.PHASE_SECONDS.samples(endpoint='work', phase='serialize') is not None
+
+    body = app.test_client().get('/metrics').get_data(as_text=True)
+    assert 'aivora_request_duration_seconds_bucket{endpoint="work",method="GET",status="200"' in body
+    assert 'aivora_llm_tokens_count{model="fake-model",kind="prompt"}' in body
+
+def test_slow_requests_are_logged_as_json(caplog):
+    """Test requests past the threshold log their phase breakdown"""
+    app = make_app(slow_ms=1)
+    with caplog.at_level(logging.WARNING, logger='aivora.slow_requests'):
+        app.test_client().get('/work')
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record['endpoint'] == 'work'
+    assert record['phases_ms']['db'] >= 15
+    assert record['llm_calls'] == 1
+    assert record['llm_tokens'] == {'prompt': 100, 'completion': 20}
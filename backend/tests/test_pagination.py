@@ -0,0 +1,28 @@
+"""Test keyset pagination cursors"""
+from datetime import datetime
+
+import pytest
+
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+
+
+def test_cursor_round_trip():
+    """Test a cursor decodes back to its (created_at, id)"""
+    created_at = datetime(2024, 5, 1, 9, 30, 15)
+    token = encode_cursor(created_at, 1234)
+    assert '=' not in token
+    assert decode_cursor(token) == (created_at, 1234)
+
+@pytest.mark.parametrize('token', ['', 'not-base64!', 'WzFd', encode_cursor(datetime.now(), 1)[:-4]])
+def test_invalid_cursor(token):
+    """Test malformed tokens are rejected"""
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token)
+
+def test_parse_limit_clamps():
+    """Test limits fall back to the default and stay within bounds"""
+    assert parse_limit(None, 50, 200) == 50
+    assert parse_limit('abc', 50, 200) == 50
+    assert parse_limit('0', 50, 200) == 1
+    assert parse_limit('1000', 50, 200) == 200
+    assert parse_limit('20', 50, 200) == 20
@@ -0,0 +1,67 @@
+"""Test the password hashing pool"""
+import time
+
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+
+from app.passwords import HasherBusy, PasswordHasher, hash_params
+
+
+def make_hasher(workers=1, queue_max=4, method='pbkdf2:sha256:1000', timeout=10):
+    app = Flask(__name__)
+    app.config.update(PASSWORD_WORKERS=workers, PASSWORD_QUEUE_MAX=queue_max,
+                      PASSWORD_HASH_METHOD=method, PASSWORD_TIMEOUT=timeout)
+    return PasswordHasher(app)
+
+def test_hash_and_verify_in_worker_process():
+    """Test hashes made on the pool verify, and wrong passwords fail"""
+    hasher = make_hasher()
+    try:
+        stored = hasher.hash('secret')
+        assert hash_params(stored) == 'pbkdf2:sha256:1000'
+        assert hasher.verify(stored, 'secret') == (True, None)
+        assert hasher.verify(stored, 'wrong') == (False, None)
+    finally:
+        hasher.shutdown()
+
+def test_outdated_hash_is_replaced_on_login():
+    """Test a matching hash with older parameters comes back re-hashed"""
+    hasher = make_hasher(workers=0, method='pbkdf2:sha256:2000')
+    old = generate_password_hash('secret', 'pbkdf2:sha256:1000')
+    matches, new_hash = hasher.verify(old, 'secret')
+    assert matches
+    assert hash_params(new_hash) == 'pbkdf2:sha256:2000'
+    assert hasher.verify(new_hash, 'secret') == (True, None)
+    assert hasher.verify(old, 'wrong') == (False, None)
+
+def test_rejects_early_when_full():
+    """Test calls beyond workers + queue fail fast with HasherBusy"""
+    hasher = make_hasher(workers=0, queue_max=1)
+    # workers=0 still admits one call, plus one queued
+    assert hasher._capacity.acquire(blocking=False)
+    assert hasher._capacity.acquire(blocking=False)
+    with pytest.raises(HasherBusy):
+        hasher.hash('secret')
+    hasher._capacity.release()
+    assert hasher.hash('secret')
+
+def test_timed_out_job_keeps_its_slot():
+    """Test a job the caller gave up on still counts until the worker finishes it"""
+    hasher = make_hasher(workers=1, queue_max=0, timeout=0.05)
+    try:
+        with pytest.raises(HasherBusy, match='too long'):
+            hasher._call(time.sleep, 0.5)
+        with pytest.raises(HasherBusy, match='Too many'):
+            hasher.hash('secret')
+        hasher.timeout = 10
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                assert hasher.hash('secret')
+                break
+            except HasherBusy:
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,100 @@
+"""Test circuit breaker, retry backoff and latency window"""
+import random
+
+from app.resilience import CircuitBreaker, LatencyWindow, backoff_delay, is_retryable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Coded(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+def test_retryable_errors():
+    """Test throttling, 5xx and network errors are retried, client errors are not"""
+    assert is_retryable(Coded(429))
+    assert is_retryable(Coded(503))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(Coded(400))
+    assert not is_retryable(ValueError())
+
+def test_backoff_is_jittered_and_capped():
+    """Test delays stay within base * 2^attempt and the cap"""
+    rng = random.Random(1)
+    delays = [backoff_delay(attempt, 0.5, 4, rng) for attempt in range(8) for _ in range(20)]
+    assert all(0 <= delay <= 4 for delay in delays)
+    assert all(backoff_delay(0, 0.5, 4, rng) <= 0.5 for _ in range(20))
+    assert len(set(delays)) > 100
+
+def test_breaker_opens_on_error_rate():
+    """Test the breaker opens once enough calls in the window failed"""
+    clock = Clock()
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, cooldown=5, clock=clock)
+    for success in (True, False, False):
+        breaker.record(success)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    assert breaker.retry_after() == 5
+
+def test_breaker_forgets_old_outcomes():
+    """Test failures outside the window do not count"""
+    clock = Clock()
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, cooldown=5, clock=clock)
+    for _ in range(3):
+        breaker.record(False)
+    clock.now = 11
+    for _ in range(3):
+        breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == 'closed'
+
+def test_breaker_half_open_probe():
+    """Test one probe goes through after the cooldown and its outcome decides"""
+    clock = Clock()
+    breaker = CircuitBreaker(window=10, min_calls=2, error_rate=0.5, cooldown=5, clock=clock)
+    breaker.record(False)
+    breaker.record(False)
+    clock.now = 5
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open'
+
+    clock.now = 10
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+def test_breaker_replaces_lost_probe():
+    """Test a probe that never reports back does not keep the breaker shut"""
+    clock = Clock()
+    breaker = CircuitBreaker(window=10, min_calls=1, error_rate=0.5, cooldown=5, clock=clock)
+    breaker.record(False)
+    clock.now = 5
+    assert breaker.allow()
+    clock.now = 9
+    assert not breaker.allow()
+    clock.now = 10
+    assert breaker.allow()
+
+def test_latency_percentile():
+    """Test percentiles over the most recent samples"""
+    window = LatencyWindow(size=100)
+    assert window.percentile(95) is None
+    for ms in range(200):
+        window.add(ms / 1000)
+    assert len(window) == 100
+    assert window.percentile(50) == 0.15
+    assert window.percentile(95) == 0.195
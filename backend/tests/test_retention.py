@@ -0,0 +1,161 @@
+"""Test chat history archival"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from app import retention
+from app.retention import ChatArchive, read_archive
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+class FakeChatTables:
+    """Just enough of a cursor to serve chat_history and chat_archives"""
+
+    def __init__(self, turns):
+        self.turns = turns
+        self.conversations = {turn['conversation_id'] for turn in turns}
+        self.archives = []
+        self.lock_free = True
+        self.locks = []
+        self.result = []
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SELECT GET_LOCK'):
+            self.locks.append('get')
+            self.result = [{'locked': 1 if self.lock_free else 0}]
+        elif sql.startswith('SELECT RELEASE_LOCK'):
+            self.locks.append('release')
+        elif sql.startswith('DELETE FROM chat_history'):
+            self.turns = [turn for turn in self.turns if turn['id'] not in params]
+        elif sql.startswith('DELETE FROM chat_archives'):
+            self.archives = [entry for entry in self.archives if entry['id'] not in params]
+        elif 'LEFT JOIN conversations' in sql:
+            self.result = [dict(entry) for entry in self.archives
+                           if entry['conversation_id'] not in self.conversations]
+        elif sql.startswith('SELECT DISTINCT path'):
+            self.result = [{'path': path} for path in {entry['path'] for entry in self.archives}]
+        elif 'FROM chat_history' in sql:
+            cutoff, limit = params
+            old = sorted((turn for turn in self.turns if turn['created_at'] < cutoff),
+                         key=lambda turn: (turn['created_at'], turn['id']))
+            self.result = [dict(turn) for turn in old[:limit]]
+        elif 'FROM chat_archives' in sql:
+            params = list(params)
+            user_id = params.pop(0)
+            entries = [entry for entry in self.archives if entry['user_id'] == user_id]
+            if 'conversation_id = %s' in sql:
+                conversation_id = params.pop(0)
+                entries = [entry for entry in entries if entry['conversation_id'] == conversation_id]
+            if 'first_id < %s' in sql:
+                before = params.pop(0)
+                entries = [entry for entry in entries if entry['first_id'] < before]
+            paths = {}
+            for entry in entries:
+                paths[entry['path']] = max(paths.get(entry['path'], 0), entry['last_id'])
+            self.result = sorted(({'path': path, 'last_id': last_id, 'first_id': last_id}
+                                  for path, last_id in paths.items()),
+                                 key=lambda entry: entry['last_id'], reverse='DESC' in sql)
+
+    def executemany(self, sql, rows):
+        for user_id, conversation_id, path, first_id, last_id, turns in rows:
+            self.archives.append({'id': len(self.archives) + 1, 'user_id': user_id, 'conversation_id': conversation_id, 'path': path,
+                                  'first_id': first_id, 'last_id': last_id, 'turns': turns})
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+def make_turns():
+    turns = []
+    for turn_id in range(1, 11):
+        user_id = 1 if turn_id % 2 else 2
+        age = timedelta(days=200 - turn_id * 15)
+        turns.append({'id': turn_id, 'user_id': user_id, 'conversation_id': 10 * user_id + turn_id % 3,
+                      'question': f'q{turn_id}', 'answer': f'a{turn_id}', 'created_at': NOW - age})
+    return turns
+
+@pytest.fixture
+def tables(monkeypatch):
+    cursor = FakeChatTables(make_turns())
+
+    @contextmanager
+    def transaction(dict_rows=False):
+        yield cursor
+
+    monkeypatch.setattr(retention.database, 'get_cursor', lambda dict_rows=False: cursor)
+    monkeypatch.setattr(retention.database, 'transaction', transaction)
+    return cursor
+
+@pytest.fixture
+def archive(tmp_path):
+    app = Flask(__name__)
+    app.config.update(CHAT_ARCHIVE_DIR=str(tmp_path), CHAT_RETENTION_DAYS=90,
+                      CHAT_ARCHIVE_BATCH=3, CHAT_ARCHIVE_PAUSE=0, CHAT_ARCHIVE_INTERVAL=0)
+    return ChatArchive(app)
+
+def test_old_turns_moved_to_files(tables, archive, tmp_path):
+    """Test turns past retention leave chat_history in batches and land in per-user files"""
+    assert archive.archive(now=NOW) == 7
+    assert [turn['id'] for turn in tables.turns] == [8, 9, 10]
+    assert tables.locks == ['get', 'release']
+
+    paths = sorted({entry['path'] for entry in tables.archives})
+    assert len(paths) == 5
+    archived = [turn for path in paths for turn in read_archive(tmp_path / path)]
+    assert sorted(turn['id'] for turn in archived) == [1, 2, 3, 4, 5, 6, 7]
+    assert all(turn['user_id'] == int(path.split('/')[1])
+               for path in paths for turn in read_archive(tmp_path / path))
+    assert archive.archive(now=NOW) == 0
+
+def test_busy_lock_skips_run(tables, archive):
+    """Test nothing is moved while another process holds the archive lock"""
+    tables.lock_free = False
+    assert archive.archive(now=NOW) == 0
+    assert len(tables.turns) == 10
+    assert tables.locks == ['get']
+
+def test_archived_turns_read_back(tables, archive):
+    """Test archived turns come back newest first, by conversation and before an id"""
+    archive.archive(now=NOW)
+    assert [turn['id'] for turn in archive.turns(1)] == [7, 5, 3, 1]
+    assert [turn['id'] for turn in archive.turns(1, limit=2)] == [7, 5]
+    assert [turn['id'] for turn in archive.turns(1, before_id=5)] == [3, 1]
+    assert [turn['id'] for turn in archive.turns(2, conversation_id=20)] == [6]
+    assert archive.turns(1)[0]['question'] == 'q7'
+
+def test_all_turns_for_export(tables, archive):
+    """Test every archived turn of a user is listed for export"""
+    archive.archive(now=NOW)
+    assert sorted(turn['id'] for turn in archive.all_turns(2)) == [2, 4, 6]
+
+def test_deleted_user_files_removed(tables, archive, tmp_path):
+    """Test a deleted user's archive files go on the next run, other users' stay"""
+    archive.archive(now=NOW)
+    # ON DELETE CASCADE from users
+    tables.archives = [entry for entry in tables.archives if entry['user_id'] != 2]
+    tables.conversations = {conversation for conversation in tables.conversations if conversation < 20}
+    archive.archive(now=NOW)
+    assert not (tmp_path / 'chat' / '2').exists()
+    assert [turn['id'] for turn in archive.turns(1)] == [7, 5, 3, 1]
+
+def test_deleted_conversation_dropped_from_files(tables, archive, tmp_path):
+    """Test turns of a deleted conversation are cut from the files and the index"""
+    archive.archive(now=NOW)
+    tables.conversations.discard(11)
+    archive.archive(now=NOW)
+    assert [turn['id'] for turn in archive.turns(1)] == [5, 3]
+    assert all(entry['conversation_id'] != 11 for entry in tables.archives)
+    on_disk = [turn['id'] for path in (tmp_path / 'chat' / '1').iterdir() for turn in read_archive(path)]
+    assert sorted(on_disk) == [3, 5]
+
+def test_all_turns_on_given_cursor(tables, archive, monkeypatch):
+    """Test the archive index is read on the cursor passed in, e.g. an export snapshot"""
+    archive.archive(now=NOW)
+    monkeypatch.setattr(retention.database, 'get_cursor', None)
+    assert sorted(turn['id'] for turn in archive.all_turns(2, tables)) == [2, 4, 6]
@@ -0,0 +1,335 @@
+"""Test API endpoints end to end on the fake database"""
+import base64
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from io import BytesIO
+
+from PIL import Image
+
+from app import database
+from app.llm import LLMBusy
+from app.pagination import encode_cursor
+from app.retention import write_archive
+from app.routes import insert_notes
+from app.summaries import content_hash
+
+
+def image_bytes(size=(64, 48), fmt='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, (120, 160, 200)).save(buffer, fmt)
+    return buffer.getvalue()
+
+def test_register_and_login(api_app, fake_db):
+    """Test a registered user's stored hash lets them log in"""
+    client = api_app.test_client()
+    response = client.post('/api/auth/register', json={'email': 'ada@example.com', 'password': 'pw123456'})
+    assert response.status_code == 201
+    name, email, hashed, _ = fake_db.executed('INSERT INTO users')[0]
+    assert email == 'ada@example.com' and hashed != 'pw123456'
+
+    fake_db.on('FROM users WHERE email', [{'id': 3, 'name': name, 'email': email, 'password': hashed}])
+    assert client.post('/api/auth/register', json={'email': email, 'password': 'x'}).status_code == 409
+    assert client.post('/api/auth/login', json={'email': email, 'password': 'wrong'}).status_code == 401
+    response = client.post('/api/auth/login', json={'email': email, 'password': 'pw123456'})
+    assert response.json['user']['id'] == 3
+    assert client.get('/api/auth/me').json['user_id'] == 3
+
+def test_chat_stores_turn(user_client, fake_db):
+    """Test a new conversation is created and the answer stored with it"""
+    response = user_client.post('/api/chat', json={'message': 'What is osmosis?'})
+    assert response.status_code == 200
+    assert response.json['answer'].startswith('[gemini-pro ')
+    conversation_id = response.json['conversation_id']
+    user_id, stored_conversation, question, answer, _ = fake_db.executed('INSERT INTO chat_history')[0]
+    assert (user_id, stored_conversation, question) == (7, conversation_id, 'What is osmosis?')
+    assert answer == response.json['answer']
+
+def test_chat_unknown_conversation(user_client, fake_db):
+    """Test continuing someone else's or a missing conversation is a 404"""
+    response = user_client.post('/api/chat', json={'message': 'hi', 'conversationId': 99})
+    assert response.status_code == 404
+
+def test_chat_history_pages_into_archive(api_app, user_client, fake_db):
+    """Test hot turns come first and ?archived=1 continues into archive files"""
+    created = datetime(2024, 1, 1)
+    fake_db.on('FROM chat_history', lambda params: [
+        {'id': turn_id, 'conversation_id': 1, 'question': f'q{turn_id}', 'answer': 'a', 'created_at': created}
+        for turn_id in (12, 11, 10) if params[-2] == 7 or turn_id < params[-2]][:params[-1]])
+    write_archive(f"{api_app.config['CHAT_ARCHIVE_DIR']}/chat/7/1-2.ndjson.gz",
+                  [{'id': turn_id, 'user_id': 7, 'conversation_id': 1, 'question': f'q{turn_id}',
+                    'answer': 'old', 'created_at': created} for turn_id in (1, 2)])
+    fake_db.on('FROM chat_archives', [{'path': 'chat/7/1-2.ndjson.gz', 'last_id': 2, 'first_id': 1}])
+
+    first = user_client.get('/api/chat/history?limit=2').json
+    assert [turn['id'] for turn in first['turns']] == [12, 11]
+    hot_only = user_client.get(f"/api/chat/history?limit=2&after={first['next_cursor']}").json
+    assert [turn['id'] for turn in hot_only['turns']] == [10]
+    assert hot_only['next_cursor'] is None
+
+    rest = user_client.get(f"/api/chat/history?limit=2&archived=1&after={first['next_cursor']}").json
+    assert [(turn['id'], turn['archived']) for turn in rest['turns']] == [(10, False), (2, True)]
+    assert user_client.get('/api/chat/history?after=bogus').status_code == 400
+
+def test_notes_keyset_pagination(user_client, fake_db):
+    """Test the cursor of one page selects the rows after its last note"""
+    newest = datetime(2024, 5, 1)
+    fake_db.on('FROM notes WHERE user_id', [
+        {'id': note_id, 'title': f'n{note_id}', 'created_at': newest - timedelta(days=note_id)}
+        for note_id in (1, 2, 3)])
+    page = user_client.get('/api/user/notes?limit=2').json
+    assert [note['id'] for note in page['notes']] == [1, 2]
+    assert page['next_cursor'] == encode_cursor(newest - timedelta(days=2), 2)
+
+    user_client.get(f"/api/user/notes?limit=2&after={page['next_cursor']}")
+    assert fake_db.executed('created_at < %s')[-1] == (7, newest - timedelta(days=2),
+                                                      newest - timedelta(days=2), 2, 3)
+
+def test_note_summary_served_from_storage(user_client, fake_db):
+    """Test a current stored summary is returned without regenerating"""
+    digest = content_hash('cells')
+    fake_db.on('SELECT summary, content_hash', [{'summary': 'stored', 'content_hash': digest,
+                                                 'summary_hash': digest}])
+    response = user_client.get('/api/notes/5/summary')
+    assert response.json == {'success': True, 'note_id': 5, 'summary': 'stored', 'regenerated': False}
+    fake_db.on('SELECT summary, content_hash', [])
+    assert user_client.get('/api/notes/5/summary').status_code == 404
+
+def test_search_merges_notes_and_chat(user_client, fake_db):
+    """Test hits from both tables are ranked together on normalized scores, with snippets"""
+    fake_db.on('FROM notes WHERE user_id = %s AND MATCH', [
+        {'id': 1, 'title': 'Cells', 'text': 'mitosis splits cells', 'score': 0.5, 'created_at': None},
+        {'id': 2, 'title': 'Plants', 'text': 'mitosis in roots', 'score': 0.1, 'created_at': None}])
+    fake_db.on('FROM chat_history WHERE user_id = %s AND MATCH', [
+        {'id': 4, 'question': 'mitosis?', 'text': 'mitosis is division', 'score': 9.0, 'created_at': None},
+        {'id': 5, 'question': 'meiosis?', 'text': 'unlike mitosis', 'score': 8.0, 'created_at': None}])
+    results = user_client.get('/api/search?q=mitosis').json['results']
+    assert [(hit['type'], hit['id']) for hit in results] == [('note', 1), ('chat', 4), ('chat', 5),
+                                                             ('note', 2)]
+    assert '<mark>mitosis</mark>' in results[0]['snippet']
+    assert user_client.get('/api/search?q=').status_code == 400
+    assert user_client.get('/api/search?q=cells&type=quiz').status_code == 400
+
+def test_progress_includes_pending_counters(api_app, user_client, fake_db):
+    """Test buffered increments show up before they are flushed"""
+    fake_db.on('FROM progress WHERE user_id', [{'notes_created': 2, 'quizzes_taken': 1, 'questions_asked': 0,
+                                                'study_streak': 3, 'avg_score': 80.0,
+                                                'last_activity_date': date.today()}])
+    api_app.extensions['progress_counters'].add(7, 'questions_asked', 2)
+    progress = user_client.get('/api/user/progress').json
+    assert (progress['notes_created'], progress['questions_asked'], progress['study_streak']) == (2, 2, 3)
+
+def test_quiz_submit_grades_and_records(user_client, fake_db):
+    """Test answers are graded and the attempt folded into progress"""
+    questions = [{'id': 1, 'question': 'q1', 'options': ['a', 'b'], 'correct': 'a'},
+                 {'id': 2, 'question': 'q2', 'options': ['c', 'd'], 'correct': 'd'}]
+    fake_db.on('SELECT questions FROM quizzes', [{'questions': json.dumps(questions)}])
+    fake_db.on('SELECT avg_score, study_streak', [{'avg_score': 75.0, 'study_streak': 2}])
+    response = user_client.post('/api/quiz/3/submit', json={'answers': ['a', 'c']})
+    assert response.status_code == 200
+    assert (response.json['correct'], response.json['total'], response.json['score']) == (1, 2, 50.0)
+    assert fake_db.executed('INSERT INTO quiz_attempts')[0][:5] == (7, 3, 50.0, 1, 2)
+    assert user_client.post('/api/quiz/3/submit', json={}).status_code == 400
+
+def test_ocr_stores_note(user_client, fake_db):
+    """Test a base64 JSON upload is OCR'd and stored as a note"""
+    payload = 'data:image/png;base64,' + base64.b64encode(image_bytes()).decode()
+    response = user_client.post('/api/notes/ocr', json={'image': payload, 'fileName': 'page.png'})
+    assert response.status_code == 200
+    user_id, title, text, digest, _ = fake_db.executed('INSERT INTO notes')[0]
+    assert (user_id, title, text, response.json['note_id']) == (7, 'page.png', response.json['text'], 101)
+    assert digest == content_hash(text)
+
+def test_endpoints_require_login(api_app):
+    """Test the new endpoints refuse anonymous requests"""
+    client = api_app.test_client()
+    for method, url in [('get', '/api/chat/history'), ('get', '/api/user/notes'), ('get', '/api/search?q=x'),
+                        ('get', '/api/user/progress'), ('post', '/api/quiz/1/submit'),
+                        ('post', '/api/quiz/generate-batch'), ('get', '/api/jobs/abc'),
+                        ('get', '/api/notes/1/summary'), ('post', '/api/notes/ocr/bulk')]:
+        assert getattr(client, method)(url).status_code == 401, url
+
+def test_insert_notes_uses_each_rows_own_id(api_app, fake_db):
+    """Test bulk-inserted note ids come from each row's insert, not an assumed block"""
+    with api_app.app_context(), database.transaction() as cursor:
+        fake_db.last_id = 200
+        note_ids = insert_notes(cursor, 7, [('a.png', 'first'), ('b.png', 'second')])
+    assert note_ids == [201, 202]
+    assert [params[:3] for params in fake_db.executed('INSERT INTO notes')] == [
+        (7, 'a.png', 'first'), (7, 'b.png', 'second')]
+
+def read_events(response):
+    """(event, data) pairs of a Server-Sent Events body"""
+    events = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        if not block:
+            continue
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields.get('event', 'message'), json.loads(fields['data'])))
+    return events
+
+def scripted_stream(api_app, monkeypatch, *steps):
+    """Make the fake backend stream steps: text chunks, delays in seconds, or exceptions"""
+    def stream(model_name, contents):
+        for step in steps:
+            if isinstance(step, BaseException):
+                raise step
+            if isinstance(step, float):
+                time.sleep(step)
+            else:
+                yield step
+    monkeypatch.setattr(api_app.extensions['llm'].backend, 'stream', stream)
+
+def test_sse_frames_multiline_chunks(api_app, user_client, fake_db, monkeypatch):
+    """Test chunks with newlines stay one data line each and the done event has the full text"""
+    scripted_stream(api_app, monkeypatch, 'Line one\nline two', '\n\n- item\r\n')
+    response = user_client.post('/api/chat?stream=1', json={'message': 'list it'})
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    body = response.get_data(as_text=True)
+    assert all(line.startswith(('data: ', 'event: ')) for line in body.split('\n') if line)
+
+    events = read_events(response)
+    assert events[:2] == [('message', {'text': 'Line one\nline two'}), ('message', {'text': '\n\n- item\r\n'})]
+    assert events[2][0] == 'done'
+    assert events[2][1]['text'] == 'Line one\nline two\n\n- item\r\n'
+    assert events[2][1]['conversation_id'] == 101
+    assert fake_db.executed('INSERT INTO chat_history')[0][3] == events[2][1]['text']
+
+def test_sse_error_when_busy_mid_stream(api_app, user_client, fake_db, monkeypatch):
+    """Test LLMBusy after some chunks ends the stream with an error event and stores nothing"""
+    scripted_stream(api_app, monkeypatch, 'partial', LLMBusy('Too many AI requests in flight'))
+    events = read_events(user_client.post('/api/chat?stream=1', json={'message': 'hi'}))
+    assert events == [('message', {'text': 'partial'}),
+                      ('error', {'error': 'Too many AI requests in flight'})]
+    assert fake_db.executed('INSERT INTO (chat_history|conversations)') == []
+    assert api_app.extensions['response_cache'].peek('gemini-pro', 'hi') is None
+
+def test_sse_error_when_stream_stalls(api_app, user_client, fake_db, monkeypatch):
+    """Test a gap longer than the chat deadline ends the stream with a timeout error"""
+    api_app.extensions['llm'].policies['chat']['deadline'] = 0.1
+    scripted_stream(api_app, monkeypatch, 'first', 0.5, 'late')
+    events = read_events(user_client.post('/api/chat?stream=1', json={'message': 'hi'}))
+    assert events[0] == ('message', {'text': 'first'})
+    assert events[-1][0] == 'error'
+    assert 'too long' in events[-1][1]['error']
+    assert fake_db.executed('INSERT INTO chat_history') == []
+
+def test_code_help_streams(api_app, user_client, fake_db, monkeypatch):
+    """Test code help streams chunks and finishes with the joined answer"""
+    scripted_stream(api_app, monkeypatch, 'Use ', 'a loop')
+    events = read_events(user_client.post('/api/code-help', json={'code': 'x = 1'},
+                                          headers={'Accept': 'text/event-stream'}))
+    assert events == [('message', {'text': 'Use '}), ('message', {'text': 'a loop'}),
+                      ('done', {'text': 'Use a loop'})]
+    assert fake_db.statements == []
+
+def test_ocr_rejects_bad_uploads(user_client, fake_db, monkeypatch):
+    """Test bad base64, truncated images and decompression bombs are 400s"""
+    bad_base64 = user_client.post('/api/notes/ocr', json={'image': 'data:image/png;base64,abc'})
+    assert bad_base64.status_code == 400
+    assert 'base64' in bad_base64.json['error']
+
+    truncated = image_bytes((400, 300), 'JPEG')[:400]
+    response = user_client.post('/api/notes/ocr', data=truncated, content_type='image/jpeg')
+    assert response.status_code == 400
+
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    response = user_client.post('/api/notes/ocr', data={'image': (BytesIO(image_bytes((100, 100))), 'big.png')})
+    assert response.status_code == 400
+    assert fake_db.executed('INSERT INTO notes') == []
+
+def test_ocr_raw_body_spool_closed(user_client, fake_db, monkeypatch):
+    """Test the temporary file holding a raw body is closed, also when decoding fails"""
+    spools = []
+
+    class Spool(tempfile.SpooledTemporaryFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            spools.append(self)
+
+    monkeypatch.setattr(tempfile, 'SpooledTemporaryFile', Spool)
+    assert user_client.post('/api/notes/ocr', data=image_bytes(), content_type='image/png').status_code == 200
+    assert user_client.post('/api/notes/ocr', data=b'garbage', content_type='image/png').status_code == 400
+    assert len(spools) == 2
+    assert all(spool.closed for spool in spools)
+
+def test_quiz_batch_mixed_results(api_app, user_client, fake_db, monkeypatch):
+    """Test per-note results: generated, not found and busy, with one insert for the successes"""
+    fake_db.on('SELECT id, content FROM notes', [{'id': 1, 'content': 'cells divide'},
+                                                 {'id': 3, 'content': 'busy topic'}])
+    backend = api_app.extensions['llm'].backend
+    generate = backend.generate
+
+    def flaky(model_name, contents, timeout=None):
+        if 'busy topic' in contents:
+            raise LLMBusy('Too many AI requests in flight, try again shortly')
+        return generate(model_name, contents, timeout=timeout)
+
+    monkeypatch.setattr(backend, 'generate', flaky)
+    response = user_client.post('/api/quiz/generate-batch', json={'noteIds': [1, 2, 3, '1']})
+    assert response.status_code == 200
+    body = response.json
+    assert (body['generated'], body['failed']) == (1, 2)
+    results = {result['noteId']: result for result in body['results']}
+    assert list(results) == [1, 2, 3]
+    assert results[1]['success'] and len(results[1]['questions']) == 5
+    assert results[2] == {'noteId': 2, 'success': False, 'error': 'Note not found'}
+    assert results[3] == {'noteId': 3, 'success': False,
+                          'error': 'Too many AI requests in flight, try again shortly'}
+    assert [params[:2] for params in fake_db.executed('INSERT INTO quizzes')] == [(7, 1)]
+    assert fake_db.executed('SELECT id, content FROM notes')[0] == (7, 1, 2, 3)
+
+def test_quiz_batch_bounded_by_pool(api_app, user_client, fake_db, monkeypatch):
+    """Test no more quizzes are generated at once than quiz_pool has workers"""
+    fake_db.on('SELECT id, content FROM notes', [{'id': note_id, 'content': f'note {note_id}'}
+                                                 for note_id in range(1, 9)])
+    api_app.extensions['quiz_pool'] = ThreadPoolExecutor(max_workers=2)
+    backend = api_app.extensions['llm'].backend
+    generate = backend.generate
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(model_name, contents, timeout=None):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return generate(model_name, contents, timeout=timeout)
+
+    monkeypatch.setattr(backend, 'generate', slow)
+    response = user_client.post('/api/quiz/generate-batch', json={'noteIds': list(range(1, 9))})
+    assert response.json['generated'] == 8
+    assert peak[0] == 2
+
+def test_quiz_batch_validation(api_app, user_client, fake_db):
+    """Test missing, non-integer and oversized batches are 400s"""
+    assert user_client.post('/api/quiz/generate-batch', json={}).status_code == 400
+    assert user_client.post('/api/quiz/generate-batch', json={'noteIds': ['x']}).status_code == 400
+    too_many = list(range(api_app.config['QUIZ_BATCH_MAX'] + 1))
+    assert user_client.post('/api/quiz/generate-batch', json={'noteIds': too_many}).status_code == 400
+
+def test_quiz_generation_uses_response_cache(api_app, user_client, fake_db):
+    """Test the same note text is only sent upstream once"""
+    fake_db.on('SELECT content FROM notes', [{'content': 'cells divide'}])
+    first = user_client.post('/api/quiz/generate', json={'noteId': 1}).json
+    second = user_client.post('/api/quiz/generate', json={'noteId': 1}).json
+    assert first['questions'] == second['questions']
+    assert api_app.extensions['llm'].backend.calls == 1
+
+def test_stats_require_admin_token(api_app):
+    """Test the cache and LLM stats are hidden without a token and need a matching one"""
+    client = api_app.test_client()
+    for path in ('/api/cache/stats', '/api/llm/stats'):
+        assert client.get(path).status_code == 404
+    api_app.config['ADMIN_STATS_TOKEN'] = 's3cret'
+    for path, section in (('/api/cache/stats', 'cache'), ('/api/llm/stats', 'llm')):
+        assert client.get(path).status_code == 403
+        assert client.get(path, headers={'X-Admin-Token': 'wrong'}).status_code == 403
+        response = client.get(path, headers={'X-Admin-Token': 's3cret'})
+        assert response.status_code == 200 and section in response.json
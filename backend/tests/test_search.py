@@ -0,0 +1,40 @@
+"""Test search snippets"""
+from app.search import make_snippet, merge_hits, query_terms
+
+
+def test_query_terms():
+    """Test queries are split into distinct lower-case words"""
+    assert query_terms('Cell  cell, Mitochondria!') == ['cell', 'mitochondria']
+    assert query_terms('   ') == []
+
+def test_snippet_highlights_terms():
+    """Test matches are wrapped in <mark>, case preserved"""
+    snippet = make_snippet('Photosynthesis happens in chloroplasts.', ['photosynthesis'])
+    assert snippet == '<mark>Photosynthesis</mark> happens in chloroplasts.'
+
+def test_snippet_picks_densest_window():
+    """Test the window with the most matches is chosen"""
+    text = 'osmosis once. ' + 'filler ' * 100 + 'osmosis and diffusion and osmosis again'
+    snippet = make_snippet(text, ['osmosis', 'diffusion'], width=80)
+    assert snippet.startswith('…')
+    assert snippet.count('<mark>') == 3
+
+def test_snippet_escapes_html():
+    """Test note text cannot inject markup"""
+    snippet = make_snippet('<script>alert(1)</script> cell', ['cell'])
+    assert '<script>' not in snippet
+    assert '&lt;script&gt;' in snippet
+
+def test_snippet_without_match():
+    """Test text with no match falls back to its beginning"""
+    assert make_snippet('short text', ['absent']) == 'short text'
+    assert make_snippet(None, ['x']) == ''
+
+def test_merge_hits_normalizes_each_group():
+    """Test each group's scores are scaled to its top hit before ranking"""
+    notes = [{'id': 1, 'score': 2.0}, {'id': 2, 'score': 0.5}]
+    chats = [{'id': 3, 'score': 40.0}, {'id': 4, 'score': 30.0}]
+    merged = merge_hits([notes, chats], 3)
+    assert [hit['id'] for hit in merged] == [1, 3, 4]
+    assert [hit['score'] for hit in merged] == [1.0, 1.0, 0.75]
+    assert merge_hits([[], [{'id': 5, 'score': 0.0}]], 5) == [{'id': 5, 'score': 0.0}]
@@ -0,0 +1,119 @@
+"""Test synthetic data generation and bulk loading"""
+from collections import Counter
+from datetime import datetime
+
+from werkzeug.security import check_password_hash
+
+from bench.seed import COLUMNS, BulkLoader, generate, password_hash, seed
+
+AS_OF = datetime(2024, 6, 1)
+
+
+def rows(users=20, **options):
+    options.setdefault('seed', 7)
+    return list(generate(users, as_of=AS_OF, **options))
+
+def test_same_seed_same_data():
+    """Test a seed reproduces every row, and another seed does not"""
+    assert rows() == rows()
+    assert rows() != rows(seed=8)
+
+def test_users_independent_of_count():
+    """Test a user's rows don't depend on how many users are generated"""
+    few = rows(5)
+    many = rows(20)[:len(few)]
+    assert few == many
+
+def test_rows_reference_their_owner():
+    """Test notes, quizzes and chat turns point at ids generated for the same user"""
+    data = rows(30, first_ids={'users': 100, 'notes': 5000})
+    note_owner = {row[0]: row[1] for table, row in data if table == 'notes'}
+    conversation_owner = {row[0]: row[1] for table, row in data if table == 'conversations'}
+    user_ids = {row[0] for table, row in data if table == 'users'}
+
+    assert min(user_ids) == 100 and min(note_owner) == 5000
+    for table, row in data:
+        assert len(row) == len(COLUMNS[table])
+        if table == 'quizzes':
+            assert note_owner[row[2]] == row[1]
+        elif table == 'chat_history':
+            assert conversation_owner[row[2]] == row[1]
+            assert row[5] <= AS_OF
+
+    progress = {row[0]: row for table, row in data if table == 'progress'}
+    assert set(progress) == user_ids
+    notes_per_user = Counter(note_owner.values())
+    assert all(progress[user_id][1] == notes_per_user[user_id] for user_id in user_ids)
+
+def test_note_sizes_are_long_tailed():
+    """Test note lengths centre on the median with some far larger ones"""
+    lengths = sorted(len(row[3]) for table, row in rows(50, note_chars=2000) if table == 'notes')
+    median = lengths[len(lengths) // 2]
+    assert 1200 < median < 3000
+    assert lengths[-1] > 4 * median
+
+def test_seeded_password_verifies():
+    """Test the shared seeded password hash is one werkzeug accepts"""
+    hashed = password_hash('password123', 7, iterations=1000)
+    assert check_password_hash(hashed, 'password123')
+    assert not check_password_hash(hashed, 'wrong')
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.result = None
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, args=None):
+        if 'MAX(id)' in sql:
+            table = sql.split('FROM ')[1]
+            ids = [row[0] for insert, batch in self.statements
+                   if insert.startswith(f'INSERT INTO {table} ') for row in batch]
+            self.result = (max(ids, default=0) + 1,)
+        else:
+            self.result = (0,)
+
+    def fetchone(self):
+        return self.result
+
+    def executemany(self, sql, rows):
+        self.statements.append((sql, list(rows)))
+
+    def autocommit(self, value):
+        pass
+
+    def close(self):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+def test_loader_batches_per_table():
+    """Test rows are written in batch_size multi-row inserts per table"""
+    conn = FakeConnection()
+    loader = BulkLoader(conn, batch_size=4)
+    for i in range(10):
+        loader.add('users', (i, 'name', f'{i}@x', 'hash', AS_OF))
+    loader.add('notes', (1, 1, 't', 'c', 'h', AS_OF))
+    assert [len(batch) for _, batch in conn.statements] == [4, 4]
+
+    loader.flush()
+    assert [len(batch) for _, batch in conn.statements] == [4, 4, 2, 1]
+    assert conn.statements[0][0].startswith('INSERT INTO users (id, name, email, password, created_at)')
+    assert loader.counts['users'] == 10 and loader.counts['notes'] == 1
+    assert conn.commits == 4
+
+def test_seeding_twice_tops_up():
+    """Test a second seed continues the ids and never repeats an email"""
+    conn = FakeConnection()
+    seed(conn, 5, defer_indexes=False, progress=None, seed=7, as_of=AS_OF)
+    seed(conn, 5, defer_indexes=False, progress=None, seed=7, as_of=AS_OF)
+    users = [row for sql, batch in conn.statements if sql.startswith('INSERT INTO users ')
+             for row in batch]
+    assert [row[0] for row in users] == list(range(1, 11))
+    assert len({row[2] for row in users}) == 10
+    assert users[5][1:3] == ('Student 6', 'student6@seed.aivora.test')
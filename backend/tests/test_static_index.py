@@ -0,0 +1,71 @@
+"""Test static asset index"""
+import gzip
+
+import pytest
+from flask import Flask, request
+
+from app.static_index import IMMUTABLE, REVALIDATE, StaticIndex
+
+
+@pytest.fixture
+def client(tmp_path):
+    """App serving a small fake Vite build"""
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'index.html').write_text('<html>' + 'x' * 1000 + '</html>')
+    (tmp_path / 'assets' / 'index-a1B2c3D4.js').write_text('console.log(1);' * 100)
+    (tmp_path / 'favicon.ico').write_bytes(b'\0' * 10)
+
+    static_app = Flask(__name__)
+    index = StaticIndex(str(tmp_path))
+
+    @static_app.route('/', defaults={'path': ''})
+    @static_app.route('/<path:path>')
+    def serve(path):
+        return index.serve(path, request)
+
+    return static_app.test_client()
+
+def test_hashed_assets_are_immutable(client):
+    """Test Vite hashed assets get a long-lived cache header"""
+    response = client.get('/assets/index-a1B2c3D4.js')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == IMMUTABLE
+    assert response.mimetype in ('application/javascript', 'text/javascript')
+
+def test_spa_fallback(client):
+    """Test unknown paths serve index.html, which must be revalidated"""
+    response = client.get('/dashboard/notes')
+    assert response.status_code == 200
+    assert response.data.startswith(b'<html>')
+    assert response.headers['Cache-Control'] == REVALIDATE
+
+def test_gzip_negotiation(client):
+    """Test compressed variants are served when accepted"""
+    response = client.get('/assets/index-a1B2c3D4.js', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == b'console.log(1);' * 100
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+def test_refused_encoding_not_used(client):
+    """Test q=0 disables an encoding"""
+    response = client.get('/assets/index-a1B2c3D4.js', headers={'Accept-Encoding': 'gzip;q=0, br;q=0'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_small_files_not_compressed(client):
+    """Test tiny files are served as-is"""
+    response = client.get('/favicon.ico', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'\0' * 10
+
+def test_not_modified(client):
+    """Test a matching If-None-Match gets a 304"""
+    etag = client.get('/').headers['ETag']
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_missing_build(tmp_path):
+    """Test an absent dist directory gives 404 rather than a crash"""
+    index = StaticIndex(str(tmp_path / 'missing'))
+    with Flask(__name__).test_request_context('/'):
+        assert index.serve('', request).status_code == 404
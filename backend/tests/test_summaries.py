@@ -0,0 +1,84 @@
+"""Test stored note summaries"""
+from contextlib import contextmanager
+
+import pytest
+
+from app import summaries
+from app.summaries import content_hash, load_summary
+
+
+class FakeNotes:
+    """Just enough of a cursor to serve the notes queries"""
+
+    def __init__(self, notes):
+        self.notes = notes
+        self.row = None
+
+    def execute(self, sql, params):
+        if sql.startswith('UPDATE'):
+            summary, summary_hash, digest, note_id, current = params
+            note = self.notes[note_id]
+            if note['content_hash'] in (None, current):
+                note.update(summary=summary, summary_hash=summary_hash,
+                            content_hash=note['content_hash'] or digest)
+            return
+        note = self.notes.get(params[0])
+        if note and len(params) > 1 and note['user_id'] != params[1]:
+            note = None
+        self.row = dict(note) if note else None
+
+    def fetchone(self):
+        return self.row
+
+@pytest.fixture
+def notes(monkeypatch):
+    store = {1: {'user_id': 7, 'content': 'cells divide', 'content_hash': None,
+                 'summary': None, 'summary_hash': None}}
+    cursor = FakeNotes(store)
+
+    @contextmanager
+    def transaction(dict_rows=False):
+        yield cursor
+
+    monkeypatch.setattr(summaries.database, 'get_cursor', lambda dict_rows=False: cursor)
+    monkeypatch.setattr(summaries.database, 'transaction', transaction)
+    return store
+
+def test_summary_generated_once(notes):
+    """Test the first read generates and stores, later reads are served as stored"""
+    calls = []
+
+    def summarize(text):
+        calls.append(text)
+        return f'summary of {text}'
+
+    assert load_summary(1, 7, summarize) == ('summary of cells divide', True)
+    assert notes[1]['content_hash'] == content_hash('cells divide')
+    assert load_summary(1, 7, summarize) == ('summary of cells divide', False)
+    assert calls == ['cells divide']
+
+def test_regenerated_when_content_changes(notes):
+    """Test a content hash change makes the stored summary stale"""
+    load_summary(1, 7, lambda text: 'old')
+    notes[1].update(content='cells divide by mitosis', content_hash=content_hash('cells divide by mitosis'))
+    assert load_summary(1, 7, lambda text: 'new') == ('new', True)
+    assert notes[1]['summary_hash'] == content_hash('cells divide by mitosis')
+
+def test_edit_during_generation_not_overwritten(notes):
+    """Test a summary of the old content doesn't replace the hash of an edit made meanwhile"""
+    load_summary(1, 7, lambda text: 'v1')
+    edited = 'cells divide by mitosis'
+    notes[1].update(content='cells divide slowly', content_hash=content_hash('cells divide slowly'))
+
+    def summarize_during_edit(text):
+        notes[1].update(content=edited, content_hash=content_hash(edited))
+        return 'stale'
+    assert load_summary(1, 7, summarize_during_edit) == ('stale', True)
+    assert notes[1]['content_hash'] == content_hash(edited)
+    assert notes[1]['summary'] == 'v1'
+    assert load_summary(1, 7, lambda text: f'fresh {text}') == (f'fresh {edited}', True)
+
+def test_other_users_note_not_found(notes):
+    """Test summaries are scoped to the note's owner"""
+    assert load_summary(1, 8, lambda text: 'x') is None
+    assert load_summary(2, 7, lambda text: 'x') is None
@@ -0,0 +1,79 @@
+"""Test bulk upload intake"""
+import zipfile
+from io import BytesIO
+
+import pytest
+from flask import Flask, request
+
+from app.uploads import InvalidUpload, UploadRequest, collect_pages, upload_limit
+
+
+def make_zip(entries):
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, 'w') as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+@pytest.fixture
+def app():
+    flask_app = Flask(__name__)
+    flask_app.request_class = UploadRequest
+    flask_app.config['MAX_CONTENT_LENGTH'] = 1024
+    flask_app.config['BULK_LIMIT'] = 1024 * 1024
+
+    @flask_app.route('/small', methods=['POST'])
+    def small():
+        return str(len(request.get_data()))
+
+    @flask_app.route('/bulk', methods=['POST'])
+    @upload_limit('BULK_LIMIT')
+    def bulk():
+        return str(len(request.get_data()))
+
+    return flask_app
+
+def test_multipart_images_and_zip(app, tmp_path):
+    """Test parts and zip entries become pages, zips in name order without junk"""
+    archive = make_zip({'b.jpg': b'B' * 10, 'a.png': b'A' * 10, 'notes.txt': b'x',
+                        '__MACOSX/._a.png': b'junk', 'dir/': b''})
+    data = {'images': [(BytesIO(b'first'), 'first.jpg'), (BytesIO(archive), 'pages.zip')]}
+    with app.test_request_context('/bulk', method='POST', data=data,
+                                  content_type='multipart/form-data'):
+        pages = collect_pages(request, str(tmp_path), 10, 4096)
+    assert [name for name, _ in pages] == ['first.jpg', 'a.png', 'b.jpg']
+    with open(pages[1][1], 'rb') as f:
+        assert f.read() == b'A' * 10
+
+def test_raw_zip_body(app, tmp_path):
+    """Test a zip sent as the request body"""
+    archive = make_zip({'p1.jpg': b'1', 'p2.jpg': b'2'})
+    with app.test_request_context('/bulk', method='POST', data=archive,
+                                  content_type='application/zip'):
+        pages = collect_pages(request, str(tmp_path), 10, 4096)
+    assert [name for name, _ in pages] == ['p1.jpg', 'p2.jpg']
+
+def test_limits(app, tmp_path):
+    """Test page count, per-page size and empty uploads are rejected"""
+    archive = make_zip({f'{i}.jpg': b'x' for i in range(3)})
+    with app.test_request_context('/bulk', method='POST', data=archive,
+                                  content_type='application/zip'):
+        with pytest.raises(InvalidUpload):
+            collect_pages(request, str(tmp_path), 2, 4096)
+    archive = make_zip({'big.jpg': b'x' * 5000})
+    with app.test_request_context('/bulk', method='POST', data=archive,
+                                  content_type='application/zip'):
+        with pytest.raises(InvalidUpload):
+            collect_pages(request, str(tmp_path), 10, 4096)
+    with app.test_request_context('/bulk', method='POST', data=b'', content_type='text/plain'):
+        with pytest.raises(InvalidUpload):
+            collect_pages(request, str(tmp_path), 10, 4096)
+
+def test_upload_limit_per_view(app):
+    """Test @upload_limit raises the size limit only for its view"""
+    body = make_zip({'p.jpg': b'x' * 2000})
+    client = app.test_client()
+    assert client.post('/small', data=body, content_type='application/zip').status_code == 413
+    response = client.post('/bulk', data=body, content_type='application/zip')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == str(len(body))